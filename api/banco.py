@@ -0,0 +1,233 @@
+import os
+import re
+
+from api.respostas import codificar_cursor, decodificar_cursor
+
+# Conexão com o PostgreSQL carregado por src/carga_banco.py (mesma variável)
+DSN = os.environ.get("ANS_DATABASE_URL", "")
+POOL_MIN = int(os.environ.get("API_POOL_MIN", 1))
+POOL_MAX = int(os.environ.get("API_POOL_MAX", 10))
+
+# Colunas no formato das respostas do modo em memória (api/indice.py)
+SELECT_LISTA = """
+    SELECT registroans AS "RegistroANS", razaosocial AS "RazaoSocial", cnpj AS "CNPJ",
+           uf AS "UF", ano AS "Ano", trimestre AS "Trimestre",
+           valordespesas::float8 AS "ValorDespesas", totaldespesas::float8 AS "TotalDespesas"
+    FROM resultado_despesas
+"""
+
+# Busca: razão social por substring (índice de trigramas), CNPJ por prefixo
+# (btree varchar_pattern_ops) e Registro ANS exato (btree da chave)
+FILTRO_BUSCA = """
+    (razaosocial ILIKE %(padrao)s OR cnpj LIKE %(prefixo)s OR registroans = %(registro)s)
+"""
+
+# Paginação por chave (keyset): continua depois da última linha devolvida,
+# usando o índice (RegistroANS, Ano, Trimestre) em vez de percorrer o OFFSET
+SQL_LISTAR = SELECT_LISTA + """
+    WHERE (registroans, ano, trimestre) > (%(registroans)s, %(ano)s, %(trimestre)s)
+    ORDER BY registroans, ano, trimestre
+    LIMIT %(limite)s
+"""
+SQL_BUSCAR = SELECT_LISTA + """
+    WHERE (registroans, ano, trimestre) > (%(registroans)s, %(ano)s, %(trimestre)s)
+      AND """ + FILTRO_BUSCA + """
+    ORDER BY registroans, ano, trimestre
+    LIMIT %(limite)s
+"""
+# Compatibilidade com ?page=N sem cursor (frontend atual)
+SQL_LISTAR_OFFSET = SELECT_LISTA + """
+    ORDER BY registroans, ano, trimestre
+    LIMIT %(limite)s OFFSET %(deslocamento)s
+"""
+SQL_BUSCAR_OFFSET = SELECT_LISTA + """
+    WHERE """ + FILTRO_BUSCA + """
+    ORDER BY registroans, ano, trimestre
+    LIMIT %(limite)s OFFSET %(deslocamento)s
+"""
+SQL_CONTAR = "SELECT count(*) AS total FROM resultado_despesas"
+SQL_CONTAR_BUSCA = SQL_CONTAR + " WHERE " + FILTRO_BUSCA
+
+SQL_DETALHE = """
+    SELECT min(registroans) AS "RegistroANS", min(razaosocial) AS "RazaoSocial",
+           min(uf) AS "UF", sum(valordespesas)::float8 AS "TotalDespesas"
+    FROM resultado_despesas
+    WHERE registroans = %(registro)s
+    HAVING count(*) > 0
+"""
+SQL_CADASTRO = """
+    SELECT registroans AS "RegistroANS", cnpj AS "CNPJ", razaosocial AS "RazaoSocial",
+           modalidade AS "Modalidade", uf AS "UF"
+    FROM operadoras_cadastro
+    WHERE registroans = ANY(%(registros)s) OR cnpj = ANY(%(cnpjs)s)
+"""
+SQL_HISTORICO = """
+    SELECT ano AS "Ano", trimestre AS "Trimestre", valordespesas::float8 AS "ValorDespesas",
+           mediatrimestral::float8 AS "MediaTrimestral", desviopadrao::float8 AS "DesvioPadrao"
+    FROM resultado_despesas
+    WHERE registroans = %(registro)s
+    ORDER BY ano, trimestre
+"""
+SQL_HISTORICO_PAGINA = """
+    SELECT ano AS "Ano", trimestre AS "Trimestre", valordespesas::float8 AS "ValorDespesas",
+           mediatrimestral::float8 AS "MediaTrimestral", desviopadrao::float8 AS "DesvioPadrao"
+    FROM resultado_despesas
+    WHERE registroans = %(registro)s AND (ano, trimestre) > (%(ano)s, %(trimestre)s)
+    ORDER BY ano, trimestre
+    LIMIT %(limite)s
+"""
+
+# Mesmos resultados de api/estatisticas.py (aliases iguais às chaves do pandas)
+SQL_ESTATISTICAS = {
+    "crescimento": """
+        WITH periodos AS (
+            SELECT registroans, razaosocial, valordespesas,
+                   ano::text || '-' || trimestre AS periodo
+            FROM resultado_despesas
+        ),
+        extremos AS (
+            SELECT registroans, razaosocial,
+                   min(periodo) AS primeiro_periodo, max(periodo) AS ultimo_periodo
+            FROM periodos
+            GROUP BY registroans, razaosocial
+        )
+        SELECT e.registroans, e.razaosocial, e.primeiro_periodo, e.ultimo_periodo,
+               i.valordespesas::float8 AS valordespesas_inicial,
+               f.valordespesas::float8 AS valordespesas_final,
+               CASE WHEN i.valordespesas <> 0
+                    THEN ((f.valordespesas - i.valordespesas) / i.valordespesas * 100)::float8
+                    ELSE 0.0 END AS crescimento_percentual
+        FROM extremos e
+        LEFT JOIN periodos i ON i.registroans = e.registroans AND i.periodo = e.primeiro_periodo
+        LEFT JOIN periodos f ON f.registroans = e.registroans AND f.periodo = e.ultimo_periodo
+        ORDER BY crescimento_percentual DESC NULLS LAST
+        LIMIT 5
+    """,
+    "despesas_uf": """
+        SELECT uf, sum(totaldespesas)::float8 AS total_despesas_uf,
+               avg(totaldespesas)::float8 AS media_despesas_por_operadora
+        FROM resultado_despesas
+        WHERE uf IS NOT NULL
+        GROUP BY uf
+        ORDER BY total_despesas_uf DESC NULLS LAST
+        LIMIT 5
+    """,
+    "acima_media": """
+        WITH contagem AS (
+            SELECT registroans, razaosocial,
+                   count(*) FILTER (
+                       WHERE valordespesas > (SELECT avg(valordespesas) FROM resultado_despesas)
+                   )::int AS trimestres_acima_media,
+                   sum(valordespesas)::float8 AS total_despesas_acima_media
+            FROM resultado_despesas
+            GROUP BY registroans, razaosocial
+        )
+        SELECT registroans, razaosocial, trimestres_acima_media, total_despesas_acima_media,
+               trimestres_acima_media * 1000 + total_despesas_acima_media AS ranking
+        FROM contagem
+        WHERE trimestres_acima_media >= 2
+        ORDER BY trimestres_acima_media DESC, total_despesas_acima_media DESC
+    """,
+}
+
+# Antes da primeira linha: (RegistroANS, Ano, Trimestre) menor que qualquer chave real
+INICIO = {"registroans": -2147483648, "ano": -2147483648, "trimestre": ""}
+
+
+def _parametros_busca(q):
+    # O termo é literal (como no modo em memória): escapa os curingas do LIKE
+    literal = q.replace("\\", "\\\\").replace("%", "\\%").replace("_", "\\_")
+    return {
+        "padrao": f"%{literal}%",
+        "prefixo": f"{literal}%",
+        "registro": int(q) if q.strip().isdigit() and len(q.strip()) < 10 else None,
+    }
+
+
+class BancoOperadoras:
+    """Consultas das rotas direto no PostgreSQL, por um pool de conexões assíncronas.
+
+    Os comandos são preparados no servidor (prepare=True) na primeira
+    execução em cada conexão do pool; a partir daí só os parâmetros trafegam.
+    """
+
+    def __init__(self, dsn=DSN, min_size=POOL_MIN, max_size=POOL_MAX):
+        from psycopg.rows import dict_row
+        from psycopg_pool import AsyncConnectionPool
+
+        self.pool = AsyncConnectionPool(
+            dsn, min_size=min_size, max_size=max_size, open=False,
+            kwargs={"row_factory": dict_row, "autocommit": True})
+
+    async def abrir(self):
+        await self.pool.open(wait=True)
+
+    async def fechar(self):
+        await self.pool.close()
+
+    async def _consultar(self, comando, parametros=None):
+        async with self.pool.connection() as conn:
+            cursor = await conn.execute(comando, parametros, prepare=True)
+            return await cursor.fetchall()
+
+    async def listar(self, page, limit, q=None, cursor=None):
+        parametros = {"limite": limit}
+        if q:
+            parametros.update(_parametros_busca(q))
+
+        if cursor is not None or page <= 1:
+            if cursor:
+                # Chave (RegistroANS, Ano, Trimestre) da última linha da página anterior
+                parametros.update(zip(("registroans", "ano", "trimestre"),
+                                      decodificar_cursor(cursor, (int, int, str))))
+            else:
+                parametros.update(INICIO)
+            comando = SQL_BUSCAR if q else SQL_LISTAR
+        else:
+            parametros["deslocamento"] = (page - 1) * limit
+            comando = SQL_BUSCAR_OFFSET if q else SQL_LISTAR_OFFSET
+
+        dados = await self._consultar(comando, parametros)
+        total = (await self._consultar(SQL_CONTAR_BUSCA if q else SQL_CONTAR, parametros))[0]["total"]
+        return {
+            "page": page,
+            "limit": limit,
+            "total": total,
+            "data": dados,
+            # Próxima página pela chave: ?cursor=<proximo_cursor>
+            "proximo_cursor": codificar_cursor(
+                dados[-1]["RegistroANS"], dados[-1]["Ano"], dados[-1]["Trimestre"])
+            if len(dados) == limit else None,
+        }
+
+    async def detalhe(self, registro_ans):
+        if not registro_ans.isdigit():
+            return None
+        linhas = await self._consultar(SQL_DETALHE, {"registro": int(registro_ans)})
+        return linhas[0] if linhas else None
+
+    async def consultar_cadastro(self, registros, cnpjs):
+        """Cadastro (ou None) de cada RegistroANS e de cada CNPJ pedido, na ordem pedida."""
+        registros = [int(r) if str(r).isdigit() else None for r in registros]
+        cnpjs = [re.sub(r"\D", "", str(c)).zfill(14) if re.search(r"\d", str(c)) else None
+                 for c in cnpjs]
+        linhas = await self._consultar(SQL_CADASTRO, {
+            "registros": [r for r in registros if r is not None],
+            "cnpjs": [c for c in cnpjs if c is not None]})
+        por_registro = {linha["RegistroANS"]: linha for linha in linhas}
+        por_cnpj = {linha["CNPJ"]: linha for linha in linhas}
+        return {"registros": [por_registro.get(r) for r in registros],
+                "cnpjs": [por_cnpj.get(c) for c in cnpjs]}
+
+    async def historico(self, registro_ans, limite=None, depois=None):
+        """Histórico da operadora; com `limite`, só os trimestres após `depois` (Ano, Trimestre)."""
+        if not registro_ans.isdigit():
+            return []
+        if limite is None:
+            return await self._consultar(SQL_HISTORICO, {"registro": int(registro_ans)})
+        ano, trimestre = depois or (INICIO["ano"], INICIO["trimestre"])
+        return await self._consultar(SQL_HISTORICO_PAGINA, {
+            "registro": int(registro_ans), "ano": ano, "trimestre": trimestre, "limite": limite})
+
+    async def estatistica(self, nome):
+        return await self._consultar(SQL_ESTATISTICAS[nome])
@@ -0,0 +1,122 @@
+import gzip
+import os
+
+try:  # opcional: sem o pacote brotli as respostas saem só em gzip
+    import brotli
+except ImportError:
+    brotli = None
+
+# Respostas menores que isso saem sem compressão (o cabeçalho não compensa)
+TAMANHO_MINIMO = int(os.environ.get("API_COMPRESSAO_MINIMO", 1024))
+# Níveis baixos: a compressão roda no event loop, a cada resposta
+NIVEL_GZIP = int(os.environ.get("API_NIVEL_GZIP", 5))
+QUALIDADE_BROTLI = int(os.environ.get("API_QUALIDADE_BROTLI", 4))
+
+TIPOS_COMPRIMIVEIS = ("application/json", "text/")
+
+
+def escolher_codificacao(accept_encoding):
+    """'br', 'gzip' ou None conforme o Accept-Encoding do cliente (q=0 recusa)."""
+    aceitas = {}
+    for item in accept_encoding.split(","):
+        nome, _, parametros = item.strip().partition(";")
+        q = 1.0
+        if parametros.strip().startswith("q="):
+            try:
+                q = float(parametros.strip()[2:])
+            except ValueError:
+                q = 0.0
+        aceitas[nome.strip().lower()] = q
+    if brotli is not None and aceitas.get("br", 0) > 0:
+        return "br"
+    if aceitas.get("gzip", 0) > 0:
+        return "gzip"
+    return None
+
+
+def comprimir(corpo, codificacao):
+    if codificacao == "br":
+        return brotli.compress(corpo, quality=QUALIDADE_BROTLI)
+    return gzip.compress(corpo, compresslevel=NIVEL_GZIP, mtime=0)
+
+
+def _etag_fraco(headers):
+    return [(k, b"W/" + v if k.lower() == b"etag" and not v.startswith(b"W/") else v)
+            for k, v in headers]
+
+
+def _com_vary(headers):
+    """`headers` com Accept-Encoding no Vary (sem repetir se já estiver lá)."""
+    vary = b",".join(v for k, v in headers if k.lower() == b"vary").lower()
+    if b"accept-encoding" in vary or vary.strip() == b"*":
+        return list(headers)
+    return [*headers, (b"vary", b"Accept-Encoding")]
+
+
+class MiddlewareCompressao:
+    """Middleware ASGI: comprime as respostas JSON/texto com brotli ou gzip.
+
+    O corpo é juntado antes de comprimir (as respostas da API não são
+    streaming). Toda resposta leva `Vary: Accept-Encoding`, comprimida ou
+    não, para um cache intermediário guardar uma versão por codificação.
+    Nas comprimidas o ETag passa a fraco (W/), já que os bytes mudam com a
+    codificação; a comparação do If-None-Match (api/estatisticas.py) já é
+    fraca, então o 304 continua valendo.
+    """
+
+    def __init__(self, app, minimo=TAMANHO_MINIMO):
+        self.app = app
+        self.minimo = minimo
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http":
+            return await self.app(scope, receive, send)
+        cabecalhos = dict(scope["headers"])
+        codificacao = escolher_codificacao(cabecalhos.get(b"accept-encoding", b"").decode("latin-1"))
+        # HEAD: Content-Length é o do corpo que não é enviado, então não comprime
+        if codificacao is None or scope["method"] == "HEAD":
+            async def sem_compressao(mensagem):
+                if mensagem["type"] == "http.response.start":
+                    mensagem = {**mensagem, "headers": _com_vary(mensagem["headers"])}
+                await send(mensagem)
+
+            return await self.app(scope, receive, sem_compressao)
+
+        inicio = None
+        partes = []
+
+        async def enviar(mensagem):
+            nonlocal inicio
+            if mensagem["type"] == "http.response.start":
+                inicio = mensagem
+                return
+            if mensagem["type"] != "http.response.body" or inicio is None:
+                return await send(mensagem)
+            partes.append(mensagem.get("body", b""))
+            if mensagem.get("more_body", False):
+                return
+            await self._enviar(send, inicio, b"".join(partes), codificacao)
+
+        await self.app(scope, receive, enviar)
+
+    async def _enviar(self, send, inicio, corpo, codificacao):
+        nomes = {k.lower(): v for k, v in inicio["headers"]}
+        tipo = nomes.get(b"content-type", b"").decode("latin-1")
+        if inicio["status"] == 304:
+            # Sem corpo; o ETag igual ao da resposta comprimida que o cliente guardou
+            await send({**inicio, "headers": _com_vary(_etag_fraco(inicio["headers"]))})
+            await send({"type": "http.response.body", "body": corpo})
+            return
+        if (len(corpo) < self.minimo or b"content-encoding" in nomes
+                or not tipo.startswith(TIPOS_COMPRIMIVEIS)):
+            await send({**inicio, "headers": _com_vary(inicio["headers"])})
+            await send({"type": "http.response.body", "body": corpo})
+            return
+
+        corpo = comprimir(corpo, codificacao)
+        headers = [(k, v) for k, v in _com_vary(_etag_fraco(inicio["headers"]))
+                   if k.lower() != b"content-length"]
+        headers += [(b"content-encoding", codificacao.encode()),
+                    (b"content-length", str(len(corpo)).encode())]
+        await send({**inicio, "headers": headers})
+        await send({"type": "http.response.body", "body": corpo})
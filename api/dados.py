@@ -0,0 +1,223 @@
+import gc
+import glob
+import os
+import threading
+import time
+from dataclasses import dataclass, field, replace
+from pathlib import Path
+
+import api.snapshot as snapshot
+from api.estatisticas import EstatisticasMaterializadas
+from api.indice import IndiceOperadoras
+# Leitura do arquivo compartilhada com o src/transform.py, que grava o snapshot
+from src.snapshot_api import assinatura, ler_arquivo
+
+# --- CAMINHO CSV com possibilidade de sufixo ao exportar do DBeaver--- #
+DATA_DIR = Path(os.environ.get("API_DATA_DIR", Path(__file__).parent.parent / "data"))
+resultado_despesas_pattern = str(DATA_DIR / "resultado_despesas*.csv")
+# Gerado pelo src/transform.py com ANS_FORMATO=parquet; tem prioridade sobre o CSV
+RESULTADO_DESPESAS_PARQUET = DATA_DIR / "resultado_despesas.parquet"
+
+# Snapshots do índice, compartilhados pelos workers (api/snapshot.py); vazio desativa
+SNAPSHOT_DIR = os.environ.get("API_SNAPSHOT_DIR", str(DATA_DIR / "snapshot"))
+
+# Registro de operadoras do src/transform.py (src/registro.py), para a consulta em lote
+BASE_REGISTRO = DATA_DIR / "registro_operadoras"
+
+# Intervalo (s) da verificação de arquivos novos em data/; 0 desativa o observador
+INTERVALO_RECARGA = float(os.environ.get("API_INTERVALO_RECARGA", 30))
+
+
+def escolher_arquivo():
+    """Arquivo que a API deve servir, ou None se não houver nenhum.
+
+    O Parquet do pipeline tem prioridade; entre os CSVs exportados
+    (resultado_despesas*.csv), vence o modificado por último e, no empate,
+    o de maior nome — a escolha não depende da ordem do glob.
+    """
+    if RESULTADO_DESPESAS_PARQUET.exists():
+        return RESULTADO_DESPESAS_PARQUET
+    candidatos = [Path(c) for c in glob.glob(resultado_despesas_pattern)]
+    if not candidatos:
+        return None
+    return max(candidatos, key=lambda c: (c.stat().st_mtime_ns, c.name))
+
+
+@dataclass(frozen=True)
+class VersaoDados:
+    """Tudo o que as rotas leem, montado antes de ser publicado.
+
+    As rotas pegam `gerenciador.atual` uma vez por requisição e usam só essa
+    instância; a troca de versão é a atribuição de uma referência, então
+    nenhuma requisição vê um estado parcial.
+    """
+    resultado_despesas: object  # DataFrame; None se a versão vem de um snapshot ou não há arquivo
+    indice: IndiceOperadoras
+    estatisticas: EstatisticasMaterializadas
+    assinatura: tuple = None
+    numero: int = 0
+    carregada_em: float = field(default_factory=time.time)
+    duracao_carga: float = 0.0  # segundos entre o início da leitura e a versão montada
+    # Arquivo com a trava compartilhada do snapshot (src/snapshot_api.usar): enquanto a
+    # versão existir, a pasta não é apagada pela limpeza de outro worker
+    uso_snapshot: object = None
+
+
+def montar_versao(resultado_despesas=None, assinatura_arquivo=None, numero=0, indice=None,
+                  pasta_snapshot=None, uso_snapshot=None):
+    """Monta os índices e as estatísticas de um DataFrame já carregado.
+
+    Com `indice` e `pasta_snapshot` (versão aberta de um snapshot), usa o
+    índice mapeado em vez de montar outro e compartilha as estatísticas
+    pela pasta.
+    """
+    return VersaoDados(
+        resultado_despesas=resultado_despesas,
+        # Índices de leitura (RegistroANS ordenado, trigramas para a busca)
+        indice=IndiceOperadoras(resultado_despesas) if indice is None else indice,
+        # Estatísticas: calculadas na primeira consulta (ou no aquecimento), uma vez por versão
+        estatisticas=EstatisticasMaterializadas(resultado_despesas, pasta_snapshot),
+        assinatura=assinatura_arquivo,
+        numero=numero,
+        uso_snapshot=uso_snapshot,
+    )
+
+
+def preparar_snapshot(caminho, raiz=None):
+    """(pasta, uso) do snapshot de `caminho`, gravando-o antes se ainda não existir.
+
+    A trava faz um único processo ler o arquivo e gravar; os outros esperam
+    e usam o mesmo snapshot. O src/transform.py grava pelo mesmo código
+    (src/snapshot_api.py), deixando o snapshot pronto já na geração do resultado.
+    `uso` mantém a pasta fora da limpeza enquanto estiver aberto.
+    """
+    return snapshot.preparar(caminho, raiz or SNAPSHOT_DIR)
+
+
+def carregar_versao(caminho, numero=0):
+    """Lê `caminho` (Parquet ou CSV) e monta a versão correspondente.
+
+    Com SNAPSHOT_DIR, as colunas e índices vêm do snapshot mapeado, sem
+    DataFrame: as estatísticas são calculadas (ou lidas) a partir da pasta.
+    """
+    inicio = time.perf_counter()
+    if caminho is None:
+        print(f"AVISO: Nenhum CSV encontrado em {DATA_DIR}")
+        versao = montar_versao(None, None, numero)
+    elif SNAPSHOT_DIR:
+        pasta, uso = preparar_snapshot(caminho)
+        versao = montar_versao(None, assinatura(caminho), numero, indice=snapshot.abrir(pasta),
+                               pasta_snapshot=pasta, uso_snapshot=uso)
+    else:
+        versao = montar_versao(ler_arquivo(caminho), assinatura(caminho), numero)
+    # Inclui a montagem dos índices, que faz parte do tempo até a versão ficar disponível
+    return replace(versao, duracao_carga=time.perf_counter() - inicio)
+
+
+class GerenciadorDados:
+    """Mantém a versão publicada e a substitui quando os arquivos mudam.
+
+    Uma carga por vez (lock): enquanto a nova versão é montada a atual segue
+    servindo, então a memória fica limitada a duas versões.
+    """
+
+    def __init__(self):
+        self.atual = montar_versao()
+        # Marcado quando a primeira carga termina (rota /api/saude)
+        self.pronto = threading.Event()
+        self.erro = None  # mensagem da última carga que falhou
+        self._lock_carga = threading.Lock()
+        self._parar = threading.Event()
+        self._observador = None
+        # Chamadas com cada nova versão publicada (ex.: aquecer as estatísticas)
+        self.ao_publicar = []
+
+    def recarregar(self, forcar=False):
+        """Carrega o arquivo escolhido e publica a nova versão.
+
+        Sem `forcar`, não faz nada se o arquivo não mudou desde a última
+        carga. Retorna True se uma nova versão foi publicada; em caso de erro
+        a versão anterior continua no ar e a exceção é propagada.
+        """
+        with self._lock_carga:
+            caminho = escolher_arquivo()
+            if not forcar and assinatura(caminho) == self.atual.assinatura:
+                return False
+            try:
+                nova = carregar_versao(caminho, self.atual.numero + 1)
+            except Exception as e:
+                self.erro = str(e)
+                raise
+            self.atual = nova
+            self.erro = None
+            self.pronto.set()
+        # A versão antiga sai da memória quando as requisições em andamento terminam
+        gc.collect()
+        for funcao in self.ao_publicar:
+            funcao(nova)
+        return True
+
+    def _observar(self, intervalo):
+        vista = None
+        while not self._parar.wait(intervalo):
+            try:
+                atual = assinatura(escolher_arquivo())
+                # Só recarrega quando o arquivo parou de mudar entre duas verificações,
+                # para não ler uma exportação ainda em andamento
+                if atual == vista and atual != self.atual.assinatura:
+                    self.recarregar()
+                vista = atual
+            except Exception as e:
+                print(f"ERRO ao recarregar os dados: {e}")
+
+    def iniciar_observador(self, intervalo=INTERVALO_RECARGA):
+        if intervalo <= 0 or self._observador is not None:
+            return
+        self._parar.clear()
+        self._observador = threading.Thread(
+            target=self._observar, args=(intervalo,), name="observador-dados", daemon=True)
+        self._observador.start()
+
+    def parar_observador(self):
+        self._parar.set()
+        if self._observador is not None:
+            self._observador.join()
+            self._observador = None
+
+
+class CadastroOperadoras:
+    """Registro de operadoras do pipeline, usado pela consulta em lote por CNPJ/RegistroANS.
+
+    Lido na primeira consulta (a partida da API não depende dele) e relido
+    quando o transform.py grava uma versão nova.
+    """
+
+    def __init__(self, base=BASE_REGISTRO):
+        self.base = Path(base)
+        self._lock = threading.Lock()
+        self._assinatura = None
+        self._registro = None
+
+    def arquivo(self):
+        for extensao in (".parquet", ".csv"):
+            caminho = self.base.with_name(self.base.name + extensao)
+            if caminho.exists():
+                return caminho
+        return None
+
+    def atual(self):
+        """RegistroOperadoras do arquivo atual, ou None se o pipeline ainda não o gerou."""
+        caminho = self.arquivo()
+        with self._lock:
+            if assinatura(caminho) != self._assinatura:
+                import pandas as pd
+                from src.registro import RegistroOperadoras
+
+                if caminho is None:
+                    self._registro = None
+                elif caminho.suffix == ".parquet":
+                    self._registro = RegistroOperadoras(pd.read_parquet(caminho))
+                else:
+                    self._registro = RegistroOperadoras(pd.read_csv(caminho, dtype={"CNPJ": str}))
+                self._assinatura = assinatura(caminho)
+            return self._registro
@@ -0,0 +1,95 @@
+import hashlib
+
+from fastapi import Request, Response
+
+import api.snapshot as snapshot
+# Cálculos e serialização sem FastAPI, compartilhados com o src/transform.py
+from src.snapshot_api import CALCULOS, serializar
+
+# Os resultados só mudam quando os dados são recarregados: o cliente pode
+# guardar a resposta, mas deve revalidar (If-None-Match) a cada uso
+CACHE_CONTROL = "no-cache"
+
+
+def materializar(nome, resultado_despesas):
+    """Calcula e serializa a estatística `nome`: (corpo JSON, ETag).
+
+    Função de módulo para poder rodar num processo separado (api/execucao.py).
+    `resultado_despesas` pode ser a pasta de um snapshot (api/snapshot.py):
+    o processo mapeia os mesmos arrays em vez de receber uma cópia, e o
+    resultado fica gravado na pasta para os outros workers.
+    """
+    if not isinstance(resultado_despesas, str):
+        calcular, _ = CALCULOS[nome]
+        return com_etag(serializar(calcular(resultado_despesas)))
+    return com_etag(snapshot.materializar(resultado_despesas, nome))
+
+
+def com_etag(corpo):
+    """(corpo, ETag forte derivado do conteúdo)."""
+    return corpo, '"' + hashlib.sha256(corpo).hexdigest()[:32] + '"'
+
+
+def responder_json(corpo, etag, request: Request):
+    """Resposta com ETag/Cache-Control: 304 se o cliente já tem este conteúdo."""
+    headers = {"ETag": etag, "Cache-Control": CACHE_CONTROL}
+    if _etag_confere(request.headers.get("if-none-match"), etag):
+        return Response(status_code=304, headers=headers)
+    return Response(content=corpo, media_type="application/json", headers=headers)
+
+
+class EstatisticasMaterializadas:
+    """As estatísticas de uma versão dos dados, calculadas e serializadas uma vez.
+
+    Cada resultado fica guardado como bytes JSON prontos, com um ETag forte
+    derivado do conteúdo. O cálculo acontece na primeira requisição (ou no
+    aquecimento após a recarga) e é feito uma única vez por versão; uma nova
+    versão dos dados gera uma nova instância, e o cache antigo é descartado.
+    """
+
+    def __init__(self, resultado_despesas, pasta_snapshot=None):
+        self.resultado_despesas = resultado_despesas
+        # Com snapshot, os resultados também são lidos e gravados na pasta dele
+        self.pasta_snapshot = pasta_snapshot
+        self.respostas = {}
+
+    def pendentes(self):
+        return [nome for nome in CALCULOS if nome not in self.respostas]
+
+    def do_snapshot(self, nome):
+        """Carrega a estatística se outro worker já a gravou no snapshot (True se carregou)."""
+        if self.pasta_snapshot is None:
+            return False
+        corpo = snapshot.ler_estatistica(self.pasta_snapshot, nome)
+        if corpo is not None:
+            self.guardar(nome, com_etag(corpo))
+        return corpo is not None
+
+    def argumentos(self, nome):
+        """Argumentos de `materializar`: a pasta do snapshot ou o DataFrame reduzido às colunas usadas."""
+        if self.pasta_snapshot is not None:
+            return nome, str(self.pasta_snapshot)
+        _, colunas = CALCULOS[nome]
+        df = self.resultado_despesas
+        if df is None:  # versão sem dados
+            import pandas as pd
+            return nome, pd.DataFrame()
+        return nome, (df[colunas] if not df.empty else df)
+
+    def guardar(self, nome, resposta):
+        self.respostas[nome] = resposta
+
+    def responder(self, nome, request: Request):
+        """Resposta da estatística `nome`: 304 se o cliente já tem a versão atual."""
+        if nome not in self.respostas and not self.do_snapshot(nome):  # uso síncrono: calcula aqui mesmo
+            self.guardar(nome, materializar(*self.argumentos(nome)))
+        return responder_json(*self.respostas[nome], request)
+
+
+def _etag_confere(if_none_match, etag):
+    """Comparação fraca do If-None-Match (RFC 9110), aceitando listas e '*'."""
+    if not if_none_match:
+        return False
+    candidatos = [c.strip() for c in if_none_match.split(",")]
+    return "*" in candidatos or any(
+        c.removeprefix("W/") == etag for c in candidatos)
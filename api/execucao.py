@@ -0,0 +1,101 @@
+import asyncio
+import multiprocessing
+import os
+from collections import Counter
+from concurrent.futures import ProcessPoolExecutor
+
+# Processos para os cálculos pesados (pandas); 0 usa o pool de threads padrão
+WORKERS_PROCESSOS = int(os.environ.get("API_WORKERS_PROCESSOS", 2))
+# Cálculos distintos da mesma rota executando ao mesmo tempo
+LIMITE_POR_ROTA = int(os.environ.get("API_LIMITE_POR_ROTA", 1))
+
+
+class ExecutorPesado:
+    """Executa cálculos pesados fora do event loop, sem deixá-los competir com as consultas.
+
+    - os cálculos rodam num pool de processos limitado (não seguram o GIL
+      do processo que atende as requisições);
+    - cada rota tem um limite de cálculos simultâneos; os excedentes esperam
+      na fila da rota;
+    - requisições idênticas simultâneas (mesma `chave`) compartilham um
+      único cálculo.
+
+    Todos os métodos rodam no event loop, então o estado não precisa de lock.
+    """
+
+    def __init__(self, workers=WORKERS_PROCESSOS, limite_por_rota=LIMITE_POR_ROTA):
+        self.workers = workers
+        self.limite_por_rota = limite_por_rota
+        self._pool = None
+        self._em_andamento = {}
+        self._semaforos = {}
+        self.fila = Counter()
+        self.executando = Counter()
+        self.coalescidas = Counter()
+        self.concluidas = Counter()
+        self.erros = Counter()
+
+    def _executor(self):
+        if self.workers <= 0:
+            return None  # pool de threads padrão do loop
+        if self._pool is None:
+            # spawn: os workers não herdam as threads nem os dados do servidor
+            self._pool = ProcessPoolExecutor(
+                max_workers=self.workers, mp_context=multiprocessing.get_context("spawn"))
+        return self._pool
+
+    async def executar(self, rota, chave, funcao, *args):
+        """Resultado de `funcao(*args)`, reaproveitando um cálculo em andamento de mesma `chave`."""
+        tarefa = self._em_andamento.get(chave)
+        if tarefa is None:
+            tarefa = asyncio.ensure_future(self._executar(rota, funcao, *args))
+            self._em_andamento[chave] = tarefa
+            tarefa.add_done_callback(lambda _: self._em_andamento.pop(chave, None))
+        else:
+            self.coalescidas[rota] += 1
+        # shield: uma requisição cancelada (cliente desconectou) não cancela as demais
+        return await asyncio.shield(tarefa)
+
+    async def _executar(self, rota, funcao, *args):
+        semaforo = self._semaforos.setdefault(rota, asyncio.Semaphore(self.limite_por_rota))
+        self.fila[rota] += 1
+        try:
+            await semaforo.acquire()
+        finally:
+            self.fila[rota] -= 1
+
+        self.executando[rota] += 1
+        try:
+            loop = asyncio.get_running_loop()
+            resultado = await loop.run_in_executor(self._executor(), funcao, *args)
+        except BaseException:
+            self.erros[rota] += 1
+            raise
+        finally:
+            self.executando[rota] -= 1
+            semaforo.release()
+        self.concluidas[rota] += 1
+        return resultado
+
+    def metricas(self):
+        rotas = sorted(set(self.fila) | set(self.executando) | set(self.concluidas))
+        return {
+            "workers": self.workers,
+            "limite_por_rota": self.limite_por_rota,
+            "fila_total": sum(self.fila.values()),
+            "rotas": {
+                rota: {
+                    "fila": self.fila[rota],
+                    "executando": self.executando[rota],
+                    "coalescidas": self.coalescidas[rota],
+                    "concluidas": self.concluidas[rota],
+                    "erros": self.erros[rota],
+                }
+                for rota in rotas
+            },
+        }
+
+    def encerrar(self):
+        if self._pool is not None:
+            self._pool.shutdown(wait=False, cancel_futures=True)
+            self._pool = None
@@ -0,0 +1,206 @@
+import numpy as np
+
+# Montagem do estado (arrays) compartilhada com o snapshot do ETL (src/snapshot_api.py)
+from src.indice_operadoras import NUMEROS, TEXTOS, montar_estado, textos_documentos, trigramas
+from src.indice_operadoras import tabela as tabela_do_estado
+
+# Campos das respostas -> coluna no índice
+CAMPOS = {
+    "RegistroANS": "registroans",
+    "RazaoSocial": "razaosocial",
+    "CNPJ": "cnpj",
+    "UF": "uf",
+    "Ano": "ano",
+    "Trimestre": "trimestre",
+    "ValorDespesas": "valordespesas",
+    "TotalDespesas": "totaldespesas",
+    "MediaTrimestral": "mediatrimestral",
+    "DesvioPadrao": "desviopadrao",
+}
+
+
+class TextoInternado:
+    """Coluna de texto: um código por linha e os valores distintos numa tabela.
+
+    `coluna[linhas]` devolve os textos das linhas, como um array de objetos;
+    os códigos podem ser um array mapeado do snapshot (api/snapshot.py).
+    """
+
+    def __init__(self, codigos, valores):
+        self.codigos = codigos
+        self.valores = np.asarray(valores, dtype=object)
+
+    def __len__(self):
+        return len(self.codigos)
+
+    def __getitem__(self, linhas):
+        return self.valores[self.codigos[linhas]]
+
+
+class IndiceOperadoras:
+    """Visão somente leitura de resultado_despesas, com índices montados uma vez na carga.
+
+    - colunas como arrays NumPy já tipados (sem conversões por requisição);
+      os textos internados, um código por linha;
+    - RegistroANS -> posições das linhas da operadora (registros ordenados);
+    - índice de trigramas sobre razão social (minúscula), registro e CNPJ,
+      construído sobre as operadoras distintas e não sobre as linhas.
+
+    Todo o estado é um conjunto de arrays (`estado`), montado de um
+    DataFrame ou lido de um snapshot mapeado em memória (api/snapshot.py).
+    """
+
+    def __init__(self, df=None):
+        self._usar(montar_estado(df))
+
+    @classmethod
+    def de_estado(cls, estado):
+        indice = cls.__new__(cls)
+        indice._usar(estado)
+        return indice
+
+    def _usar(self, estado):
+        self.estado = estado
+        self.total = len(estado["registroans"])
+        self.colunas = {c: estado[c] for c in NUMEROS}
+        for coluna in TEXTOS:
+            self.colunas[coluna] = TextoInternado(
+                estado[f"{coluna}.codigos"], estado[f"{coluna}.valores"])
+        self.todas = np.arange(self.total)
+
+        self._registros = estado["operadoras.registros"]
+        self._inicios_registro = estado["operadoras.inicios"]
+        self._linhas_registro = estado["operadoras.linhas"]
+
+        # Só as tabelas pequenas (por operadora e por trigrama) viram objetos Python;
+        # os campos de busca ficam em arrays de texto, comparados sem laço por documento
+        documentos = textos_documentos(estado)
+        self._campos_busca = [np.array([d[i] for d in documentos], dtype=np.dtypes.StringDType())
+                              for i in range(3)]
+        self._inicios_documento = estado["documentos.inicios"]
+        self._linhas_documento = estado["documentos.linhas"]
+        # Documento de cada linha, para passar de documentos encontrados a linhas em ordem
+        self._documento_linha = np.empty(self.total, dtype=np.int32)
+        self._documento_linha[self._linhas_documento] = np.repeat(
+            np.arange(len(documentos), dtype=np.int32), np.diff(self._inicios_documento))
+        self._trigramas = {t: i for i, t in enumerate(estado["trigramas.valores"])}
+        self._inicios_trigrama = estado["trigramas.inicios"]
+        self._documentos_trigrama = estado["trigramas.documentos"]
+
+    def tabela(self):
+        """resultado_despesas como DataFrame sobre os mesmos arrays, sem cópia."""
+        return tabela_do_estado(self.estado)
+
+    @property
+    def vazio(self):
+        return self.total == 0
+
+    def linhas_operadora(self, registro_ans):
+        """Posições das linhas de uma operadora (vazio se não existir)."""
+        texto = str(registro_ans)
+        # Só a forma canônica do número (ex.: '0300001' não é '300001')
+        if not texto.isdigit() or str(int(texto)) != texto:
+            return self.todas[:0]
+        registro = int(texto)
+        i = int(np.searchsorted(self._registros, registro))
+        if i == len(self._registros) or self._registros[i] != registro:
+            return self.todas[:0]
+        return self._linhas_registro[self._inicios_registro[i]:self._inicios_registro[i + 1]]
+
+    def buscar(self, termo):
+        """Posições das linhas cuja razão social, registro ou CNPJ contém `termo`.
+
+        O resultado mantém a ordem original das linhas, para a paginação ser
+        estável; sem termo, devolve todas as linhas. Termos com menos de 3
+        caracteres não têm trigramas: todos os documentos são comparados, em
+        lote (np.strings.find), como a listagem sem filtro.
+        """
+        if not termo:
+            return self.todas
+        termo = termo.lower()
+
+        candidatos = None
+        if len(termo) >= 3:
+            for trigrama in trigramas(termo):
+                posicao = self._trigramas.get(trigrama)
+                if posicao is None:
+                    return self.todas[:0]
+                docs = self._documentos_trigrama[
+                    self._inicios_trigrama[posicao]:self._inicios_trigrama[posicao + 1]]
+                candidatos = docs if candidatos is None else np.intersect1d(
+                    candidatos, docs, assume_unique=True)
+
+        # Os trigramas só filtram candidatos; a confirmação é por substring em cada campo
+        campos = self._campos_busca if candidatos is None else [
+            campo[candidatos] for campo in self._campos_busca]
+        achados = np.zeros(len(campos[0]), dtype=bool)
+        for campo in campos:
+            achados |= np.strings.find(campo, termo) >= 0
+        if candidatos is None:
+            # Sem trigramas o termo costuma casar boa parte das linhas: máscara por linha
+            return np.flatnonzero(achados[self._documento_linha])
+
+        inicios = self._inicios_documento
+        encontrados = [self._linhas_documento[inicios[doc]:inicios[doc + 1]]
+                       for doc in candidatos[achados].tolist()]
+        if not encontrados:
+            return self.todas[:0]
+        return np.sort(np.concatenate(encontrados))
+
+    def registros(self, linhas, campos):
+        """Serializa as linhas em lote: uma conversão por coluna, não por célula."""
+        valores = [self.colunas[CAMPOS[c]][linhas].tolist() for c in campos]
+        return [dict(zip(campos, linha)) for linha in zip(*valores)]
+
+    def em_colunas(self, linhas, campos):
+        """Mesmas linhas de `registros`, como um array por campo (sem repetir os nomes)."""
+        return {c: self.colunas[CAMPOS[c]][linhas].tolist() for c in campos}
+
+    def por_periodo(self, linhas, depois=None):
+        """`linhas` em ordem de (Ano, Trimestre), só as posteriores a `depois` se informado.
+
+        Usado na paginação por cursor do histórico: poucas linhas por operadora.
+        """
+        chaves = list(zip(self.colunas["ano"][linhas].tolist(),
+                          self.colunas["trimestre"][linhas].tolist()))
+        ordem = sorted(range(len(chaves)), key=chaves.__getitem__)
+        if depois is not None:
+            ordem = [i for i in ordem if chaves[i] > depois]
+        return linhas[ordem]
+
+    def apos_chave(self, linhas, depois, limite):
+        """Até `limite` de `linhas` em ordem de (RegistroANS, Ano, Trimestre), após a chave `depois`.
+
+        Paginação por cursor da listagem, com a mesma chave do modo banco.
+        Devolve também quantas linhas há depois da chave (para saber se há
+        próxima página). Só as linhas com os menores registros são ordenadas.
+        """
+        fora = 0
+        if len(linhas) == self.total:
+            # Sem filtro: pelo índice por operadora, só os `limite` + 1 registros a partir do
+            # cursor (cada um tem ao menos uma linha); o resto só entra na contagem
+            inicio = 0 if depois is None else int(np.searchsorted(self._registros, depois[0]))
+            fim = min(inicio + limite + 1, len(self._registros))
+            primeira, ultima = self._inicios_registro[inicio], self._inicios_registro[fim]
+            linhas, fora = self._linhas_registro[primeira:ultima], self.total - int(ultima)
+        registro = self.colunas["registroans"][linhas]
+        ano = self.colunas["ano"][linhas]
+        # Os códigos seguem a ordem dos textos na tabela (ordenada): comparar códigos é comparar textos
+        trimestre = self.colunas["trimestre"].codigos[linhas]
+        if depois is not None:
+            ultimo_registro, ultimo_ano, ultimo_trimestre = depois
+            codigo = np.searchsorted(self.colunas["trimestre"].valores, ultimo_trimestre, side="right")
+            manter = (registro > ultimo_registro) | (registro == ultimo_registro) & (
+                (ano > ultimo_ano) | (ano == ultimo_ano) & (trimestre >= codigo))
+            linhas, registro, ano, trimestre = (
+                linhas[manter], registro[manter], ano[manter], trimestre[manter])
+        restantes = len(linhas) + fora
+        if len(linhas) > limite:
+            corte = np.partition(registro, limite - 1)[limite - 1]
+            manter = registro <= corte
+            linhas, registro, ano, trimestre = (
+                linhas[manter], registro[manter], ano[manter], trimestre[manter])
+        return linhas[np.lexsort((trimestre, ano, registro))[:limite]], restantes
+
+    def soma(self, coluna, linhas):
+        return float(self.colunas[coluna][linhas].sum())
@@ -1,11 +1,61 @@
-from fastapi import FastAPI, HTTPException
+from fastapi import FastAPI, Header, HTTPException, Request
+from fastapi.concurrency import run_in_threadpool
+from fastapi.responses import JSONResponse, PlainTextResponse
 from fastapi.middleware.cors import CORSMiddleware
-import pandas as pd
-import glob
-from pathlib import Path
-from typing import List, Dict
-
-app = FastAPI(title="API de Operadoras")
+from pydantic import BaseModel
+from contextlib import asynccontextmanager
+import asyncio
+import hmac
+import os
+from api.dados import CadastroOperadoras, GerenciadorDados
+from api.estatisticas import CALCULOS, com_etag, materializar, responder_json, serializar
+from api.execucao import ExecutorPesado
+from api.metricas import Metricas, MiddlewareMetricas, metrica
+from api.compressao import MiddlewareCompressao
+from api.respostas import (codificar_cursor, decodificar_cursor, projetar, resposta_json,
+                           selecionar_campos, validar_formato)
+
+# Origem dos dados: 'memoria' (arquivo em data/, padrão) ou 'postgres' (ANS_DATABASE_URL)
+BACKEND = os.environ.get("API_BACKEND", "memoria").lower()
+# Carga inicial em segundo plano: o servidor aceita conexões na hora e
+# /api/saude responde 503 até os índices ficarem prontos; 0 carrega antes de subir
+CARGA_SEGUNDO_PLANO = os.environ.get("API_CARGA_SEGUNDO_PLANO", "1") != "0"
+
+
+async def carregar_dados():
+    # Fora do event loop: a leitura e os índices não travam /api/saude
+    try:
+        await asyncio.to_thread(gerenciador.recarregar, True)
+    except Exception as e:
+        print(f"ERRO CRÍTICO NO BACKEND: {e}")
+
+
+@asynccontextmanager
+async def lifespan(app):
+    if banco is not None:
+        await banco.abrir()
+        yield
+        await banco.fechar()
+        return
+
+    loop = asyncio.get_running_loop()
+    # Cada versão publicada (pela carga inicial, pelo observador ou pela rota
+    # de recarga, fora do event loop) já começa a calcular as estatísticas
+    gerenciador.ao_publicar.append(
+        lambda versao: asyncio.run_coroutine_threadsafe(aquecer_estatisticas(versao), loop))
+    carga = asyncio.ensure_future(carregar_dados())
+    if not CARGA_SEGUNDO_PLANO:
+        await carga
+
+    # Verifica periodicamente se há um arquivo novo em data/ (API_INTERVALO_RECARGA)
+    gerenciador.iniciar_observador()
+    yield
+    gerenciador.parar_observador()
+    await carga  # a thread de carga não pode ser interrompida
+    executor.encerrar()
+
+
+app = FastAPI(title="API de Operadoras", lifespan=lifespan)
 
 # --- CONFIGURAÇÃO DE CORS --- #
 origins = [
@@ -23,242 +73,350 @@ app.add_middleware(
     allow_headers=["*"],
 )
 
-# --- CAMINHO CSV com possibilidade de sufixo ao exportar do DBeaver--- #
-DATA_DIR = Path(__file__).parent.parent / "data"
-resultado_despesas_pattern = str(DATA_DIR / "resultado_despesas*.csv")
+# --- COMPRESSÃO (brotli, se instalado, ou gzip conforme o Accept-Encoding) --- #
+app.add_middleware(MiddlewareCompressao)
 
-resultado_despesas = pd.DataFrame()
+# --- MÉTRICAS (Prometheus em /metrics) --- #
+# Adicionado por último: é o middleware mais externo e mede também o CORS
+metricas = Metricas()
+app.add_middleware(MiddlewareMetricas, metricas=metricas)
 
-# --- LEITURA E PROCESSAMENTO DO CSV --- #
-try:
-    resultado_despesas_files = glob.glob(resultado_despesas_pattern)
+# --- DADOS: versão publicada + recarga sem reiniciar o servidor --- #
+# Token da rota de recarga (header X-Admin-Token); sem ele a rota recusa tudo
+ADMIN_TOKEN = os.environ.get("API_ADMIN_TOKEN")
 
-    if not resultado_despesas_files:
-        print(f"AVISO: Nenhum CSV encontrado em {DATA_DIR}")
-    else:
-        RESULTADO_DESPESAS_PATH = resultado_despesas_files[0]
-        print(f"Carregando arquivo: {RESULTADO_DESPESAS_PATH}")
+gerenciador = GerenciadorDados()
+# Cálculos pesados (estatísticas) em processos separados, com fila por rota
+executor = ExecutorPesado()
+banco = None
 
-        resultado_despesas = pd.read_csv(
-            RESULTADO_DESPESAS_PATH, encoding="utf-8", sep=None, engine='python')
+if BACKEND == "postgres":
+    # Consultas direto no banco: nenhum dado em memória, vários workers sem cópias
+    from api.banco import BancoOperadoras
+    banco = BancoOperadoras()
 
-        resultado_despesas.columns = [c.lower().strip()
-                                      for c in resultado_despesas.columns]
 
-        num_cols = ["valordespesas", "totaldespesas",
-                    "mediatrimestral", "desviopadrao", "registroans", "ano"]
-        for col in num_cols:
-            if col in resultado_despesas.columns:
-                resultado_despesas[col] = (
-                    resultado_despesas[col].astype(str)
-                    .str.replace('.', '', regex=False)
-                    .str.replace(',', '.', regex=False)
-                    .str.strip()
-                )
-                resultado_despesas[col] = pd.to_numeric(
-                    resultado_despesas[col], errors='coerce').fillna(0)
+def versao_publicada():
+    """Versão atual dos dados; 503 enquanto a primeira carga não terminou."""
+    if not gerenciador.pronto.is_set():
+        raise HTTPException(status_code=503, detail="Dados ainda carregando",
+                            headers={"Retry-After": "1"})
+    return gerenciador.atual
 
-        resultado_despesas = resultado_despesas.dropna(
-            subset=["registroans", "razaosocial"])
 
-        print(f"Sucesso! {len(resultado_despesas)} linhas carregadas.")
+# --- SAÚDE (readiness) --- #
 
-except Exception as e:
-    print(f"ERRO CRÍTICO NO BACKEND: {e}")
+@app.get("/api/saude")
+async def saude():
+    # 200 só com os índices montados: o balanceador não manda tráfego antes disso
+    if banco is not None:
+        return {"status": "pronto", "backend": BACKEND}
+    if not gerenciador.pronto.is_set():
+        conteudo = {"status": "carregando"}
+        if gerenciador.erro:
+            conteudo["erro"] = gerenciador.erro
+        return JSONResponse(conteudo, status_code=503, headers={"Retry-After": "1"})
+    versao = gerenciador.atual
+    return {"status": "pronto", "backend": BACKEND, "versao": versao.numero,
+            "linhas": versao.indice.total, "carga_segundos": round(versao.duracao_carga, 3)}
 
 
 # --- ROTAS OPERADORAS --- #
 
-@app.get("/api/operadoras")
-def listar_operadoras(page: int = 1, limit: int = 50, q: str = None):
-    if resultado_despesas.empty:
-        return {"data": [], "total": 0}
+CAMPOS_LISTA = ["RegistroANS", "RazaoSocial", "CNPJ", "UF", "Ano",
+                "Trimestre", "ValorDespesas", "TotalDespesas"]
+CAMPOS_HISTORICO = ["Ano", "Trimestre", "ValorDespesas",
+                    "MediaTrimestral", "DesvioPadrao"]
+# Trimestres por página do histórico quando só o cursor é informado
+LIMITE_HISTORICO = 40
+
 
-    df_result = resultado_despesas.copy()
+def _parametros_resposta(fields, formato, permitidos):
+    """Campos (?fields=) e formato (?formato=) validados; 400 se inválidos."""
+    try:
+        return selecionar_campos(fields, permitidos), validar_formato(formato)
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
 
-    # --- Verificação do valor de 'q' --- #
-    print(f"Termo de busca: {q}")
 
-    # --- BUSCA GLOBAL NO DATAFRAME --- #
-    if q:
-        q = q.lower()  # Normaliza o termo de busca para minúsculo
-        print(f"Busca com o termo: {q}")  # Exibe o termo de busca no terminal
+def _linhas_resposta(indice, linhas, campos, formato):
+    if formato == "colunas":
+        return indice.em_colunas(linhas, campos)
+    return indice.registros(linhas, campos)
 
-        # Filtro por Razão Social, Registro ANS ou CNPJ (em minúsculas para busca insensível a maiúsculas)
-        mask = (
-            df_result["razaosocial"].astype(str).str.lower().str.contains(q) |
-            df_result["registroans"].astype(str).str.contains(q) |
-            df_result["cnpj"].astype(str).str.contains(
-                q)  # Adiciona a busca pelo CNPJ
-        )
-        df_result = df_result[mask]
 
-    total_filtrado = len(df_result)
+@app.get("/api/operadoras")
+async def listar_operadoras(page: int = 1, limit: int = 50, q: str = None,
+                            cursor: str = None, fields: str = None, formato: str = "registros"):
+    campos, formato = _parametros_resposta(fields, formato, CAMPOS_LISTA)
+    if banco is not None:
+        try:
+            resposta = await banco.listar(page, limit, q, cursor)
+        except ValueError as e:
+            raise HTTPException(status_code=400, detail=str(e))
+        resposta["data"] = projetar(resposta["data"], campos, formato)
+        return resposta_json(resposta)
+
+    indice = versao_publicada().indice
+    if indice.vazio:
+        return resposta_json({"data": projetar([], campos, formato), "total": 0})
+
+    # --- BUSCA GLOBAL NO ÍNDICE --- #
+    # Filtro por Razão Social, Registro ANS ou CNPJ (insensível a maiúsculas)
+    linhas = indice.buscar(q)
+
+    # --- PAGINAÇÃO POR CURSOR: chave (RegistroANS, Ano, Trimestre), como no modo banco --- #
+    # `?cursor=` vazio começa do início
+    if cursor is not None:
+        if limit < 1:
+            raise HTTPException(status_code=400, detail="limit deve ser positivo")
+        try:
+            depois = decodificar_cursor(cursor, (int, int, str)) if cursor else None
+        except ValueError as e:
+            raise HTTPException(status_code=400, detail=str(e))
+        pagina, restantes = indice.apos_chave(linhas, depois, limit)
+        proximo = None
+        if restantes > limit:
+            ultima = pagina[-1]
+            proximo = codificar_cursor(indice.colunas["registroans"][ultima],
+                                       indice.colunas["ano"][ultima],
+                                       indice.colunas["trimestre"][ultima])
+        return resposta_json({
+            "page": page,
+            "limit": limit,
+            "total": len(linhas),
+            "data": _linhas_resposta(indice, pagina, campos, formato),
+            "proximo_cursor": proximo,
+        })
 
     # --- PAGINAÇÃO DOS RESULTADOS FILTRADOS --- #
     start = (page - 1) * limit
     end = start + limit
-    df_page = df_result.iloc[start:end]
-
-    data = []
-    for _, row in df_page.iterrows():
-        data.append({
-            "RegistroANS": int(row["registroans"]),
-            "RazaoSocial": str(row["razaosocial"]),
-            "CNPJ": str(row["cnpj"]),  # Incluindo CNPJ nos dados retornados
-            "UF": str(row.get("uf", "N/A")),
-            "Ano": int(row["ano"]),
-            "Trimestre": str(row["trimestre"]),
-            "ValorDespesas": float(row["valordespesas"]),
-            "TotalDespesas": float(row["totaldespesas"])
-        })
 
-    return {
+    return resposta_json({
         "page": page,
         "limit": limit,
-        "total": total_filtrado,
-        "data": data
-    }
+        "total": len(linhas),
+        "data": _linhas_resposta(indice, linhas[start:end], campos, formato)
+    })
 
 
 @app.get("/api/operadoras/{registro_ans}")
-def detalhe_operadora(registro_ans: str):
-    mask = resultado_despesas["registroans"].astype(
-        int).astype(str) == str(registro_ans)
-    df = resultado_despesas[mask]
+async def detalhe_operadora(registro_ans: str):
+    if banco is not None:
+        detalhe = await banco.detalhe(registro_ans)
+        if detalhe is None:
+            raise HTTPException(status_code=404, detail="Operadora não encontrada")
+        return detalhe
+
+    indice = versao_publicada().indice
+    linhas = indice.linhas_operadora(registro_ans)
 
-    if df.empty:
+    if len(linhas) == 0:
         raise HTTPException(status_code=404, detail="Operadora não encontrada")
 
-    row = df.iloc[0]
-    return {
-        "RegistroANS": int(row["registroans"]),
-        "RazaoSocial": str(row["razaosocial"]),
-        "UF": str(row.get("uf", "N/A")),
-        "TotalDespesas": float(df["valordespesas"].sum())
-    }
+    detalhe = indice.registros(linhas[:1], ["RegistroANS", "RazaoSocial", "UF"])[0]
+    detalhe["TotalDespesas"] = indice.soma("valordespesas", linhas)
+    return detalhe
 
 
 @app.get("/api/operadoras/{registro_ans}/despesas")
-def historico_despesas(registro_ans: str):
-    mask = resultado_despesas["registroans"].astype(
-        int).astype(str) == str(registro_ans)
-    df = resultado_despesas[mask]
-
-    if df.empty:
-        return []
-
-    return [
-        {
-            "Ano": int(row["ano"]),
-            "Trimestre": str(row["trimestre"]),
-            "ValorDespesas": float(row["valordespesas"]),
-            "MediaTrimestral": float(row.get("mediatrimestral", 0)),
-            "DesvioPadrao": float(row.get("desviopadrao", 0))
-        }
-        for _, row in df.iterrows()
-    ]
+async def historico_despesas(registro_ans: str, fields: str = None, formato: str = "registros",
+                             limit: int = None, cursor: str = None):
+    campos, formato = _parametros_resposta(fields, formato, CAMPOS_HISTORICO)
+    # Paginação opcional por (Ano, Trimestre): sem limit/cursor, o histórico inteiro
+    paginado = limit is not None or cursor is not None
+    limite = LIMITE_HISTORICO if limit is None else limit
+    if limite < 1:
+        raise HTTPException(status_code=400, detail="limit deve ser positivo")
+    try:
+        depois = decodificar_cursor(cursor, (int, str)) if cursor else None
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+
+    proximo = None
+    if banco is not None:
+        # Uma linha a mais indica se há próxima página
+        registros = await banco.historico(registro_ans, limite + 1 if paginado else None, depois)
+        if paginado and len(registros) > limite:
+            registros = registros[:limite]
+            proximo = codificar_cursor(registros[-1]["Ano"], registros[-1]["Trimestre"])
+        dados = projetar(registros, campos, formato)
+    else:
+        indice = versao_publicada().indice
+        linhas = indice.linhas_operadora(registro_ans)
+        if paginado:
+            linhas = indice.por_periodo(linhas, depois)
+            if len(linhas) > limite:
+                linhas = linhas[:limite]
+                proximo = codificar_cursor(indice.colunas["ano"][linhas[-1]],
+                                           indice.colunas["trimestre"][linhas[-1]])
+        dados = _linhas_resposta(indice, linhas, campos, formato)
+
+    if not paginado and formato == "registros":
+        return resposta_json(dados)  # lista, como antes da paginação
+    return resposta_json({"data": dados, "proximo_cursor": proximo})
+
+
+# --- CONSULTA EM LOTE NO CADASTRO --- #
+# Resolve milhares de CNPJs/RegistroANS por requisição no registro de operadoras
+# do pipeline (src/registro.py): busca binária nas chaves inteiras, sem varrer o resultado.
+
+# Chaves (registros + CNPJs) aceitas por requisição
+LIMITE_CONSULTA = int(os.environ.get("API_LIMITE_CONSULTA", 10000))
+cadastro = CadastroOperadoras()
+
+
+class ConsultaCadastro(BaseModel):
+    registros: list[int | str] = []
+    cnpjs: list[str] = []  # com ou sem pontuação
+
+
+@app.post("/api/operadoras/consulta")
+async def consultar_cadastro(consulta: ConsultaCadastro):
+    # Uma posição por chave pedida, na mesma ordem: o cadastro ou null
+    if len(consulta.registros) + len(consulta.cnpjs) > LIMITE_CONSULTA:
+        raise HTTPException(status_code=400,
+                            detail=f"no máximo {LIMITE_CONSULTA} chaves por consulta")
+    if banco is not None:
+        resposta = {"versao": None,
+                    **await banco.consultar_cadastro(consulta.registros, consulta.cnpjs)}
+    else:
+        registro = await run_in_threadpool(cadastro.atual)
+        if registro is None:
+            raise HTTPException(status_code=503, detail="Cadastro de operadoras indisponível")
+        resposta = {"versao": registro.versao, **await run_in_threadpool(
+            registro.consultar, consulta.registros, consulta.cnpjs)}
+    resposta["nao_encontrados"] = {nome: resposta[nome].count(None)
+                                   for nome in ("registros", "cnpjs")}
+    return resposta_json(resposta)
 
 
 # --- ROTAS DE ESTATÍSTICAS --- #
+# Servidas do cache da versão carregada, com ETag (If-None-Match -> 304).
+# Se ainda não foram calculadas, o cálculo vai para o pool de processos e
+# requisições simultâneas da mesma estatística esperam o mesmo cálculo.
+
+async def materializar_estatistica(versao, nome):
+    estatisticas = versao.estatisticas
+    if nome not in estatisticas.respostas and not estatisticas.do_snapshot(nome):
+        resposta = await executor.executar(
+            f"estatisticas/{nome}", (versao.numero, nome),
+            materializar, *estatisticas.argumentos(nome))
+        estatisticas.guardar(nome, resposta)
+    return estatisticas
+
+
+async def aquecer_estatisticas(versao):
+    try:
+        await asyncio.gather(*(materializar_estatistica(versao, nome) for nome in CALCULOS))
+    except Exception as e:
+        print(f"ERRO ao calcular as estatísticas: {e}")
+
+
+async def responder_estatistica(nome, request):
+    if banco is not None:
+        resposta = responder_json(*com_etag(serializar(await banco.estatistica(nome))), request)
+    else:
+        versao = versao_publicada()
+        metricas.registrar_cache("estatisticas", nome in versao.estatisticas.respostas)
+        estatisticas = await materializar_estatistica(versao, nome)
+        resposta = estatisticas.responder(nome, request)
 
-# 1. Operadoras com Maior Crescimento Percentual
-@app.get("/api/estatisticas/crescimento")
-def obter_crescimento_percentual():
-    if resultado_despesas.empty:
-        return []
+    # Revalidação do cliente: acerto quando o ETag enviado ainda vale (304)
+    if request.headers.get("if-none-match"):
+        metricas.registrar_cache("etag", resposta.status_code == 304)
+    return resposta
 
-    # 1. Criar a chave temporal correta primeiro
-    df = resultado_despesas.copy()
-    df['periodo'] = df['ano'].astype(str) + '-' + df['trimestre'].astype(str)
-
-    # 2. Agrupar para achar o min/max do PERÍODO, não só do ano
-    primeiro_ultimo = df.groupby(['registroans', 'razaosocial']).agg(
-        primeiro_periodo=('periodo', 'min'),
-        ultimo_periodo=('periodo', 'max')
-    ).reset_index()
-
-    # 3. Merge para buscar os valores iniciais
-    primeiro_ultimo = primeiro_ultimo.merge(
-        df[['registroans', 'periodo', 'valordespesas']],
-        left_on=['registroans', 'primeiro_periodo'],
-        right_on=['registroans', 'periodo'],
-        how='left'
-    ).rename(columns={'valordespesas': 'valordespesas_inicial'}).drop(columns=['periodo'])
-
-    # 4. Merge para buscar os valores finais
-    primeiro_ultimo = primeiro_ultimo.merge(
-        df[['registroans', 'periodo', 'valordespesas']],
-        left_on=['registroans', 'ultimo_periodo'],
-        right_on=['registroans', 'periodo'],
-        how='left'
-    ).rename(columns={'valordespesas': 'valordespesas_final'}).drop(columns=['periodo'])
-
-    # 5. Cálculo com a mesma lógica do SQL (* 100)
-    # tratando a divisão por zero
-    mask = primeiro_ultimo['valordespesas_inicial'] != 0
-    primeiro_ultimo['crescimento_percentual'] = 0.0
-
-    primeiro_ultimo.loc[mask, 'crescimento_percentual'] = (
-        (primeiro_ultimo['valordespesas_final'] - primeiro_ultimo['valordespesas_inicial']) /
-        primeiro_ultimo['valordespesas_inicial']
-    ) * 100
-
-    # Ordenação e limpeza
-    top_5 = primeiro_ultimo.sort_values(
-        by='crescimento_percentual', ascending=False).head(5)
-    return top_5.to_dict(orient='records')
-
-
-# 2. Distribuição de Despesas por UF
-@app.get("/api/estatisticas/despesas_uf")
-def obter_despesas_por_uf():
-    if resultado_despesas.empty:
-        return []
 
-    despesas_por_uf = resultado_despesas.groupby(['uf']).agg(
-        total_despesas_uf=('totaldespesas', 'sum'),
-        media_despesas_por_operadora=('totaldespesas', 'mean')
-    ).reset_index()
+@app.get("/api/estatisticas/crescimento")
+async def obter_crescimento_percentual(request: Request):
+    return await responder_estatistica("crescimento", request)
 
-    # Seleciona os 5 estados com maiores despesas totais
-    top_5_uf = despesas_por_uf.sort_values(
-        by='total_despesas_uf', ascending=False).head(5)
 
-    return top_5_uf.to_dict(orient='records')
+@app.get("/api/estatisticas/despesas_uf")
+async def obter_despesas_por_uf(request: Request):
+    return await responder_estatistica("despesas_uf", request)
 
 
-# 3. Operadoras Acima da Média
 @app.get("/api/estatisticas/acima_media")
-def obter_operadoras_acima_media():
-    if resultado_despesas.empty:
-        return []
-
-    # 1. Calcular a média geral das despesas
-    media_geral = resultado_despesas['valordespesas'].mean()
-
-    # 2. Criar a coluna 'acima_media' que indica se as despesas estão acima da média
-    operadoras_acima_media = resultado_despesas.copy()
-    operadoras_acima_media['acima_media'] = operadoras_acima_media['valordespesas'] > media_geral
+async def obter_operadoras_acima_media(request: Request):
+    return await responder_estatistica("acima_media", request)
 
-    # 3. Contagem dos trimestres acima da média e soma das despesas
-    operadoras_acima_media = operadoras_acima_media.groupby(['registroans', 'razaosocial']).agg(
-        trimestres_acima_media=('acima_media', 'sum'),
-        total_despesas_acima_media=('valordespesas', 'sum')
-    ).reset_index()
 
-    # 4. Filtrar as operadoras que têm mais de 2 trimestres acima da média
-    operadoras_acima_media = operadoras_acima_media[operadoras_acima_media['trimestres_acima_media'] >= 2]
+# --- MÉTRICAS DE EXECUÇÃO --- #
 
-    # 5. Simular o RANK() (classificação) com base na lógica do SQL
-    operadoras_acima_media['ranking'] = operadoras_acima_media['trimestres_acima_media'] * \
-        1000 + operadoras_acima_media['total_despesas_acima_media']
+@app.get("/api/metricas/execucao")
+async def metricas_execucao():
+    # Profundidade da fila e cálculos em andamento/coalescidos por rota
+    return executor.metricas()
 
-    # 6. Ordenar pela classificação para obter o ranking desejado
-    operadoras_acima_media = operadoras_acima_media.sort_values(
-        by=['trimestres_acima_media', 'total_despesas_acima_media'],
-        ascending=[False, False]
-    ).reset_index(drop=True)
 
-    # 7. Retornar apenas as colunas desejadas
-    return operadoras_acima_media[['registroans', 'razaosocial', 'trimestres_acima_media', 'total_despesas_acima_media', 'ranking']].to_dict(orient='records')
+def metricas_dados():
+    """Versão publicada: lida na coleta, sempre a atual."""
+    if banco is not None:
+        return []
+    versao = gerenciador.atual
+    return (
+        metrica("api_dados_versao", "gauge", "Número da versão dos dados publicada.",
+                [({}, versao.numero)])
+        + metrica("api_dados_linhas", "gauge", "Linhas de resultado_despesas na versão publicada.",
+                  [({}, versao.indice.total)])
+        + metrica("api_dados_carga_segundos", "gauge",
+                  "Duração da carga da versão publicada (leitura e índices).",
+                  [({}, versao.duracao_carga)])
+        + metrica("api_dados_carregados_em_segundos", "gauge",
+                  "Momento (epoch) em que a versão publicada foi montada.",
+                  [({}, versao.carregada_em)])
+    )
+
+
+def metricas_executor():
+    """Fila e cálculos do pool de estatísticas, por rota."""
+    rotas = executor.metricas()["rotas"]
+    linhas = []
+    for nome, tipo, ajuda, campo in (
+            ("api_calculos_fila", "gauge", "Cálculos esperando na fila da rota.", "fila"),
+            ("api_calculos_executando", "gauge", "Cálculos em execução.", "executando"),
+            ("api_calculos_coalescidos_total", "counter",
+             "Requisições atendidas por um cálculo já em andamento.", "coalescidas"),
+            ("api_calculos_concluidos_total", "counter", "Cálculos concluídos.", "concluidas"),
+            ("api_calculos_erros_total", "counter", "Cálculos com erro.", "erros")):
+        linhas += metrica(nome, tipo, ajuda,
+                          [({"rota": rota}, valores[campo]) for rota, valores in rotas.items()])
+    return linhas
+
+
+metricas.coletores += [metricas_dados, metricas_executor]
+
+
+@app.get("/metrics", include_in_schema=False)
+async def exportar_metricas():
+    return PlainTextResponse(metricas.exposicao(),
+                             media_type="text/plain; version=0.0.4; charset=utf-8")
+
+
+# --- ROTAS ADMINISTRATIVAS --- #
+
+@app.post("/api/admin/reload")
+async def recarregar_dados(x_admin_token: str = Header(None)):
+    # Sem API_ADMIN_TOKEN a recarga manual fica desativada (a automática continua)
+    if not ADMIN_TOKEN or not hmac.compare_digest(
+            (x_admin_token or "").encode(), ADMIN_TOKEN.encode()):
+        raise HTTPException(status_code=403, detail="Token inválido")
+    if banco is not None:
+        raise HTTPException(status_code=409, detail="Recarga não se aplica ao modo postgres")
+
+    # A carga roda fora do event loop; as requisições seguem na versão atual até a troca
+    try:
+        publicada = await run_in_threadpool(gerenciador.recarregar, True)
+    except Exception as e:
+        raise HTTPException(status_code=500, detail=f"Falha ao recarregar: {e}")
+
+    versao = gerenciador.atual
+    return {
+        "recarregado": publicada,
+        "versao": versao.numero,
+        "arquivo": versao.assinatura[0] if versao.assinatura else None,
+        "linhas": versao.indice.total,
+    }
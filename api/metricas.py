@@ -0,0 +1,193 @@
+import bisect
+import json
+import logging
+import os
+import random
+import sys
+import threading
+import time
+from collections import Counter
+
+# Limites (le) dos histogramas: latência em segundos, tamanhos em bytes
+LIMITES_LATENCIA = (0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10)
+LIMITES_TAMANHO = (0, 256, 1024, 4096, 16384, 65536, 262144, 1048576, 4194304)
+
+# Fração das requisições registradas no log; erros (5xx) e lentas são sempre registradas
+AMOSTRA_LOG = float(os.environ.get("API_LOG_AMOSTRA", 0.01))
+LENTA_MS = float(os.environ.get("API_LOG_LENTA_MS", 1000))
+
+# Rótulo das requisições que não casaram com nenhuma rota (evita um rótulo por URL)
+SEM_ROTA = "<sem_rota>"
+
+log = logging.getLogger("api.requisicoes")
+if not log.handlers:
+    _handler = logging.StreamHandler(sys.stdout)
+    _handler.setFormatter(logging.Formatter("%(message)s"))
+    log.addHandler(_handler)
+    log.setLevel(logging.INFO)
+    log.propagate = False
+
+
+class Histograma:
+    """Histograma cumulativo no formato do Prometheus (buckets `le`, soma e contagem)."""
+
+    def __init__(self, limites):
+        self.limites = limites
+        self.buckets = [0] * (len(limites) + 1)  # o último é o +Inf
+        self.soma = 0.0
+        self.contagem = 0
+
+    def observar(self, valor):
+        self.buckets[bisect.bisect_left(self.limites, valor)] += 1
+        self.soma += valor
+        self.contagem += 1
+
+    def linhas(self, nome, rotulos):
+        acumulado = 0
+        for limite, quantidade in zip(self.limites + ("+Inf",), self.buckets):
+            acumulado += quantidade
+            yield f'{nome}_bucket{_rotulos({**rotulos, "le": limite})} {acumulado}'
+        yield f"{nome}_sum{_rotulos(rotulos)} {self.soma}"
+        yield f"{nome}_count{_rotulos(rotulos)} {self.contagem}"
+
+
+def _escapar(valor):
+    return str(valor).replace("\\", "\\\\").replace("\n", "\\n").replace('"', '\\"')
+
+
+def _rotulos(rotulos):
+    if not rotulos:
+        return ""
+    return "{" + ",".join(f'{k}="{_escapar(v)}"' for k, v in rotulos.items()) + "}"
+
+
+class Metricas:
+    """Contadores e histogramas das requisições, expostos no formato texto do Prometheus.
+
+    As requisições são registradas pelo MiddlewareMetricas; o estado dos
+    dados (versão, linhas, tempo de carga) e das filas de cálculo é lido no
+    momento da coleta, pelas funções em `coletores`.
+    """
+
+    def __init__(self):
+        # Atualizadas pelo event loop e, na recarga, pela thread do observador
+        self._lock = threading.Lock()
+        self.requisicoes = Counter()  # (metodo, rota, status) -> total
+        self.latencia = {}  # (metodo, rota) -> Histograma
+        self.tamanho_requisicao = {}
+        self.tamanho_resposta = {}
+        self.cache = Counter()  # (cache, resultado) -> total
+        # Funções sem argumentos que devolvem linhas extras da exposição
+        self.coletores = []
+
+    def registrar_requisicao(self, metodo, rota, status, segundos, bytes_requisicao, bytes_resposta):
+        chave = (metodo, rota)
+        with self._lock:
+            self.requisicoes[(metodo, rota, status)] += 1
+            for histogramas, limites, valor in (
+                    (self.latencia, LIMITES_LATENCIA, segundos),
+                    (self.tamanho_requisicao, LIMITES_TAMANHO, bytes_requisicao),
+                    (self.tamanho_resposta, LIMITES_TAMANHO, bytes_resposta)):
+                histograma = histogramas.get(chave)
+                if histograma is None:
+                    histograma = histogramas[chave] = Histograma(limites)
+                histograma.observar(valor)
+
+    def registrar_cache(self, cache, acerto):
+        """Consulta a um cache (`cache`): acerto ou falta."""
+        with self._lock:
+            self.cache[(cache, "acerto" if acerto else "falta")] += 1
+
+    def exposicao(self):
+        """Texto no formato de exposição do Prometheus (version=0.0.4)."""
+        linhas = []
+        with self._lock:
+            linhas += ["# HELP api_requisicoes_total Requisições atendidas, por rota e status.",
+                       "# TYPE api_requisicoes_total counter"]
+            for (metodo, rota, status), total in sorted(self.requisicoes.items()):
+                rotulos = {"metodo": metodo, "rota": rota, "status": status}
+                linhas.append(f"api_requisicoes_total{_rotulos(rotulos)} {total}")
+
+            for nome, ajuda, histogramas in (
+                    ("api_requisicao_duracao_segundos", "Latência das requisições, por rota.", self.latencia),
+                    ("api_requisicao_bytes", "Tamanho do corpo das requisições, por rota.", self.tamanho_requisicao),
+                    ("api_resposta_bytes", "Tamanho do corpo das respostas, por rota.", self.tamanho_resposta)):
+                linhas += [f"# HELP {nome} {ajuda}", f"# TYPE {nome} histogram"]
+                for (metodo, rota), histograma in sorted(histogramas.items()):
+                    linhas += histograma.linhas(nome, {"metodo": metodo, "rota": rota})
+
+            linhas += ["# HELP api_cache_consultas_total Consultas a caches (estatísticas materializadas, ETag).",
+                       "# TYPE api_cache_consultas_total counter"]
+            for (cache, resultado), total in sorted(self.cache.items()):
+                rotulos = {"cache": cache, "resultado": resultado}
+                linhas.append(f"api_cache_consultas_total{_rotulos(rotulos)} {total}")
+
+        for coletor in self.coletores:
+            linhas += coletor()
+        return "\n".join(linhas) + "\n"
+
+
+def metrica(nome, tipo, ajuda, valores):
+    """Linhas de uma métrica simples: `valores` é uma lista de (rótulos, valor)."""
+    linhas = [f"# HELP {nome} {ajuda}", f"# TYPE {nome} {tipo}"]
+    linhas += [f"{nome}{_rotulos(rotulos)} {valor}" for rotulos, valor in valores]
+    return linhas
+
+
+def registrar_log(dados, forcar=False):
+    """Uma linha JSON por requisição amostrada (AMOSTRA_LOG), ou sempre com `forcar`."""
+    if forcar or random.random() < AMOSTRA_LOG:
+        log.info(json.dumps(dados, ensure_ascii=False, separators=(",", ":")))
+
+
+class MiddlewareMetricas:
+    """Middleware ASGI: mede latência e tamanhos de cada requisição HTTP.
+
+    A rota é o modelo do caminho (ex.: /api/operadoras/{registro_ans}), para
+    que o número de séries não cresça com os parâmetros.
+    """
+
+    def __init__(self, app, metricas):
+        self.app = app
+        self.metricas = metricas
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http":
+            return await self.app(scope, receive, send)
+
+        inicio = time.perf_counter()
+        tamanhos = {"requisicao": 0, "resposta": 0}
+        status = 500  # se a aplicação falhar antes de responder
+
+        async def receber():
+            mensagem = await receive()
+            if mensagem["type"] == "http.request":
+                tamanhos["requisicao"] += len(mensagem.get("body", b""))
+            return mensagem
+
+        async def enviar(mensagem):
+            nonlocal status
+            if mensagem["type"] == "http.response.start":
+                status = mensagem["status"]
+            elif mensagem["type"] == "http.response.body":
+                tamanhos["resposta"] += len(mensagem.get("body", b""))
+            await send(mensagem)
+
+        try:
+            await self.app(scope, receber, enviar)
+        finally:
+            segundos = time.perf_counter() - inicio
+            rota = getattr(scope.get("route"), "path", SEM_ROTA)
+            self.metricas.registrar_requisicao(
+                scope["method"], rota, str(status), segundos,
+                tamanhos["requisicao"], tamanhos["resposta"])
+            registrar_log({
+                "evento": "requisicao",
+                "metodo": scope["method"],
+                "rota": rota,
+                "caminho": scope["path"],
+                "consulta": scope.get("query_string", b"").decode("latin-1"),
+                "status": status,
+                "ms": round(segundos * 1000, 2),
+                "bytes_resposta": tamanhos["resposta"],
+            }, forcar=status >= 500 or segundos * 1000 >= LENTA_MS)
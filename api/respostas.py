@@ -0,0 +1,61 @@
+import base64
+import json
+
+from fastapi import Response
+from fastapi.encoders import jsonable_encoder
+
+# Formatos de `?formato=`: lista de objetos (padrão) ou um array por coluna
+FORMATOS = ("registros", "colunas")
+
+
+def selecionar_campos(fields, permitidos):
+    """Campos pedidos em `?fields=a,b` (na ordem pedida), ou todos os `permitidos`."""
+    if not fields:
+        return list(permitidos)
+    campos = list(dict.fromkeys(c.strip() for c in fields.split(",") if c.strip()))
+    desconhecidos = [c for c in campos if c not in permitidos]
+    if desconhecidos or not campos:
+        invalidos = ", ".join(desconhecidos) or repr(fields)
+        raise ValueError(f"campos inválidos: {invalidos}; disponíveis: {', '.join(permitidos)}")
+    return campos
+
+
+def validar_formato(formato):
+    if formato not in FORMATOS:
+        raise ValueError(f"formato inválido: {formato!r}; use {' ou '.join(FORMATOS)}")
+    return formato
+
+
+def projetar(registros, campos, formato):
+    """Registros (dicts) já consultados, reduzidos a `campos` no `formato` pedido."""
+    if formato == "colunas":
+        return {c: [r[c] for r in registros] for c in campos}
+    return [{c: r[c] for c in campos} for r in registros]
+
+
+def resposta_json(conteudo):
+    """JSON direto do json.dumps: os valores das rotas já são tipos nativos.
+
+    O jsonable_encoder do FastAPI percorre cada valor antes de serializar;
+    aqui ele só é chamado para o que o json não conhece (ex.: Decimal do banco).
+    """
+    corpo = json.dumps(conteudo, ensure_ascii=False, allow_nan=False,
+                       separators=(",", ":"), default=jsonable_encoder)
+    return Response(content=corpo.encode("utf-8"), media_type="application/json")
+
+
+def codificar_cursor(*chave):
+    """Cursor opaco com a chave da última linha devolvida."""
+    texto = "|".join(str(v) for v in chave)
+    return base64.urlsafe_b64encode(texto.encode()).decode()
+
+
+def decodificar_cursor(cursor, tipos):
+    """Chave do cursor, convertida por `tipos` (ex.: (int, int, str))."""
+    try:
+        partes = base64.urlsafe_b64decode(cursor.encode()).decode().split("|", len(tipos) - 1)
+        if len(partes) != len(tipos):
+            raise ValueError
+        return tuple(tipo(parte) for tipo, parte in zip(tipos, partes))
+    except ValueError:
+        raise ValueError("cursor inválido")
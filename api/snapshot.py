@@ -0,0 +1,15 @@
+"""Snapshot do índice em disco, para os workers mapearem em memória.
+
+O layout da pasta, a gravação e a leitura ficam em src/snapshot_api.py,
+sem dependência do FastAPI, para o src/transform.py gravar o mesmo
+snapshot que a API procura. Este módulo é o ponto de entrada da API.
+"""
+from api.indice import IndiceOperadoras
+from src.snapshot_api import (FORMATO, META, USO, existe, gravar, gravar_estatistica, ler_estado,
+                              ler_estatistica, limpar, materializar, pasta_snapshot, preparar,
+                              trava, usar)
+
+
+def abrir(pasta):
+    """IndiceOperadoras sobre os arrays mapeados (somente leitura) de `pasta`."""
+    return IndiceOperadoras.de_estado(ler_estado(pasta))
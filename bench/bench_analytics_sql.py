@@ -0,0 +1,125 @@
+"""Compara as consultas de db/analytics.sql com as views de db/analytics_materializado.sql.
+
+Cria um schema próprio (não mexe nas tabelas carregadas), gera despesas
+sintéticas de vários anos, aplica os dois scripts e mede cada consulta.
+
+Uso (na raiz do projeto):
+    python -m bench.bench_analytics_sql --operadoras 20000 --anos 10
+"""
+import argparse
+import re
+import statistics
+import time
+from pathlib import Path
+
+import psycopg
+from psycopg import sql
+
+from src.carga_banco import DSN, SQL_RESULTADO
+
+DB_DIR = Path(__file__).parent.parent / "db"
+VIEWS = ["vw_crescimento_top5", "vw_despesas_uf", "vw_acima_media"]
+
+# Vários comandos num execute só: parâmetros entram como literais (sql.Literal)
+SQL_DADOS = sql.SQL("""
+SELECT setseed(0);
+INSERT INTO operadoras_cadastro
+SELECT 300000 + i, lpad((i * 7919)::text, 14, '0'), 'OPERADORA ' || i || ' SAUDE',
+       'Cooperativa Médica', (ARRAY['SP','RJ','MG','RS','BA','PR','SC','PE'])[1 + i % 8]
+FROM generate_series(1, {operadoras}) i;
+INSERT INTO consolidado_despesas
+SELECT '', 300000 + i, t || 'T', a, round((1e6 + (random() - 0.5) * 6e5)::numeric, 2)
+FROM generate_series(1, {operadoras}) i,
+     generate_series(2025 - {anos}, 2024) a,
+     generate_series(1, 4) t;
+INSERT INTO despesas_agregadas
+SELECT cd.RegistroANS, min(oc.RazaoSocial), min(oc.UF),
+       sum(cd.ValorDespesas), avg(cd.ValorDespesas), stddev(cd.ValorDespesas)
+FROM consolidado_despesas cd JOIN operadoras_cadastro oc USING (RegistroANS)
+GROUP BY cd.RegistroANS;
+""")
+
+
+def consultas_originais():
+    """Consultas de db/analytics.sql, separadas pelos blocos `-- #region`."""
+    texto = (DB_DIR / "analytics.sql").read_text(encoding="utf-8")
+    blocos = re.findall(r"-- #region(.*?)\n(.*?)-- #endregion", texto, flags=re.S)
+    return [(titulo.strip(), corpo.strip().rstrip(";")) for titulo, corpo in blocos]
+
+
+def executar_script(cur, nome):
+    """Executa um script de db/ no schema do benchmark.
+
+    O índice de trigramas (busca da API) fica de fora: não é usado pelas
+    consultas medidas e a extensão fica em outro schema.
+    """
+    texto = (DB_DIR / nome).read_text(encoding="utf-8")
+    cur.execute(re.sub(r"[^;]*(pg_trgm|gin_trgm_ops)[^;]*;", "", texto))
+
+
+def medir(cur, comando, repeticoes, parametros=None):
+    """Mediana (ms) de `repeticoes` execuções e as linhas da última."""
+    tempos = []
+    for _ in range(repeticoes):
+        inicio = time.perf_counter()
+        cur.execute(comando, parametros)
+        linhas = cur.fetchall() if cur.description else None
+        tempos.append((time.perf_counter() - inicio) * 1000)
+    return statistics.median(tempos), linhas
+
+
+def executar(args):
+    schema = sql.Identifier(args.schema)
+    with psycopg.connect(args.dsn, autocommit=True) as conn, conn.cursor() as cur:
+        cur.execute(sql.SQL("DROP SCHEMA IF EXISTS {} CASCADE").format(schema))
+        cur.execute(sql.SQL("CREATE SCHEMA {}").format(schema))
+        # Só o schema do benchmark: os DROP TABLE dos scripts não alcançam as tabelas reais
+        cur.execute(sql.SQL("SET search_path TO {}").format(schema))
+        try:
+            # O create_tables.sql só cria as tabelas: os dados são todos sintéticos
+            executar_script(cur, "create_tables.sql")
+
+            inicio = time.perf_counter()
+            cur.execute(SQL_DADOS.format(
+                operadoras=sql.Literal(args.operadoras), anos=sql.Literal(args.anos)))
+            cur.execute(SQL_RESULTADO)
+            print(f"Dados: {cur.rowcount} linhas em resultado_despesas "
+                  f"({time.perf_counter() - inicio:.1f}s)")
+            cur.execute("ANALYZE")
+
+            inicio = time.perf_counter()
+            executar_script(cur, "analytics_materializado.sql")
+            print(f"Resumo inicial (CALL atualizar_analytics()): {time.perf_counter() - inicio:.2f}s")
+            cur.execute("ANALYZE analytics_operadora")
+
+            print(f"\n{'consulta':<60} {'original':>10} {'view':>10} {'ganho':>8}")
+            for (titulo, original), view in zip(consultas_originais(), VIEWS):
+                antes, esperado = medir(cur, original, args.repeticoes)
+                depois, obtido = medir(cur, f"SELECT * FROM {view}", args.repeticoes)
+                aviso = "" if esperado == obtido else "  (resultados diferentes!)"
+                print(f"{titulo[:60]:<60} {antes:>8.1f}ms {depois:>8.2f}ms "
+                      f"{antes / depois:>7.0f}x{aviso}")
+
+            print()
+            tempo, _ = medir(cur, "CALL atualizar_analytics()", 1)
+            print(f"Atualização completa:                    {tempo:>8.1f}ms")
+            tempo, _ = medir(cur, "CALL atualizar_analytics_trimestre(2024, '4T')", 1)
+            print(f"Atualização de um trimestre (2024-4T):   {tempo:>8.1f}ms")
+            tempo, _ = medir(cur, "CALL atualizar_analytics(%s)", 1,
+                             (list(range(300001, 300101)),))
+            print(f"Atualização de 100 operadoras:           {tempo:>8.1f}ms")
+        finally:
+            if not args.manter:
+                cur.execute(sql.SQL("DROP SCHEMA {} CASCADE").format(schema))
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--dsn", default=DSN,
+                        help="string de conexão (padrão: ANS_DATABASE_URL ou variáveis PG*)")
+    parser.add_argument("--operadoras", type=int, default=1500)
+    parser.add_argument("--anos", type=int, default=10)
+    parser.add_argument("--repeticoes", type=int, default=5)
+    parser.add_argument("--schema", default="bench_analytics")
+    parser.add_argument("--manter", action="store_true", help="não remove o schema ao final")
+    executar(parser.parse_args())
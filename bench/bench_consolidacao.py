@@ -0,0 +1,95 @@
+"""Compara a consolidação com todas as linhas em memória e o modo --streaming do main.py.
+
+Gera ZIPs trimestrais sintéticos (layout das demonstrações contábeis) e
+consolida cada conjunto num processo novo, medindo tempo e pico de RSS
+(do processo principal; os workers do pool não entram na conta).
+
+Uso (na raiz do projeto):
+    python -m bench.bench_consolidacao --trimestres 8 --linhas 2000000 --workers 1 4 16
+"""
+import argparse
+import multiprocessing as mp
+import os
+import tempfile
+import time
+import zipfile
+from concurrent.futures import ProcessPoolExecutor
+
+import pandas as pd
+
+from bench.bench_leitor_csv import gerar_csv
+
+
+def gerar_zips(pasta, trimestres, linhas, operadoras=2000):
+    """`trimestres` ZIPs (4T2025.zip, 3T2025.zip, ...) com um CSV de `linhas` linhas cada."""
+    caminhos = []
+    for i in range(trimestres):
+        nome = f"{4 - i % 4}T{2025 - i // 4}"
+        csv_path = os.path.join(pasta, f"{nome}.csv")
+        gerar_csv(csv_path, linhas, seed=i, operadoras=operadoras)
+        zip_path = os.path.join(pasta, f"{nome}.zip")
+        with zipfile.ZipFile(zip_path, 'w', zipfile.ZIP_DEFLATED) as z:
+            z.write(csv_path, arcname=f"{nome}.csv")
+        os.remove(csv_path)
+        caminhos.append(zip_path)
+    return caminhos
+
+
+def _pico_rss_mib():
+    # VmHWM e não ru_maxrss: no Linux o ru_maxrss do pai é herdado pelo processo novo
+    with open('/proc/self/status') as f:
+        for linha in f:
+            if linha.startswith('VmHWM:'):
+                return int(linha.split()[1]) / 1024
+
+
+def _consolidar(streaming, zips, workers):
+    import contextlib
+    import io
+
+    import src.main as main
+
+    inicio = time.perf_counter()
+    with contextlib.redirect_stdout(io.StringIO()):
+        # Como no download_and_process: todos os ZIPs agendados antes de juntar os resultados
+        with main.criar_executor(workers) as executor:
+            futuros = [main.submeter_zip(executor, caminho, os.path.basename(caminho), streaming)
+                       for caminho in zips]
+            partes = [main.juntar_membros(f, streaming) for f in futuros]
+        resultado = main.consolidar(pd.concat(partes, ignore_index=True))
+    return time.perf_counter() - inicio, _pico_rss_mib(), resultado
+
+
+def medir(streaming, zips, workers):
+    """Executa em um processo novo para que o pico de RSS seja só desta consolidação."""
+    # ProcessPoolExecutor e não mp.Pool: processos daemon não podem criar o pool de workers
+    with ProcessPoolExecutor(1, mp_context=mp.get_context('spawn')) as executor:
+        return executor.submit(_consolidar, streaming, zips, workers).result()
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--trimestres', type=int, default=8)
+    parser.add_argument('--linhas', type=int, default=2_000_000, help='linhas por trimestre')
+    parser.add_argument('--workers', type=int, nargs='+', default=[1],
+                        help='valores de ANS_WORKERS_PROCESSAMENTO a comparar')
+    args = parser.parse_args()
+
+    with tempfile.TemporaryDirectory() as pasta:
+        print(f"Gerando {args.trimestres} ZIPs com {args.linhas:,} linhas cada...")
+        zips = gerar_zips(pasta, args.trimestres, args.linhas)
+
+        resultados = {}
+        for modo, streaming in (('em memória', False), ('streaming', True)):
+            for workers in args.workers:
+                segundos, pico_mb, resultado = medir(streaming, zips, workers)
+                resultados[(modo, workers)] = resultado
+                print(f"{modo:12s} {workers:3d} worker(s) {segundos:8.2f}s  pico RSS {pico_mb:8,.0f} MiB  "
+                      f"{len(resultado):,} linhas consolidadas")
+
+        referencia = resultados[('em memória', args.workers[0])]
+        for (modo, workers), resultado in resultados.items():
+            # Mesmo modo: idêntico (bit a bit) para qualquer número de workers
+            pd.testing.assert_frame_equal(resultado, resultados[(modo, args.workers[0])], check_exact=True)
+            pd.testing.assert_frame_equal(resultado, referencia, check_exact=False, rtol=1e-9)
+        print("Resultados iguais")
@@ -0,0 +1,96 @@
+"""Compara a leitura antiga (sniffing + engine python) com src/leitor_csv.py.
+
+Uso (na raiz do projeto):
+    python -m bench.bench_leitor_csv --linhas 5000000
+"""
+import argparse
+import multiprocessing as mp
+import os
+import resource
+import tempfile
+import time
+
+import numpy as np
+import pandas as pd
+
+
+def gerar_csv(caminho, linhas, seed=0, operadoras=2000):
+    """CSV no layout das demonstrações contábeis da ANS, com algumas linhas malformadas.
+
+    REG_ANS vai de 300000 a 300000 + `operadoras` - 1.
+    """
+    rng = np.random.default_rng(seed)
+    contas = np.array(['41', '411', '4111', '412', '31', '3'])
+    descricoes = np.array(['EVENTOS INDENIZÁVEIS LÍQUIDOS', 'DESPESAS ADMINISTRATIVAS',
+                           'OUTRAS DESPESAS OPERACIONAIS'])
+    bloco = 1_000_000
+    with open(caminho, 'w', encoding='latin1') as f:
+        f.write('"DATA";"REG_ANS";"CD_CONTA_CONTABIL";"DESCRICAO";"VL_SALDO_INICIAL";"VL_SALDO_FINAL"\n')
+        for inicio in range(0, linhas, bloco):
+            n = min(bloco, linhas - inicio)
+            df = pd.DataFrame({
+                'DATA': '2025-01-01',
+                'REG_ANS': rng.integers(300000, 300000 + operadoras, n),
+                'CD_CONTA_CONTABIL': rng.choice(contas, n),
+                'DESCRICAO': rng.choice(descricoes, n),
+                'VL_SALDO_INICIAL': np.round(rng.normal(5e5, 3e5, n), 2),
+                'VL_SALDO_FINAL': np.round(rng.normal(5e5, 3e5, n), 2),
+            })
+            f.write(df.to_csv(sep=';', decimal=',', index=False, header=False, quoting=1))
+            f.write('"2025-01-01";"300000";"41";"LINHA MALFORMADA";"1,00";"2,00";"extra"\n')
+
+
+def _antigo(caminho):
+    with open(caminho, 'rb') as f:
+        df = pd.read_csv(f, sep=None, engine='python', encoding='latin1', on_bad_lines='skip')
+    return len(df), None
+
+
+def _novo(caminho):
+    import src.leitor_csv as leitor_csv
+    relatorio = {}
+    linhas = sum(len(b) for b in leitor_csv.ler_csv(lambda: open(caminho, 'rb'), relatorio))
+    return linhas, len(relatorio['linhas_ignoradas'])
+
+
+def _medir(funcao, caminho):
+    inicio = time.perf_counter()
+    linhas, ignoradas = funcao(caminho)
+    segundos = time.perf_counter() - inicio
+    pico_mb = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024
+    return segundos, linhas, ignoradas, pico_mb
+
+
+def medir(funcao, caminho):
+    """Executa em um processo novo para que o pico de RSS seja só desta leitura."""
+    with mp.get_context('spawn').Pool(1) as pool:
+        return pool.apply(_medir, (funcao, caminho))
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--linhas', type=int, default=5_000_000)
+    parser.add_argument('--pular-antigo', action='store_true',
+                        help='mede apenas o leitor novo')
+    args = parser.parse_args()
+
+    with tempfile.TemporaryDirectory() as pasta:
+        caminho = os.path.join(pasta, 'sintetico.csv')
+        print(f"Gerando {args.linhas:,} linhas...")
+        gerar_csv(caminho, args.linhas)
+        print(f"Arquivo: {os.path.getsize(caminho) / 1024 ** 2:.0f} MiB")
+
+        caminhos = [('novo (parser C, blocos)', _novo)]
+        if not args.pular_antigo:
+            caminhos.insert(0, ('antigo (sep=None, python)', _antigo))
+
+        resultados = {}
+        for nome, funcao in caminhos:
+            segundos, linhas, ignoradas, pico_mb = medir(funcao, caminho)
+            resultados[nome] = segundos
+            extra = f", {ignoradas} linhas ignoradas" if ignoradas is not None else ""
+            print(f"{nome:28s} {segundos:8.2f}s  {linhas:,} linhas{extra}, pico RSS {pico_mb:,.0f} MiB")
+
+        if len(resultados) == 2:
+            antigo, novo = resultados.values()
+            print(f"Speedup: {antigo / novo:.1f}x")
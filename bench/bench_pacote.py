@@ -0,0 +1,88 @@
+"""Compara o empacotamento antigo do ZIP final com o src/pacote.py.
+
+Sobre um consolidado sintético em parquet (particionado por Ano/Trimestre,
+como no ANS_FORMATO=parquet):
+
+- antigo: exporta o CSV para o disco e comprime com zipfile (ZIP_DEFLATED,
+  um núcleo), como o transform.py fazia;
+- pacote_1_thread / pacote_N_threads: CSV gerado lote a lote direto no ZIP,
+  deflate em blocos paralelos;
+- reaproveitado: segunda execução com as origens inalteradas.
+
+Uso (na raiz do projeto):
+    python -m bench.bench_pacote --operadoras 50000 --trimestres 40 --nivel 6
+"""
+import argparse
+import functools
+import os
+import statistics
+import tempfile
+import time
+import zipfile
+
+import pandas as pd
+
+import src.armazenamento as armazenamento
+import src.pacote as pacote
+from bench.bench_transform import gerar_dados
+
+
+def antigo(base, destino, nivel):
+    csv = armazenamento.caminho(base, 'csv')
+    armazenamento.ler(base, formato='parquet').to_csv(csv, index=False, encoding='utf-8')
+    with zipfile.ZipFile(destino, 'w', zipfile.ZIP_DEFLATED, compresslevel=nivel) as z:
+        z.write(csv, arcname='consolidado_despesas.csv')
+    os.remove(csv)
+
+
+def novo(base, destino, nivel, threads, manter_manifesto=False):
+    if not manter_manifesto and os.path.exists(pacote.caminho_manifesto(destino)):
+        os.remove(pacote.caminho_manifesto(destino))
+    membro = pacote.Membro('consolidado_despesas.csv', armazenamento.arquivos(base, 'parquet'),
+                           functools.partial(armazenamento.iterar_csv, base, 'parquet'), None)
+    pacote.empacotar(destino, [membro], 'deflate', nivel, threads)
+
+
+def medir(funcao, repeticoes):
+    tempos = []
+    for _ in range(repeticoes):
+        inicio = time.perf_counter()
+        funcao()
+        tempos.append(time.perf_counter() - inicio)
+    return statistics.median(tempos)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--operadoras', type=int, default=50_000)
+    parser.add_argument('--trimestres', type=int, default=40)
+    parser.add_argument('--nivel', type=int, default=6)
+    parser.add_argument('--threads', type=int, default=os.cpu_count() or 1)
+    parser.add_argument('--repeticoes', type=int, default=3)
+    args = parser.parse_args()
+
+    with tempfile.TemporaryDirectory() as pasta:
+        caminho, _ = gerar_dados(pasta, args.operadoras, args.trimestres)
+        base = os.path.join(pasta, 'consolidado_despesas')
+        armazenamento.salvar(pd.read_csv(caminho), base, 'parquet', particionar=True)
+        os.remove(caminho)
+        destino = os.path.join(pasta, 'pacote.zip')
+
+        cenarios = [
+            ('antigo', lambda: antigo(base, destino, args.nivel)),
+            ('pacote_1_thread', lambda: novo(base, destino, args.nivel, 1)),
+            (f'pacote_{args.threads}_threads', lambda: novo(base, destino, args.nivel, args.threads)),
+            ('reaproveitado', lambda: novo(base, destino, args.nivel, args.threads, True)),
+        ]
+        print(f"{args.operadoras * args.trimestres:,} linhas, nível {args.nivel}")
+        print(f"{'cenário':<22} {'tempo':>9} {'ZIP':>10}")
+        for nome, funcao in cenarios:
+            segundos = medir(funcao, args.repeticoes)
+            with zipfile.ZipFile(destino) as z:
+                if z.testzip() is not None:
+                    raise RuntimeError(f"{nome}: ZIP corrompido")
+            print(f"{nome:<22} {segundos:8.2f}s {os.path.getsize(destino) / 1024 ** 2:8.1f}MiB")
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,129 @@
+"""Tempo de partida da API até /api/saude responder 200 (índices prontos).
+
+Compara, sobre a mesma base sintética:
+
+- csv: resultado_despesas.csv exportado do banco, lido e normalizado na partida;
+- parquet: resultado_despesas.parquet do pipeline, índices montados na partida;
+- parquet_primeira_partida: a API grava o snapshot (api/snapshot.py) ao subir;
+- snapshot_etl: snapshot e estatísticas já gravados pelo src/transform.py;
+  a API só mapeia os arquivos.
+
+Para cada cenário: tempo até o servidor responder (/api/saude com 503 ou
+200), até ficar pronto (200) e se o processo chegou a importar o pandas.
+
+Uso (na raiz do projeto):
+    python -m bench.bench_startup --linhas 1000000 --repeticoes 3
+"""
+import argparse
+import os
+import shutil
+import statistics
+import subprocess
+import sys
+import tempfile
+import time
+
+import requests
+
+from bench.bench_suite import RAIZ, _porta_livre
+from bench.loadtest_api import gerar_resultado
+
+COLUNAS = ["RegistroANS", "CNPJ", "RazaoSocial", "UF", "Trimestre", "Ano",
+           "ValorDespesas", "TotalDespesas", "MediaTrimestral", "DesvioPadrao"]
+
+
+def gerar_dados(pasta, linhas):
+    """Pastas de dados de cada cenário: (nome, pasta, API_SNAPSHOT_DIR)."""
+    import src.armazenamento as armazenamento
+    import src.transform as transform
+
+    df = gerar_resultado(linhas)
+    df.columns = COLUNAS
+
+    pasta_csv = os.path.join(pasta, "csv")
+    os.makedirs(pasta_csv)
+    # Como a exportação do DBeaver: ';' e vírgula decimal
+    df.to_csv(os.path.join(pasta_csv, "resultado_despesas.csv"), sep=";", decimal=",", index=False)
+
+    pasta_parquet = os.path.join(pasta, "parquet")
+    os.makedirs(pasta_parquet)
+    armazenamento.salvar(df, os.path.join(pasta_parquet, "resultado_despesas"), "parquet",
+                         particionar=True)
+
+    pasta_etl = os.path.join(pasta, "etl")
+    shutil.copytree(pasta_parquet, pasta_etl, copy_function=shutil.copy2)
+    transform.PASTA_SNAPSHOT_API = os.path.join(pasta_etl, "snapshot")
+    transform.preparar_snapshot_api(os.path.join(pasta_etl, "resultado_despesas.parquet"))
+
+    return [
+        ("csv", pasta_csv, ""),
+        ("parquet", pasta_parquet, ""),
+        ("parquet_primeira_partida", pasta_parquet, os.path.join(pasta_parquet, "snapshot")),
+        ("snapshot_etl", pasta_etl, os.path.join(pasta_etl, "snapshot")),
+    ]
+
+
+def _pandas_importado(pid):
+    with open(f"/proc/{pid}/maps") as f:
+        return "pandas/_libs" in f.read()
+
+
+def medir_partida(pasta_dados, pasta_snapshot):
+    """(segundos até responder, segundos até pronto, pandas importado ou None)."""
+    porta = _porta_livre()
+    # Estatísticas em threads: nenhum processo do pool sobra calculando para a próxima medida
+    env = {**os.environ, "API_DATA_DIR": pasta_dados, "API_SNAPSHOT_DIR": pasta_snapshot,
+           "API_INTERVALO_RECARGA": "0", "API_LOG_AMOSTRA": "0", "API_WORKERS_PROCESSOS": "0"}
+    inicio = time.perf_counter()
+    processo = subprocess.Popen(
+        [sys.executable, "-m", "uvicorn", "api.main:app", "--port", str(porta),
+         "--log-level", "warning"],
+        cwd=RAIZ, env=env, stdout=subprocess.DEVNULL, stderr=subprocess.PIPE)
+    url = f"http://127.0.0.1:{porta}/api/saude"
+    respondendo = None
+    try:
+        while True:
+            if processo.poll() is not None:
+                raise RuntimeError(f"a API não subiu:\n{processo.stderr.read().decode()[-2000:]}")
+            try:
+                status = requests.get(url, timeout=1).status_code
+            except requests.RequestException:
+                time.sleep(0.02)
+                continue
+            agora = time.perf_counter() - inicio
+            respondendo = respondendo or agora
+            if status == 200:
+                pronto = agora
+                break
+            time.sleep(0.02)
+        pandas = _pandas_importado(processo.pid) if os.path.exists("/proc") else None
+        return respondendo, pronto, pandas
+    finally:
+        processo.terminate()
+        processo.wait()
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--linhas", type=int, default=1_000_000)
+    parser.add_argument("--repeticoes", type=int, default=3)
+    args = parser.parse_args()
+
+    with tempfile.TemporaryDirectory() as pasta:
+        print(f"Gerando {args.linhas:,} linhas...")
+        cenarios = gerar_dados(pasta, args.linhas)
+        print(f"{'cenário':<26} {'respondendo':>12} {'pronto':>10}  pandas")
+        for nome, pasta_dados, pasta_snapshot in cenarios:
+            medidas = []
+            for _ in range(args.repeticoes):
+                if nome == "parquet_primeira_partida":
+                    shutil.rmtree(pasta_snapshot, ignore_errors=True)
+                medidas.append(medir_partida(pasta_dados, pasta_snapshot))
+            respondendo = statistics.median(m[0] for m in medidas)
+            pronto = statistics.median(m[1] for m in medidas)
+            pandas = "sim" if medidas[-1][2] else "não"
+            print(f"{nome:<26} {respondendo:11.2f}s {pronto:9.2f}s  {pandas}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,320 @@
+"""Suíte de benchmarks do pipeline e da API sobre um espelho local e sintético da ANS.
+
+Gera ZIPs trimestrais e o Relatorio_cadop.csv (bench/espelho_ans.py), serve
+por HTTP e mede, num diretório de trabalho temporário:
+
+- etl: utils.tratar_inconsistencias, main.py (download e processamento),
+  main.py de novo sem alterações (revalidação do cache) e transform.py. Os
+  scripts rodam em processos próprios; o tempo de cada etapa vem do
+  relatório de src/perfil.py;
+- api: teste de carga HTTP em cada rota /api/*, com a API servindo os
+  dados gerados pelo transform.py.
+
+Os resultados vão para um JSON (commit, parâmetros, ambiente e cenários) em
+--saida; --comparar aponta regressões entre dois resultados.
+
+Uso (na raiz do projeto):
+    python -m bench.bench_suite --trimestres 4 --linhas 500000 --requisicoes 1000
+    python -m bench.bench_suite --comparar bench/resultados/antes.json bench/resultados/depois.json
+"""
+import argparse
+import contextlib
+import glob
+import io
+import json
+import os
+import platform
+import socket
+import statistics
+import subprocess
+import sys
+import tempfile
+import threading
+import time
+import zipfile
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime
+
+import numpy as np
+import pandas as pd
+import requests
+
+from bench.espelho_ans import DIR_DEMONSTRACOES, gerar_espelho, servir
+
+RAIZ = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+# Métricas comparadas por --comparar (maior é pior)
+METRICAS_COMPARADAS = ('segundos', 'p50_ms', 'p99_ms')
+
+
+def _executar_script(nome, comando, pasta, env):
+    """Roda um script do pipeline em `pasta` e junta o tempo total às etapas do relatório."""
+    relatorios = os.path.join(pasta, 'perfil')
+    antes = set(glob.glob(os.path.join(relatorios, '*.json')))
+    inicio = time.perf_counter()
+    processo = subprocess.run(comando, cwd=pasta, env=env, capture_output=True, text=True)
+    segundos = time.perf_counter() - inicio
+    if processo.returncode != 0:
+        raise RuntimeError(f"{nome} falhou ({processo.returncode}):\n{processo.stderr[-2000:]}")
+
+    resultado = {'segundos': round(segundos, 3)}
+    novos = sorted(set(glob.glob(os.path.join(relatorios, '*.json'))) - antes)
+    if novos:
+        with open(novos[-1], encoding='utf-8') as f:
+            relatorio = json.load(f)
+        resultado['etapas'] = {
+            e['nome']: {chave: e[chave] for chave in
+                        ('wall_s', 'cpu_s', 'pico_rss_mib', 'linhas_entrada', 'linhas_saida')}
+            for e in relatorio['etapas']
+        }
+    return resultado
+
+
+def medir_tratamento(pasta_espelho, repeticoes):
+    """utils.tratar_inconsistencias sobre as linhas de um trimestre gerado."""
+    import src.leitor_csv as leitor_csv
+    import src.utils as utils
+
+    zip_path = sorted(glob.glob(os.path.join(pasta_espelho, DIR_DEMONSTRACOES, '*', '*.zip')))[-1]
+    with zipfile.ZipFile(zip_path) as z:
+        membro = z.namelist()[0]
+        blocos = list(leitor_csv.ler_csv(lambda: z.open(membro), {}))
+    df = utils.normalizar_colunas(pd.concat(blocos, ignore_index=True))
+
+    tempos = []
+    for _ in range(repeticoes):
+        copia = df.copy()
+        inicio = time.perf_counter()
+        with contextlib.redirect_stdout(io.StringIO()):
+            utils.tratar_inconsistencias(copia)
+        tempos.append(time.perf_counter() - inicio)
+    return {'segundos': round(statistics.median(tempos), 4), 'linhas': len(df)}
+
+
+def cenarios_etl(args, pasta_espelho, pasta, urls):
+    env = {
+        **os.environ,
+        **urls,
+        'PYTHONPATH': RAIZ,
+        'ANS_TRIMESTRES': str(args.trimestres),
+        'ANS_FORMATO': args.formato,
+        'ANS_PERFIL_DIR': os.path.join(pasta, 'perfil'),
+    }
+    resultados = {'tratar_inconsistencias': medir_tratamento(pasta_espelho, args.repeticoes)}
+    print(f"  tratar_inconsistencias {resultados['tratar_inconsistencias']['segundos']:8.3f}s")
+
+    scripts = [
+        ('main', [sys.executable, '-m', 'src.main']),
+        # Mesma execução com o cache preenchido: só revalidação (304) e nada a processar
+        ('main_revalidacao', [sys.executable, '-m', 'src.main']),
+        ('transform', [sys.executable, '-m', 'src.transform']),
+    ]
+    for nome, comando in scripts:
+        resultados[nome] = _executar_script(nome, comando, pasta, env)
+        print(f"  {nome:<22} {resultados[nome]['segundos']:8.3f}s")
+    return resultados
+
+
+def _porta_livre():
+    with socket.socket() as s:
+        s.bind(('127.0.0.1', 0))
+        return s.getsockname()[1]
+
+
+@contextlib.contextmanager
+def servidor_api(pasta_dados, workers):
+    """uvicorn com a API servindo `pasta_dados`; devolve a URL base quando estiver pronta."""
+    porta = _porta_livre()
+    env = {
+        **os.environ,
+        'API_DATA_DIR': pasta_dados,
+        'API_INTERVALO_RECARGA': '0',
+        'API_LOG_AMOSTRA': '0',
+    }
+    processo = subprocess.Popen(
+        [sys.executable, '-m', 'uvicorn', 'api.main:app', '--port', str(porta),
+         '--workers', str(workers), '--log-level', 'warning'],
+        cwd=RAIZ, env=env, stdout=subprocess.DEVNULL, stderr=subprocess.PIPE)
+    url = f"http://127.0.0.1:{porta}"
+    try:
+        inicio = time.perf_counter()
+        while True:
+            if processo.poll() is not None:
+                raise RuntimeError(f"a API não subiu:\n{processo.stderr.read().decode()[-2000:]}")
+            try:
+                # Pronta quando os índices estão montados (503 enquanto carrega)
+                requests.get(f"{url}/api/saude", timeout=1).raise_for_status()
+                break
+            except requests.RequestException:
+                time.sleep(0.2)
+        yield url, time.perf_counter() - inicio
+    finally:
+        processo.terminate()
+        processo.wait()
+
+
+def carga_http(urls, concorrencia):
+    """Dispara `urls` com `concorrencia` clientes; percentis de latência e vazão."""
+    local = threading.local()
+
+    def requisitar(url):
+        sessao = getattr(local, 'sessao', None)
+        if sessao is None:
+            sessao = local.sessao = requests.Session()
+        inicio = time.perf_counter()
+        resposta = sessao.get(url, timeout=60)
+        return time.perf_counter() - inicio, resposta.status_code, len(resposta.content)
+
+    inicio = time.perf_counter()
+    with ThreadPoolExecutor(concorrencia) as executor:
+        medidas = list(executor.map(requisitar, urls))
+    duracao = time.perf_counter() - inicio
+
+    tempos = np.array([m[0] for m in medidas]) * 1000
+    return {
+        'requisicoes': len(medidas),
+        'erros': sum(1 for m in medidas if m[1] >= 400),
+        'rps': round(len(medidas) / duracao, 1),
+        'p50_ms': round(float(np.percentile(tempos, 50)), 3),
+        'p90_ms': round(float(np.percentile(tempos, 90)), 3),
+        'p99_ms': round(float(np.percentile(tempos, 99)), 3),
+        'max_ms': round(float(tempos.max()), 3),
+        'bytes_medio': int(np.mean([m[2] for m in medidas])),
+    }
+
+
+def cenarios_api(args, pasta):
+    rng = np.random.default_rng(0)
+    registros = 300000 + rng.integers(0, args.operadoras, args.requisicoes)
+    paginas = rng.integers(1, 20, args.requisicoes)
+    rotas = {
+        'operadoras_pagina': [f"/api/operadoras?page={p}&limit=50" for p in paginas],
+        'operadoras_busca': [f"/api/operadoras?q={r}" for r in registros],
+        'operadoras_busca_razao': [f"/api/operadoras?q=saúde%20{r // 10}" for r in registros],
+        'detalhe_operadora': [f"/api/operadoras/{r}" for r in registros],
+        'historico_despesas': [f"/api/operadoras/{r}/despesas" for r in registros],
+        'estatisticas_crescimento': ["/api/estatisticas/crescimento"] * args.requisicoes,
+        'estatisticas_despesas_uf': ["/api/estatisticas/despesas_uf"] * args.requisicoes,
+        'estatisticas_acima_media': ["/api/estatisticas/acima_media"] * args.requisicoes,
+    }
+
+    resultados = {}
+    with servidor_api(os.path.join(pasta, 'data'), args.workers_api) as (url, partida):
+        resultados['partida'] = {'segundos': round(partida, 3)}
+        print(f"  {'partida da API':<26} {partida:8.3f}s")
+        for caminhos in rotas.values():  # aquecimento (estatísticas materializadas)
+            requests.get(url + caminhos[0], timeout=300)
+        for nome, caminhos in rotas.items():
+            resultados[nome] = carga_http([url + c for c in caminhos], args.concorrencia)
+            r = resultados[nome]
+            print(f"  {nome:<26} p50 {r['p50_ms']:8.2f}ms  p99 {r['p99_ms']:8.2f}ms  "
+                  f"{r['rps']:8.1f} req/s  erros {r['erros']}")
+    return resultados
+
+
+def _git(*argumentos):
+    try:
+        return subprocess.run(['git', *argumentos], cwd=RAIZ, capture_output=True,
+                              text=True, check=True).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+
+def executar(args):
+    inicio = datetime.now()
+    resultado = {
+        'commit': _git('rev-parse', 'HEAD'),
+        'alteracoes_locais': bool(_git('status', '--porcelain', '--untracked-files=no')),
+        'inicio': inicio.isoformat(timespec='seconds'),
+        'parametros': {k: v for k, v in vars(args).items() if k not in ('comparar', 'saida')},
+        'ambiente': {
+            'python': platform.python_version(),
+            'cpus': os.cpu_count(),
+            'plataforma': platform.platform(),
+        },
+        'cenarios': {},
+    }
+
+    with tempfile.TemporaryDirectory() as temporaria:
+        pasta_espelho = os.path.join(temporaria, 'espelho')
+        pasta = os.path.join(temporaria, 'trabalho')
+        os.makedirs(pasta)
+        print(f"Gerando {args.trimestres} trimestres com {args.linhas:,} linhas "
+              f"e {args.operadoras:,} operadoras...")
+        gerar_espelho(pasta_espelho, args.trimestres, args.linhas, args.operadoras)
+
+        with servir(pasta_espelho) as urls:
+            if 'etl' in args.grupos or 'api' in args.grupos:
+                # A API precisa dos dados gerados pelo pipeline
+                print("ETL:")
+                resultado['cenarios']['etl'] = cenarios_etl(args, pasta_espelho, pasta, urls)
+            if 'api' in args.grupos:
+                print("API:")
+                resultado['cenarios']['api'] = cenarios_api(args, pasta)
+
+    os.makedirs(args.saida, exist_ok=True)
+    commit = (resultado['commit'] or 'sem-git')[:10]
+    caminho = os.path.join(args.saida, f"{inicio:%Y%m%d-%H%M%S}_{commit}.json")
+    with open(caminho, 'w', encoding='utf-8') as f:
+        json.dump(resultado, f, indent=2, ensure_ascii=False)
+    print(f"Resultados: {caminho}")
+
+
+def _metricas(resultado):
+    """{(grupo, cenário, métrica): valor} das métricas comparáveis."""
+    return {
+        (grupo, cenario, metrica): valor
+        for grupo, cenarios in resultado['cenarios'].items()
+        for cenario, medidas in cenarios.items()
+        for metrica, valor in medidas.items()
+        if metrica in METRICAS_COMPARADAS
+    }
+
+
+def comparar(caminho_base, caminho_novo, tolerancia):
+    """Imprime a razão novo/base de cada métrica; True se alguma piorou além da tolerância."""
+    with open(caminho_base, encoding='utf-8') as f:
+        base = json.load(f)
+    with open(caminho_novo, encoding='utf-8') as f:
+        novo = json.load(f)
+    if base['parametros'] != novo['parametros']:
+        print("⚠️ Parâmetros diferentes entre as execuções; a comparação pode não ser válida.")
+
+    print(f"{'base':<8} {(base['commit'] or '')[:10]}   {'novo':<8} {(novo['commit'] or '')[:10]}")
+    print(f"{'cenário':<42} {'base':>10} {'novo':>10} {'razão':>7}")
+    regressoes = 0
+    metricas_base, metricas_novo = _metricas(base), _metricas(novo)
+    for chave in sorted(metricas_base.keys() & metricas_novo.keys()):
+        antes, depois = metricas_base[chave], metricas_novo[chave]
+        razao = depois / antes if antes else float('inf')
+        aviso = ''
+        if razao > 1 + tolerancia:
+            aviso = '  ⚠️ regressão'
+            regressoes += 1
+        print(f"{'/'.join(chave):<42} {antes:>10.3f} {depois:>10.3f} {razao:>6.2f}x{aviso}")
+    print(f"{regressoes} regressão(ões) acima de {tolerancia:.0%}")
+    return regressoes > 0
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--grupos', nargs='+', choices=['etl', 'api'], default=['etl', 'api'])
+    parser.add_argument('--trimestres', type=int, default=4)
+    parser.add_argument('--linhas', type=int, default=200_000, help='linhas por trimestre')
+    parser.add_argument('--operadoras', type=int, default=2000)
+    parser.add_argument('--formato', choices=['csv', 'parquet'], default='parquet',
+                        help='ANS_FORMATO do pipeline (a API lê o parquet gerado pelo transform.py)')
+    parser.add_argument('--repeticoes', type=int, default=3)
+    parser.add_argument('--requisicoes', type=int, default=500, help='requisições por rota')
+    parser.add_argument('--concorrencia', type=int, default=8)
+    parser.add_argument('--workers-api', type=int, default=1, help='workers do uvicorn')
+    parser.add_argument('--saida', default=os.path.join(RAIZ, 'bench', 'resultados'))
+    parser.add_argument('--comparar', nargs=2, metavar=('BASE', 'NOVO'),
+                        help='compara dois resultados em vez de medir')
+    parser.add_argument('--tolerancia', type=float, default=0.10,
+                        help='piora relativa tolerada pelo --comparar')
+    args = parser.parse_args()
+
+    if args.comparar:
+        sys.exit(1 if comparar(*args.comparar, args.tolerancia) else 0)
+    executar(args)
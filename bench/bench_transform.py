@@ -0,0 +1,135 @@
+"""Compara a agregação original do transform.py com a versão de tipos compactos.
+
+Gera um consolidado e um cadastro sintéticos (no layout do pipeline) em
+algumas escalas e executa cada versão num processo novo, medindo tempo,
+pico de alocações (tracemalloc) e pico de RSS.
+
+Uso (na raiz do projeto):
+    python -m bench.bench_transform --operadoras 50000 --trimestres 12 --escalas 1 10
+"""
+import argparse
+import multiprocessing as mp
+import os
+import tempfile
+import time
+import tracemalloc
+
+import numpy as np
+import pandas as pd
+
+
+def gerar_dados(pasta, operadoras, trimestres, seed=0):
+    """consolidado_despesas.csv e cadastro (DataFrame) com `operadoras` x `trimestres` linhas."""
+    rng = np.random.default_rng(seed)
+    registros = np.arange(300000, 300000 + operadoras)
+    cadastro = pd.DataFrame({
+        'RegistroANS': registros,
+        'CNPJ': [f'{r * 7919:014d}' for r in registros],
+        'RazaoSocial': [f'OPERADORA DE PLANOS DE SAUDE {r} LTDA' for r in registros],
+        'Modalidade': rng.choice(['Cooperativa Médica', 'Medicina de Grupo', 'Autogestão'], operadoras),
+        'UF': rng.choice(['SP', 'RJ', 'MG', 'RS', 'BA', 'PR', 'SC', 'PE'], operadoras),
+    })
+
+    partes = []
+    for i in range(trimestres):
+        # ~2% das operadoras sem cadastro, como no arquivo real
+        partes.append(pd.DataFrame({
+            'CNPJ': cadastro['CNPJ'],
+            'RegistroANS': registros + np.where(rng.random(operadoras) < 0.02, 900000, 0),
+            'RazaoSocial': cadastro['RazaoSocial'],
+            'Trimestre': f'{i % 4 + 1}T',
+            'Ano': 2025 - trimestres // 4 + i // 4,
+            'ValorDespesas': rng.normal(1e6, 3e5, operadoras).round(2),
+            'VL_SALDO_INICIAL': rng.normal(5e5, 1e5, operadoras).round(2),
+        }))
+    # Mesma ordem do main.consolidar (groupby por RegistroANS, Trimestre, Ano)
+    consolidado = pd.concat(partes, ignore_index=True).sort_values(
+        ['RegistroANS', 'Trimestre', 'Ano'])
+    caminho = os.path.join(pasta, 'consolidado_despesas.csv')
+    consolidado.to_csv(caminho, index=False, encoding='utf-8')
+    return caminho, cadastro
+
+
+# --- Agregação original (transform.agregar_completo antes dos tipos compactos) --- #
+
+def _agregar_antigo(caminho, df_cadop):
+    df_fin = pd.read_csv(caminho, usecols=['RegistroANS', 'Trimestre', 'Ano', 'ValorDespesas'])
+    df_fin['ValorDespesas'] = pd.to_numeric(df_fin['ValorDespesas'], errors='coerce').fillna(0)
+    df_fin = df_fin.drop_duplicates(subset=['RegistroANS', 'Trimestre', 'Ano', 'ValorDespesas'])
+    df_res = pd.merge(
+        df_cadop[['RegistroANS', 'RazaoSocial', 'UF']],
+        df_fin.drop(columns=['RazaoSocial'], errors='ignore'),
+        on='RegistroANS', how='left')
+    return df_res.groupby(['RegistroANS', 'RazaoSocial', 'UF'])['ValorDespesas'].agg(
+        TotalDespesas='sum', MediaTrimestral='mean', DesvioPadrao='std'
+    ).reset_index().fillna(0)
+
+
+def _agregar_novo(caminho, df_cadop):
+    import src.registro as registro
+    import src.transform as transform
+    transform.BASE_ETAPA1 = os.path.splitext(caminho)[0]
+    return transform.agregar_completo(registro.RegistroOperadoras(df_cadop))
+
+
+def _pico_rss_mib():
+    # VmHWM e não ru_maxrss: no Linux o ru_maxrss do pai (que gerou os dados)
+    # é herdado pelo processo novo
+    with open('/proc/self/status') as f:
+        for linha in f:
+            if linha.startswith('VmHWM:'):
+                return int(linha.split()[1]) / 1024
+
+
+def _medir(nome, caminho, df_cadop, rastrear):
+    import src.armazenamento as armazenamento
+    armazenamento.FORMATO = 'csv'
+    funcao = _agregar_antigo if nome == 'antigo' else _agregar_novo
+
+    if rastrear:
+        tracemalloc.start()
+    inicio = time.perf_counter()
+    resultado = funcao(caminho, df_cadop)
+    segundos = time.perf_counter() - inicio
+    pico_alocado = tracemalloc.get_traced_memory()[1] / 1024 ** 2 if rastrear else None
+    pico_rss = _pico_rss_mib()
+    return segundos, pico_alocado, pico_rss, resultado
+
+
+def medir(nome, caminho, df_cadop, rastrear):
+    """Executa em um processo novo para que os picos sejam só desta agregação."""
+    with mp.get_context('spawn').Pool(1) as pool:
+        return pool.apply(_medir, (nome, caminho, df_cadop, rastrear))
+
+
+def comparar(antigo, novo):
+    antigo = antigo.astype({'UF': str}).reset_index(drop=True)
+    novo = novo.astype({'UF': str}).reset_index(drop=True)
+    pd.testing.assert_frame_equal(antigo, novo, check_exact=False, rtol=1e-9)
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--operadoras', type=int, default=50_000)
+    parser.add_argument('--trimestres', type=int, default=12)
+    parser.add_argument('--escalas', type=int, nargs='+', default=[1, 10],
+                        help='multiplicadores do número de operadoras')
+    args = parser.parse_args()
+
+    for escala in args.escalas:
+        with tempfile.TemporaryDirectory() as pasta:
+            caminho, df_cadop = gerar_dados(pasta, args.operadoras * escala, args.trimestres)
+            print(f"\nEscala {escala}x: {args.operadoras * escala * args.trimestres:,} linhas, "
+                  f"{os.path.getsize(caminho) / 1024 ** 2:.0f} MiB")
+
+            resultados = {}
+            for nome in ('antigo', 'novo'):
+                segundos, _, pico_rss, resultado = medir(nome, caminho, df_cadop, rastrear=False)
+                _, pico_alocado, _, _ = medir(nome, caminho, df_cadop, rastrear=True)
+                resultados[nome] = (pico_alocado, resultado)
+                print(f"{nome:8s} {segundos:7.2f}s  pico alocado {pico_alocado:8,.0f} MiB  "
+                      f"pico RSS {pico_rss:8,.0f} MiB")
+
+            (pico_antigo, antigo), (pico_novo, novo) = resultados.values()
+            comparar(antigo, novo)
+            print(f"Resultados iguais; pico alocado {pico_antigo / pico_novo:.1f}x menor")
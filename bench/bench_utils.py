@@ -0,0 +1,118 @@
+"""Compara utils.tratar_inconsistencias (vetorizado) com a versão linha a linha original.
+
+Uso (na raiz do projeto):
+    python -m bench.bench_utils --linhas 1000000
+"""
+import argparse
+import contextlib
+import io
+import re
+import time
+
+import numpy as np
+import pandas as pd
+
+import src.utils as utils
+
+# A versão original testa `dtype == 'object'` para tratar a vírgula decimal; com a
+# inferência de `str` do pandas 3 esse teste falha e todos os valores viram 0.
+# A comparação usa a semântica para a qual o código original foi escrito.
+pd.set_option('future.infer_string', False)
+
+
+# --- Implementação original (linha a linha), mantida como referência --- #
+
+def _tratar_inconsistencias_original(df):
+    if 'CNPJ' in df.columns:
+        df['CNPJ'] = df['CNPJ'].apply(utils.limpar_cnpj)
+        df['CNPJ_STATUS'] = df['CNPJ'].apply(
+            lambda x: 'Inconsistente' if not utils.validar_cnpj(x) else 'Válido')
+
+    if 'RegistroANS' in df.columns:
+        df['RegistroANS'] = pd.to_numeric(
+            df['RegistroANS'], errors='coerce').fillna(0).astype(int)
+
+    for col in ['ValorDespesas', 'VL_SALDO_INICIAL']:
+        if col in df.columns:
+            if df[col].dtype == 'object':
+                df[col] = df[col].str.replace(',', '.')
+            df[col] = pd.to_numeric(df[col], errors='coerce').fillna(0)
+            df[col] = df[col].apply(lambda x: 0 if x < 0 else x)
+
+    if 'VL_SALDO_INICIAL' in df.columns and 'ValorDespesas' in df.columns:
+        df = df[~((df['VL_SALDO_INICIAL'] == 0) & (df['ValorDespesas'] == 0))]
+
+    if 'CNPJ' in df.columns and 'RazaoSocial' in df.columns:
+        duplicated_cnpjs = df[df.duplicated(subset='CNPJ', keep=False)]
+        for cnpj, group in duplicated_cnpjs.groupby('CNPJ'):
+            if len(group['RazaoSocial'].unique()) > 1:
+                grupo_com_data = group.dropna(
+                    subset=['Data']).sort_values('Data', ascending=False, kind='stable')
+                df.loc[df['CNPJ'] == cnpj, 'RazaoSocial'] = grupo_com_data.iloc[0]['RazaoSocial']
+
+    if 'Trimestre' in df.columns:
+        df['Trimestre'] = df['Trimestre'].apply(
+            lambda x: 'Inconsistente' if not re.match(r'\dT\d{4}', str(x)) else x)
+    if 'Ano' in df.columns:
+        df['Ano'] = df['Ano'].apply(
+            lambda x: 'Inconsistente' if not re.match(r'\d{4}', str(x)) else x)
+    if 'RazaoSocial' in df.columns:
+        df['RazaoSocial'] = df['RazaoSocial'].apply(
+            lambda x: x if pd.notnull(x) and x != '' else 'Razão Social Não Informada')
+    return df
+
+
+def gerar_dados(linhas, cnpjs_distintos, seed=0):
+    """Linhas sintéticas com CNPJs (válidos e inválidos), valores em texto e nomes conflitantes."""
+    rng = np.random.default_rng(seed)
+    base = rng.integers(10 ** 11, 10 ** 12, cnpjs_distintos)
+    cnpjs = np.array([f"{b:012d}" for b in base], dtype=object)
+    # Metade com dígitos verificadores corretos, formatados com pontuação
+    for i in range(0, cnpjs_distintos, 2):
+        c = cnpjs[i]
+        for pesos in (utils.PESOS_DV1, utils.PESOS_DV2):
+            resto = sum(int(d) * p for d, p in zip(c, pesos)) % 11
+            c += str(0 if resto < 2 else 11 - resto)
+        cnpjs[i] = f"{c[:2]}.{c[2:5]}.{c[5:8]}/{c[8:12]}-{c[12:]}"
+
+    escolha = rng.integers(0, cnpjs_distintos, linhas)
+    valores = np.round(rng.normal(1000, 800, linhas), 2).astype(str)
+    return pd.DataFrame({
+        'CNPJ': cnpjs[escolha],
+        'RegistroANS': (300000 + escolha).astype(str).astype(object),
+        'RazaoSocial': np.array(['OPERADORA A', 'OPERADORA B', '', None],
+                                dtype=object)[rng.choice(4, linhas, p=[.9, .05, .03, .02])],
+        'Data': np.array(['2023-01-01', '2024-06-30', '2025-03-31'],
+                         dtype=object)[rng.integers(0, 3, linhas)],
+        'ValorDespesas': np.char.replace(valores, '.', ',').astype(object),
+        'VL_SALDO_INICIAL': np.char.replace(valores[::-1], '.', ',').astype(object),
+        'Trimestre': np.array(['1T2025', '2T2025', 'X'], dtype=object)[rng.integers(0, 3, linhas)],
+        'Ano': np.array(['2025', '2024', '25'], dtype=object)[rng.integers(0, 3, linhas)],
+    })
+
+
+def cronometrar(funcao, df):
+    inicio = time.perf_counter()
+    with contextlib.redirect_stdout(io.StringIO()):
+        resultado = funcao(df.copy())
+    return time.perf_counter() - inicio, resultado
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--linhas', type=int, default=1_000_000)
+    parser.add_argument('--cnpjs', type=int, default=500,
+                        help='quantidade de CNPJs distintos')
+    args = parser.parse_args()
+
+    df = gerar_dados(args.linhas, args.cnpjs)
+    print(f"{args.linhas:,} linhas, {args.cnpjs} CNPJs distintos")
+
+    t_original, original = cronometrar(_tratar_inconsistencias_original, df)
+    t_novo, novo = cronometrar(utils.tratar_inconsistencias, df)
+
+    pd.testing.assert_frame_equal(
+        original.reset_index(drop=True), novo.reset_index(drop=True), check_dtype=False)
+    print(f"linha a linha: {t_original:8.2f}s")
+    print(f"vetorizado:    {t_novo:8.2f}s")
+    print(f"Speedup: {t_original / t_novo:.1f}x (resultados idênticos)")
@@ -0,0 +1,192 @@
+"""Espelho local do FTP de dados abertos da ANS, com dados sintéticos.
+
+Gera a mesma estrutura de diretórios do servidor real (listagens HTML por
+ano, ZIPs trimestrais e o Relatorio_cadop.csv) e a serve por HTTP com ETag,
+If-None-Match (304) e Range (206), que o cache de src/download.py usa.
+
+Uso (na raiz do projeto):
+    python -m bench.espelho_ans --pasta /tmp/espelho --trimestres 8 --linhas 500000
+    # em outro terminal, com as URLs impressas:
+    ANS_BASE_URL=... ANS_URL_CADASTRO=... python -m src.main
+"""
+import argparse
+import contextlib
+import email.utils
+import os
+import re
+import shutil
+import threading
+from functools import partial
+from http.server import SimpleHTTPRequestHandler, ThreadingHTTPServer
+
+import numpy as np
+import pandas as pd
+
+from bench.bench_consolidacao import gerar_zips
+
+DIR_DEMONSTRACOES = "demonstracoes_contabeis"
+DIR_CADASTRO = "operadoras_de_plano_de_saude_ativas"
+ARQUIVO_CADASTRO = "Relatorio_cadop.csv"
+
+
+def gerar_cadastro(caminho, operadoras, seed=0):
+    """Relatorio_cadop.csv (`;`, latin1) com as operadoras 300000 a 300000 + `operadoras` - 1.
+
+    Algumas operadoras aparecem duas vezes com o mesmo CNPJ e datas de
+    registro diferentes, como no arquivo real.
+    """
+    rng = np.random.default_rng(seed)
+    registros = np.arange(300000, 300000 + operadoras)
+    df = pd.DataFrame({
+        'REGISTRO_OPERADORA': registros,
+        'CNPJ': [f'{r * 7919:014d}' for r in registros],
+        'Razao_Social': [f'OPERADORA DE PLANOS DE SAÚDE {r} LTDA' for r in registros],
+        'Nome_Fantasia': [f'SAUDE {r}' for r in registros],
+        'Modalidade': rng.choice(['Cooperativa Médica', 'Medicina de Grupo', 'Autogestão',
+                                  'Seguradora Especializada em Saúde'], operadoras),
+        'Cidade': rng.choice(['São Paulo', 'Rio de Janeiro', 'Belo Horizonte', 'Curitiba'], operadoras),
+        'UF': rng.choice(['SP', 'RJ', 'MG', 'RS', 'BA', 'PR', 'SC', 'PE'], operadoras),
+        'Data_Registro_ANS': pd.to_datetime(
+            rng.integers(0, 9000, operadoras), unit='D', origin='2000-01-01').strftime('%Y-%m-%d'),
+    })
+    repetidas = df.sample(frac=0.01, random_state=seed).assign(
+        Razao_Social=lambda d: d['Razao_Social'] + ' (ANTIGA)', Data_Registro_ANS='1999-01-01')
+    pd.concat([df, repetidas]).to_csv(caminho, sep=';', index=False, encoding='latin1')
+
+
+def gerar_espelho(pasta, trimestres, linhas, operadoras=2000):
+    """Monta em `pasta` a árvore do FTP: <demonstracoes>/<ano>/<n>T<ano>.zip e o cadastro."""
+    raiz_demonstracoes = os.path.join(pasta, DIR_DEMONSTRACOES)
+    os.makedirs(raiz_demonstracoes, exist_ok=True)
+    for zip_path in gerar_zips(raiz_demonstracoes, trimestres, linhas, operadoras):
+        nome = os.path.basename(zip_path)
+        pasta_ano = os.path.join(raiz_demonstracoes, re.search(r'20\d{2}', nome).group())
+        os.makedirs(pasta_ano, exist_ok=True)
+        os.replace(zip_path, os.path.join(pasta_ano, nome))
+
+    os.makedirs(os.path.join(pasta, DIR_CADASTRO), exist_ok=True)
+    gerar_cadastro(os.path.join(pasta, DIR_CADASTRO, ARQUIVO_CADASTRO), operadoras)
+
+
+class ManipuladorEspelho(SimpleHTTPRequestHandler):
+    """Arquivos com ETag (mtime + tamanho), respostas 304 e pedidos de faixa (Range)."""
+
+    _restante = None  # bytes da faixa ainda a enviar; None nas listagens
+
+    def log_message(self, *args):
+        pass
+
+    def send_head(self):
+        caminho = self.translate_path(self.path)
+        self._restante = None
+        if os.path.isdir(caminho):
+            return super().send_head()  # listagem HTML, como no servidor da ANS
+        try:
+            f = open(caminho, 'rb')
+        except OSError:
+            self.send_error(404, "File not found")
+            return None
+
+        info = os.fstat(f.fileno())
+        etag = f'"{info.st_mtime_ns:x}-{info.st_size:x}"'
+        validadores = {'ETag': etag, 'Last-Modified': self.date_time_string(info.st_mtime)}
+        if self._nao_modificado(etag, info.st_mtime):
+            f.close()
+            self._responder(304, validadores)
+            return None
+
+        inicio, fim, status = 0, info.st_size - 1, 200
+        faixa = re.fullmatch(r'bytes=(\d+)-(\d*)', self.headers.get('Range', '').strip())
+        if faixa:
+            inicio = int(faixa.group(1))
+            fim = min(int(faixa.group(2)), fim) if faixa.group(2) else fim
+            if inicio >= info.st_size:
+                f.close()
+                self._responder(416, {'Content-Range': f'bytes */{info.st_size}'})
+                return None
+            status = 206
+            validadores['Content-Range'] = f'bytes {inicio}-{fim}/{info.st_size}'
+
+        self._restante = fim - inicio + 1
+        f.seek(inicio)
+        self._responder(status, {
+            'Content-Type': self.guess_type(caminho),
+            'Content-Length': str(self._restante),
+            'Accept-Ranges': 'bytes',
+            **validadores,
+        })
+        return f
+
+    def _nao_modificado(self, etag, mtime):
+        if 'If-None-Match' in self.headers:
+            return etag in [c.strip() for c in self.headers['If-None-Match'].split(',')]
+        if 'If-Modified-Since' in self.headers:
+            try:
+                desde = email.utils.parsedate_to_datetime(self.headers['If-Modified-Since'])
+            except (TypeError, ValueError):
+                return False
+            return int(mtime) <= desde.timestamp()
+        return False
+
+    def _responder(self, status, headers):
+        self.send_response(status)
+        for nome, valor in headers.items():
+            self.send_header(nome, valor)
+        if status in (304, 416):
+            self.send_header('Content-Length', '0')
+        self.end_headers()
+
+    def copyfile(self, origem, destino):
+        if self._restante is None:
+            return super().copyfile(origem, destino)
+        # Só os bytes da faixa pedida
+        while self._restante > 0:
+            bloco = origem.read(min(self._restante, 1024 * 1024))
+            if not bloco:
+                break
+            destino.write(bloco)
+            self._restante -= len(bloco)
+
+
+@contextlib.contextmanager
+def servir(pasta, porta=0):
+    """Serve `pasta` numa thread; devolve as URLs a usar em ANS_BASE_URL e ANS_URL_CADASTRO."""
+    servidor = ThreadingHTTPServer(('127.0.0.1', porta), partial(ManipuladorEspelho, directory=pasta))
+    thread = threading.Thread(target=servidor.serve_forever, name='espelho-ans', daemon=True)
+    thread.start()
+    raiz = f"http://127.0.0.1:{servidor.server_address[1]}"
+    try:
+        yield {
+            'ANS_BASE_URL': f"{raiz}/{DIR_DEMONSTRACOES}/",
+            'ANS_URL_CADASTRO': f"{raiz}/{DIR_CADASTRO}/{ARQUIVO_CADASTRO}",
+        }
+    finally:
+        servidor.shutdown()
+        servidor.server_close()
+        thread.join()
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--pasta', required=True, help='onde gerar (ou reaproveitar) o espelho')
+    parser.add_argument('--trimestres', type=int, default=4)
+    parser.add_argument('--linhas', type=int, default=500_000, help='linhas por trimestre')
+    parser.add_argument('--operadoras', type=int, default=2000)
+    parser.add_argument('--porta', type=int, default=8000)
+    parser.add_argument('--regerar', action='store_true', help='apaga e gera a pasta de novo')
+    args = parser.parse_args()
+
+    if args.regerar and os.path.isdir(args.pasta):
+        shutil.rmtree(args.pasta)
+    if not os.path.isdir(os.path.join(args.pasta, DIR_DEMONSTRACOES)):
+        print(f"Gerando {args.trimestres} trimestres com {args.linhas:,} linhas cada...")
+        gerar_espelho(args.pasta, args.trimestres, args.linhas, args.operadoras)
+
+    with servir(args.pasta, args.porta) as urls:
+        for nome, url in urls.items():
+            print(f"{nome}={url}")
+        print("Servindo (Ctrl+C para encerrar)")
+        try:
+            threading.Event().wait()
+        except KeyboardInterrupt:
+            pass
@@ -0,0 +1,118 @@
+"""Teste de carga das rotas de operadoras sobre o índice em memória (api/indice.py).
+
+Mede p50/p99 de consultas pontuais, histórico e busca para bases sintéticas
+de tamanhos crescentes: as consultas pontuais não devem crescer com a base.
+Com --sob-carga, mede o detalhe enquanto as estatísticas são recalculadas
+(no pool de threads e no pool de processos de api/execucao.py).
+
+Uso (na raiz do projeto):
+    python -m bench.loadtest_api --tamanhos 10000 100000 1000000 [--sob-carga]
+"""
+import argparse
+import asyncio
+import dataclasses
+import time
+
+import numpy as np
+import pandas as pd
+
+import api.main as api
+from starlette.requests import Request
+
+from api.dados import montar_versao
+from api.estatisticas import CALCULOS, EstatisticasMaterializadas
+from api.execucao import WORKERS_PROCESSOS, ExecutorPesado
+
+REQUISICAO = {"type": "http", "headers": []}
+
+
+def gerar_resultado(linhas, seed=0):
+    """resultado_despesas sintético: ~12 trimestres por operadora."""
+    rng = np.random.default_rng(seed)
+    operadoras = max(1, linhas // 12)
+    registro = 300000 + np.sort(rng.integers(0, operadoras, linhas))
+    return pd.DataFrame({
+        "registroans": registro,
+        "cnpj": (10 ** 13 + registro * 7919).astype(str),
+        "razaosocial": [f"OPERADORA {r} SAUDE LTDA" for r in registro],
+        "uf": rng.choice(["SP", "RJ", "MG", "RS", "BA"], linhas),
+        "trimestre": rng.choice(["1T", "2T", "3T", "4T"], linhas),
+        "ano": rng.integers(2015, 2026, linhas),
+        "valordespesas": rng.normal(1e6, 3e5, linhas),
+        "totaldespesas": rng.normal(1e7, 3e6, linhas),
+        "mediatrimestral": rng.normal(1e6, 3e5, linhas),
+        "desviopadrao": rng.normal(1e5, 3e4, linhas),
+    })
+
+
+async def percentis(funcao, argumentos, intervalo=0.0):
+    """p50/p99 (ms) do tempo entre a chegada da requisição e a resposta."""
+    tempos = []
+    for args in argumentos:
+        inicio = time.perf_counter()
+        # Como tarefa, para medir também a espera por um event loop ocupado
+        await asyncio.create_task(funcao(*args))
+        tempos.append(time.perf_counter() - inicio)
+        if intervalo:
+            await asyncio.sleep(intervalo)
+    return np.percentile(tempos, 50) * 1e3, np.percentile(tempos, 99) * 1e3
+
+
+async def carga_estatisticas(df, parar):
+    """Invalida as estatísticas continuamente e dispara consultas simultâneas a elas."""
+    numero = 0
+    while not parar.is_set():
+        numero += 1
+        api.gerenciador.atual = dataclasses.replace(
+            api.gerenciador.atual, estatisticas=EstatisticasMaterializadas(df), numero=numero)
+        await asyncio.gather(*(api.responder_estatistica(nome, Request(REQUISICAO))
+                               for nome in CALCULOS for _ in range(4)))
+
+
+async def executar(args):
+    rng = np.random.default_rng(1)
+    print(f"{'linhas':>10} {'carga':>8}  {'rota':<30} {'p50 (ms)':>9} {'p99 (ms)':>9}")
+    for tamanho in args.tamanhos:
+        df = gerar_resultado(tamanho)
+        inicio = time.perf_counter()
+        api.gerenciador.atual = montar_versao(df)
+        api.gerenciador.pronto.set()  # a versão foi publicada aqui, sem a carga do lifespan
+        carga = time.perf_counter() - inicio
+
+        registros = [(str(r),) for r in rng.choice(df["registroans"].unique(), args.requisicoes)]
+        cenarios = [
+            ("detalhe_operadora", api.detalhe_operadora, registros),
+            ("historico_despesas", api.historico_despesas, registros),
+            ("listar_operadoras (página)", api.listar_operadoras,
+             [(int(p), 50, None) for p in rng.integers(1, 20, args.requisicoes)]),
+            ("listar_operadoras (q=registro)", api.listar_operadoras,
+             [(1, 50, r) for (r,) in registros[:200]]),
+        ]
+        for nome, funcao, argumentos in cenarios:
+            p50, p99 = await percentis(funcao, argumentos)
+            print(f"{tamanho:>10,} {carga:>7.1f}s  {nome:<30} {p50:>9.3f} {p99:>9.3f}")
+
+        if args.sob_carga:
+            # Consultas pontuais enquanto as estatísticas são recalculadas sem parar
+            for workers in (0, WORKERS_PROCESSOS):
+                api.executor.encerrar()
+                api.executor = ExecutorPesado(workers=workers)
+                parar = asyncio.Event()
+                fundo = asyncio.create_task(carga_estatisticas(df, parar))
+                await asyncio.sleep(0.5)
+                p50, p99 = await percentis(api.detalhe_operadora, registros[:300], 0.002)
+                parar.set()
+                await fundo
+                rotulo = f"detalhe + estat. ({'threads' if workers <= 0 else f'{workers} processos'})"
+                print(f"{tamanho:>10,} {carga:>7.1f}s  {rotulo:<30} {p50:>9.3f} {p99:>9.3f}")
+    api.executor.encerrar()
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--tamanhos", type=int, nargs="+",
+                        default=[10_000, 100_000, 1_000_000])
+    parser.add_argument("--requisicoes", type=int, default=2000)
+    parser.add_argument("--sob-carga", action="store_true",
+                        help="mede também o detalhe com as estatísticas sendo recalculadas")
+    asyncio.run(executar(parser.parse_args()))
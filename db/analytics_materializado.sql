@@ -0,0 +1,146 @@
+-- Versão materializada das consultas de db/analytics.sql.
+-- Executar depois de db/create_tables.sql. src/carga_banco.py chama
+-- atualizar_analytics() ao final de cada carga, só para as operadoras com linhas
+-- inseridas ou alteradas nela.
+--
+-- Em vez de varrer resultado_despesas a cada consulta (com junções por
+-- Ano || '-' || Trimestre), as três consultas leem um resumo com uma linha
+-- por operadora, mantido por atualizar_analytics(). O PostgreSQL não atualiza
+-- parte de uma MATERIALIZED VIEW, por isso o resumo é uma tabela.
+
+DROP VIEW IF EXISTS vw_crescimento_top5;
+DROP VIEW IF EXISTS vw_despesas_uf;
+DROP VIEW IF EXISTS vw_acima_media;
+DROP TABLE IF EXISTS analytics_operadora;
+
+------------------------------------
+-- RESUMO POR OPERADORA
+------------------------------------
+CREATE TABLE analytics_operadora (
+    RegistroANS INTEGER PRIMARY KEY,
+    RazaoSocial TEXT,
+    UF CHAR(2),
+    primeiro_periodo INTEGER,          -- Periodo = Ano * 10 + trimestre (ex.: 20241)
+    ultimo_periodo INTEGER,
+    valor_inicial NUMERIC(18,2),
+    valor_final NUMERIC(18,2),
+    crescimento_percentual NUMERIC,    -- NULL quando valor_inicial = 0
+    total_despesas NUMERIC,
+    n_trimestres INTEGER,
+    valores NUMERIC(18,2)[]            -- ValorDespesas de cada trimestre, em ordem crescente
+);
+
+-- QUERY 1: top 5 direto pelo índice
+CREATE INDEX idx_analytics_crescimento ON analytics_operadora
+    (crescimento_percentual DESC NULLS LAST);
+
+------------------------------------
+-- ATUALIZAÇÃO
+------------------------------------
+-- Recalcula o resumo das operadoras informadas (NULL = todas).
+CREATE OR REPLACE PROCEDURE atualizar_analytics(operadoras INTEGER[] DEFAULT NULL)
+LANGUAGE plpgsql
+AS $$
+BEGIN
+    DELETE FROM analytics_operadora
+    WHERE operadoras IS NULL OR RegistroANS = ANY (operadoras);
+
+    INSERT INTO analytics_operadora
+    SELECT
+        RegistroANS,
+        min(RazaoSocial),
+        min(UF),
+        min(Periodo),
+        max(Periodo),
+        (array_agg(ValorDespesas ORDER BY Periodo))[1],
+        (array_agg(ValorDespesas ORDER BY Periodo DESC))[1],
+        ((array_agg(ValorDespesas ORDER BY Periodo DESC))[1]
+            - (array_agg(ValorDespesas ORDER BY Periodo))[1])
+            / NULLIF((array_agg(ValorDespesas ORDER BY Periodo))[1], 0) * 100,
+        sum(ValorDespesas),
+        count(ValorDespesas),
+        array_agg(ValorDespesas ORDER BY ValorDespesas) FILTER (WHERE ValorDespesas IS NOT NULL)
+    FROM resultado_despesas
+    WHERE operadoras IS NULL OR RegistroANS = ANY (operadoras)
+    GROUP BY RegistroANS;
+END;
+$$;
+
+-- Recalcula só as operadoras com despesas num trimestre recém-carregado.
+-- Ex.: CALL atualizar_analytics_trimestre(2025, '1T');
+CREATE OR REPLACE PROCEDURE atualizar_analytics_trimestre(ano INTEGER, trimestre VARCHAR)
+LANGUAGE plpgsql
+AS $$
+DECLARE
+    operadoras INTEGER[];
+BEGIN
+    -- CALL não aceita subconsulta como argumento
+    operadoras := ARRAY(
+        SELECT cd.RegistroANS FROM consolidado_despesas cd
+        WHERE cd.Ano = atualizar_analytics_trimestre.ano
+          AND cd.Trimestre = atualizar_analytics_trimestre.trimestre);
+    CALL atualizar_analytics(operadoras);
+END;
+$$;
+
+CALL atualizar_analytics();
+
+------------------------------------
+-- CONSULTAS (mesmas colunas de db/analytics.sql)
+------------------------------------
+
+-- #region QUERY 1 - 5 operadoras com maior crescimento percentual
+CREATE VIEW vw_crescimento_top5 AS
+SELECT
+    RegistroANS,
+    RazaoSocial,
+    valor_inicial AS ValorInicial,
+    valor_final AS ValorFinal,
+    ROUND(crescimento_percentual, 2) AS Crescimento_Percentual
+FROM analytics_operadora
+WHERE crescimento_percentual IS NOT NULL  -- evita divisão por zero
+ORDER BY crescimento_percentual DESC NULLS LAST
+LIMIT 5;
+-- #endregion
+
+-- #region QUERY 2 - Distribuição de Despesas por UF
+CREATE VIEW vw_despesas_uf AS
+SELECT
+    UF,
+    SUM(total_despesas) AS total_despesas_uf,
+    AVG(total_despesas) AS media_despesas_por_operadora
+FROM analytics_operadora
+GROUP BY UF
+ORDER BY total_despesas_uf DESC
+LIMIT 5;
+-- #endregion
+
+-- #region QUERY 3 - Operadoras acima da média (ranking)
+CREATE VIEW vw_acima_media AS
+WITH media_geral AS (
+    -- Média de todos os trimestres, a partir das somas por operadora
+    SELECT SUM(total_despesas) / NULLIF(SUM(n_trimestres), 0) AS media
+    FROM analytics_operadora
+),
+contagem_trimestres AS (
+    SELECT
+        a.RegistroANS,
+        a.RazaoSocial,
+        -- valores está ordenado: width_bucket conta por busca binária os <= média
+        cardinality(a.valores) - width_bucket(m.media, a.valores) AS trimestres_acima_media,
+        a.total_despesas AS total_despesas_acima_media
+    FROM analytics_operadora a
+    CROSS JOIN media_geral m
+)
+SELECT
+    RegistroANS,
+    RazaoSocial,
+    trimestres_acima_media,
+    total_despesas_acima_media,
+    RANK() OVER (
+        ORDER BY trimestres_acima_media DESC, total_despesas_acima_media DESC
+    ) AS ranking
+FROM contagem_trimestres
+WHERE trimestres_acima_media >= 2
+ORDER BY ranking;
+-- #endregion
@@ -1,4 +1,5 @@
 -- 1. Limpeza de ambiente
+DROP TABLE IF EXISTS resultado_despesas CASCADE;
 DROP TABLE IF EXISTS consolidado_despesas CASCADE;
 DROP TABLE IF EXISTS despesas_agregadas CASCADE;
 DROP TABLE IF EXISTS operadoras_cadastro CASCADE;
@@ -15,26 +16,12 @@ CREATE TABLE operadoras_cadastro (
     UF CHAR(2)
 );
 
--- Insere os novos registros em operadoras_cadastro
---registros que constavam em outras tabelas e não constavam na operadoras_cadastro, causando conflito de chave
-INSERT INTO operadoras_cadastro (RegistroANS, CNPJ, RazaoSocial, Modalidade, UF)
-VALUES
-(477, '00000000000000', 'Operadora 477', 'Desconhecida', 'XX'),
-(321338, '00000000000000', 'Operadora 321338', 'Desconhecida', 'XX'),
-(345741, '00000000000000', 'Operadora 345741', 'Desconhecida', 'XX'),
-(346870, '00000000000000', 'Operadora 346870', 'Desconhecida', 'XX'),
-(349534, '00000000000000', 'Operadora 349534', 'Desconhecida', 'XX'),
-(350141, '00000000000000', 'Operadora 350141', 'Desconhecida', 'XX'),
-(351792, '00000000000000', 'Operadora 351792', 'Desconhecida', 'XX'),
-(418161, '00000000000000', 'Operadora 418161', 'Desconhecida', 'XX'),
-(419907, '00000000000000', 'Operadora 419907', 'Desconhecida', 'XX'),
-(423475, '00000000000000', 'Operadora 423475', 'Desconhecida', 'XX'),
-(423742, '00000000000000', 'Operadora 423742', 'Desconhecida', 'XX');
+-- Consulta em lote por CNPJ (POST /api/operadoras/consulta)
+CREATE INDEX idx_operadoras_cnpj ON operadoras_cadastro (CNPJ);
 
-ALTER TABLE consolidado_despesas
-ADD CONSTRAINT fk_consolidado_operadoras
-FOREIGN KEY (RegistroANS)
-REFERENCES operadoras_cadastro (RegistroANS);
+-- Operadoras que saíram do Relatorio_cadop vêm do registro do pipeline
+-- (src/registro.py) com os últimos dados conhecidos; as que nunca constaram
+-- nele são incluídas pela carga (src/carga_banco.py) como 'Operadora N'
 
 ------------------------------------
 --TABELA 2 -- CONSOLIDADO DE DESPESAS
@@ -50,6 +37,13 @@ CREATE TABLE consolidado_despesas (
     PRIMARY KEY (RegistroANS, Trimestre, Ano)  -- Garante que não haverá duplicidade de RegistroANS no mesmo trimestre/ano
 );
 
+-- DEFERRABLE: a carga em lote (src/carga_banco.py) verifica a chave só no COMMIT
+ALTER TABLE consolidado_despesas
+ADD CONSTRAINT fk_consolidado_operadoras
+FOREIGN KEY (RegistroANS)
+REFERENCES operadoras_cadastro (RegistroANS)
+DEFERRABLE INITIALLY IMMEDIATE;
+
 -- modelo de consulta vinculando dados:
 SELECT cd.RegistroANS, cd.Trimestre, cd.Ano, cd.ValorDespesas, 
        oc.CNPJ, oc.RazaoSocial, oc.Modalidade, oc.UF
@@ -71,6 +65,7 @@ CREATE TABLE despesas_agregadas (
     DesvioPadrao NUMERIC(18,2),
     PRIMARY KEY (RegistroANS),  -- Caso cada RegistroANS seja único
     FOREIGN KEY (RegistroANS) REFERENCES operadoras_cadastro(RegistroANS)
+        DEFERRABLE INITIALLY IMMEDIATE
 );
 
 -- modelo de consulta vinculando dados:
@@ -85,7 +80,38 @@ ORDER BY da.RegistroANS;
 ------------------------------------
 -- TABELA 4 - CONSULTA JOIN DAS 3 TABELAS
 ------------------------------------
-CREATE TABLE resultado_despesas AS
+-- Tabela comum (e não CREATE TABLE AS): a carga recalcula o conteúdo numa
+-- transação, sem recriar a tabela
+CREATE TABLE resultado_despesas (
+    RegistroANS INTEGER,
+    CNPJ VARCHAR(20),
+    RazaoSocial TEXT,
+    Modalidade TEXT,
+    UF CHAR(2),
+    Trimestre VARCHAR(5),
+    Ano INTEGER,
+    ValorDespesas NUMERIC(18,2),
+    TotalDespesas NUMERIC(18,2),
+    MediaTrimestral NUMERIC(18,2),
+    DesvioPadrao NUMERIC(18,2),
+    -- Chave inteira do trimestre (Ano * 10 + trimestre, ex.: 20241), ordenável
+    -- sem concatenar textos; usada por db/analytics_materializado.sql
+    Periodo INTEGER GENERATED ALWAYS AS
+        (Ano * 10 + CAST(substring(Trimestre FROM '[1-4]') AS INTEGER)) STORED,
+    PRIMARY KEY (RegistroANS, Trimestre, Ano)
+);
+
+-- Índices das consultas da API no modo postgres (api/banco.py)
+CREATE EXTENSION IF NOT EXISTS pg_trgm;
+-- busca por trecho da razão social (ILIKE '%termo%')
+CREATE INDEX idx_resultado_razao_trgm ON resultado_despesas
+    USING gin (RazaoSocial gin_trgm_ops);
+-- busca por prefixo do CNPJ (LIKE 'termo%')
+CREATE INDEX idx_resultado_cnpj ON resultado_despesas (CNPJ varchar_pattern_ops);
+-- detalhe/histórico por operadora e paginação por chave na ordem da listagem
+CREATE INDEX idx_resultado_registro_periodo ON resultado_despesas (RegistroANS, Ano, Trimestre);
+
+INSERT INTO resultado_despesas
 SELECT 
     oc.RegistroANS,
     oc.CNPJ,
@@ -106,9 +132,3 @@ LEFT JOIN
     despesas_agregadas da ON oc.RegistroANS = da.RegistroANS
 ORDER BY 
     oc.RegistroANS, cd.Ano, cd.Trimestre;
-
-
-
-
-
-
@@ -0,0 +1,224 @@
+# src/armazenamento.py
+import json
+import operator
+import os
+import shutil
+
+import pandas as pd
+
+# Formato dos arquivos intermediários do pipeline: 'csv' (padrão) ou 'parquet'.
+# Em 'parquet' os CSVs não são gravados pelo pipeline: o ZIP final os gera em
+# fluxo (iterar_csv) e a carga no banco exporta quando precisa (exportar_csv).
+FORMATO = os.environ.get('ANS_FORMATO', 'csv').lower()
+PARTICOES = ['Ano', 'Trimestre']
+# Linhas por lote na conversão de parquet para CSV
+LINHAS_POR_LOTE_CSV = int(os.environ.get('ANS_LINHAS_LOTE_CSV', 200_000))
+# Colunas lidas como texto ao regravar um CSV: o CNPJ mantém os zeros à esquerda
+TIPOS_TEXTO_CSV = {'CNPJ': str, 'Trimestre': str, 'Ano': str}
+
+_OPERADORES = {
+    '==': operator.eq, '=': operator.eq, '!=': operator.ne,
+    '<': operator.lt, '<=': operator.le, '>': operator.gt, '>=': operator.ge,
+}
+
+
+def caminho(base, formato=FORMATO):
+    """Caminho do arquivo (ou diretório particionado) de `base`, informada sem extensão."""
+    return f"{base}.{'parquet' if formato == 'parquet' else 'csv'}"
+
+
+def existe(base, formato=FORMATO):
+    return os.path.exists(caminho(base, formato))
+
+
+def _remover(destino):
+    if os.path.isdir(destino):
+        shutil.rmtree(destino)
+    elif os.path.exists(destino):
+        os.remove(destino)
+
+
+def salvar(df, base, formato=FORMATO, particionar=False):
+    """Grava `df` em `base`; em parquet, opcionalmente particionado por Ano/Trimestre."""
+    destino = caminho(base, formato)
+    if formato != 'parquet':
+        df.to_csv(destino, index=False, encoding='utf-8')
+        return destino
+
+    # Grava ao lado e troca no final, para leitores nunca verem um diretório pela metade
+    temporario = destino + '.tmp'
+    _remover(temporario)
+    df.to_parquet(temporario, index=False,
+                  partition_cols=PARTICOES if particionar else None)
+    if particionar:
+        # As colunas de partição voltam no fim na leitura; guarda a ordem original
+        # (arquivos iniciados por '_' são ignorados pelo leitor do dataset)
+        with open(os.path.join(temporario, '_colunas.json'), 'w', encoding='utf-8') as f:
+            json.dump(list(df.columns), f)
+    _remover(destino)
+    os.replace(temporario, destino)
+    return destino
+
+
+def _filtrar(df, filtros):
+    """Aplica filtros no formato do pyarrow ([(coluna, op, valor), ...]) a um DataFrame."""
+    mascara = pd.Series(True, index=df.index)
+    for coluna, op, valor in filtros:
+        if op == 'in':
+            mascara &= df[coluna].isin(valor)
+        elif op == 'not in':
+            mascara &= ~df[coluna].isin(valor)
+        else:
+            mascara &= _OPERADORES[op](df[coluna], valor)
+    return df[mascara]
+
+
+def ler(base, colunas=None, filtros=None, formato=FORMATO, **kwargs_csv):
+    """Lê `base` projetando `colunas` e aplicando `filtros` ([(coluna, op, valor), ...]).
+
+    Em parquet a projeção e os filtros são resolvidos na leitura (partições e
+    row groups que não atendem aos filtros nem são lidos); em CSV são
+    aplicados depois.
+    """
+    origem = caminho(base, formato)
+    if formato != 'parquet':
+        usecols = None
+        if colunas is not None:
+            usecols = list(dict.fromkeys(
+                list(colunas) + [c for c, _, _ in filtros or []]))
+        df = pd.read_csv(origem, usecols=usecols, **kwargs_csv)
+        if filtros:
+            df = _filtrar(df, filtros).reset_index(drop=True)
+        return df[list(colunas)] if colunas is not None else df
+
+    df = pd.read_parquet(origem, columns=colunas, filters=filtros)
+    # Colunas de partição voltam como categorias; restaura o tipo dos valores
+    for coluna in PARTICOES:
+        if coluna in df.columns and isinstance(df[coluna].dtype, pd.CategoricalDtype):
+            df[coluna] = df[coluna].astype(df[coluna].cat.categories.dtype)
+
+    ordem = os.path.join(origem, '_colunas.json')
+    if colunas is None and os.path.exists(ordem):
+        with open(ordem, encoding='utf-8') as f:
+            df = df[json.load(f)]
+    return df
+
+
+def arquivos(base, formato=FORMATO):
+    """Arquivos em disco de `base`, em ordem: o próprio arquivo ou os da pasta particionada."""
+    origem = caminho(base, formato)
+    if not os.path.isdir(origem):
+        return [origem]
+    return sorted(os.path.join(raiz, nome) for raiz, _, nomes in os.walk(origem) for nome in nomes)
+
+
+def iterar_csv(base, formato=FORMATO, linhas_por_lote=LINHAS_POR_LOTE_CSV):
+    """Conteúdo de `base` em CSV (UTF-8), em blocos de bytes.
+
+    Em csv são os blocos do próprio arquivo; em parquet, lotes de até
+    `linhas_por_lote` linhas, sem montar a tabela inteira na memória (mesmas
+    colunas, ordem e texto de `ler(base).to_csv(index=False)`).
+    """
+    origem = caminho(base, formato)
+    if formato != 'parquet':
+        with open(origem, 'rb') as f:
+            yield from iter(lambda: f.read(4 * 1024 * 1024), b'')
+        return
+
+    import pyarrow as pa
+    import pyarrow.dataset as ds
+
+    dataset = ds.dataset(origem, format='parquet', partitioning='hive')
+    colunas = dataset.schema.names
+    ordem = os.path.join(origem, '_colunas.json')
+    if os.path.exists(ordem):
+        with open(ordem, encoding='utf-8') as f:
+            colunas = json.load(f)
+
+    def converter(lotes, cabecalho):
+        tabela = pa.Table.from_batches(lotes, schema=lotes[0].schema)
+        return tabela.to_pandas().to_csv(index=False, header=cabecalho).encode('utf-8')
+
+    # Os lotes do dataset são pequenos (um por row group de cada partição):
+    # juntá-los até `linhas_por_lote` evita o custo fixo do to_csv por lote
+    cabecalho, pendentes, linhas = True, [], 0
+    for lote in dataset.to_batches(columns=colunas, batch_size=linhas_por_lote):
+        if not lote.num_rows:
+            continue
+        pendentes.append(lote)
+        linhas += lote.num_rows
+        if linhas >= linhas_por_lote:
+            yield converter(pendentes, cabecalho)
+            cabecalho, pendentes, linhas = False, [], 0
+    if pendentes:
+        yield converter(pendentes, cabecalho)
+    elif cabecalho:  # sem nenhuma linha: só o cabeçalho
+        yield pd.DataFrame(columns=colunas).to_csv(index=False).encode('utf-8')
+
+
+def exportar_csv(base, formato=FORMATO):
+    """Gera `base`.csv a partir do formato intermediário (para a carga no banco)."""
+    destino = caminho(base, 'csv')
+    if formato == 'parquet':
+        with open(destino + '.tmp', 'wb') as f:
+            for bloco in iterar_csv(base, 'parquet'):
+                f.write(bloco)
+        os.replace(destino + '.tmp', destino)
+    return destino
+
+
+def upsert_periodo(base, novos, chave, formato=FORMATO):
+    """Grava as linhas de um trimestre, com upsert por `chave`.
+
+    Se o trimestre ainda não existe, as linhas são apenas acrescentadas (em
+    CSV, ao final do arquivo; em parquet, como uma nova partição), com custo
+    proporcional aos dados novos. Caso contrário, as linhas de mesma chave
+    são substituídas. Retorna as linhas substituídas.
+    """
+    novos = novos.astype({'Trimestre': str, 'Ano': str})
+    periodos = set(zip(novos['Trimestre'], novos['Ano']))
+    destino = caminho(base, formato)
+
+    if formato == 'parquet':
+        if len(periodos) != 1:
+            raise ValueError("upsert_periodo espera as linhas de um único trimestre")
+        trimestre, ano = next(iter(periodos))
+        particao = os.path.join(destino, f"Ano={ano}", f"Trimestre={trimestre}")
+        existentes = pd.read_parquet(particao) if os.path.isdir(particao) else None
+        if existentes is not None:
+            existentes = existentes.assign(Trimestre=trimestre, Ano=ano)
+    else:
+        existentes = None
+        if os.path.exists(destino):
+            periodos_existentes = pd.read_csv(
+                destino, usecols=['Trimestre', 'Ano'], dtype=str).drop_duplicates()
+            if any(p in periodos for p in zip(periodos_existentes['Trimestre'], periodos_existentes['Ano'])):
+                existentes = pd.read_csv(destino, dtype=TIPOS_TEXTO_CSV)
+
+    if existentes is None:
+        removidos = novos.iloc[0:0]
+        resultado = novos
+    else:
+        substituir = pd.MultiIndex.from_frame(existentes[chave]).isin(
+            pd.MultiIndex.from_frame(novos[chave]))
+        removidos = existentes[substituir]
+        resultado = pd.concat([existentes[~substituir], novos], ignore_index=True)
+
+    if formato == 'parquet':
+        # Só a partição do trimestre é (re)escrita
+        os.makedirs(os.path.dirname(particao), exist_ok=True)
+        # Prefixo '.' para o leitor do dataset ignorar a partição em construção
+        temporario = os.path.join(os.path.dirname(particao),
+                                  '.' + os.path.basename(particao) + '.tmp')
+        _remover(temporario)
+        os.makedirs(temporario)
+        resultado.drop(columns=PARTICOES).to_parquet(
+            os.path.join(temporario, 'part-0.parquet'), index=False)
+        _remover(particao)
+        os.replace(temporario, particao)
+    elif existentes is None and os.path.exists(destino):
+        novos.to_csv(destino, mode='a', header=False, index=False, encoding='utf-8')
+    else:
+        resultado.to_csv(destino, index=False, encoding='utf-8')
+
+    return removidos
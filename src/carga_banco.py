@@ -0,0 +1,234 @@
+# src/carga_banco.py
+import argparse
+import csv
+import os
+import time
+
+import psycopg
+from psycopg import sql
+
+import src.armazenamento as armazenamento
+
+# Conexão: ANS_DATABASE_URL ou, se vazia, as variáveis padrão do libpq (PGHOST, PGUSER, ...)
+DSN = os.environ.get('ANS_DATABASE_URL', '')
+BLOCO_COPY = 1024 * 1024  # bytes enviados por chamada do COPY
+
+# Tabelas de db/create_tables.sql, na ordem de carga:
+# (tabela, base do arquivo do pipeline, chave primária, colunas -> tipo)
+TABELAS = [
+    ('operadoras_cadastro', 'data/tabela_cadastro_operadoras_limpo', ['RegistroANS'], {
+        'RegistroANS': 'integer', 'CNPJ': 'varchar(20)', 'RazaoSocial': 'text',
+        'Modalidade': 'text', 'UF': 'char(2)'}),
+    ('consolidado_despesas', 'data/consolidado_despesas', ['RegistroANS', 'Trimestre', 'Ano'], {
+        'CNPJ': 'varchar(20)', 'RegistroANS': 'integer', 'Trimestre': 'varchar(5)',
+        'Ano': 'integer', 'ValorDespesas': 'numeric(18,2)'}),
+    ('despesas_agregadas', 'data/despesas_agregadas', ['RegistroANS'], {
+        'RegistroANS': 'integer', 'RazaoSocial': 'text', 'UF': 'char(2)',
+        'TotalDespesas': 'numeric(18,2)', 'MediaTrimestral': 'numeric(18,2)',
+        'DesvioPadrao': 'numeric(18,2)'}),
+]
+
+# Tabelas cujas colunas entram no resumo de db/analytics_materializado.sql
+# (RazaoSocial/UF do cadastro e ValorDespesas por período); despesas_agregadas não entra
+TABELAS_ANALYTICS = {'operadoras_cadastro', 'consolidado_despesas'}
+
+# Mesmo conteúdo da tabela 4 de db/create_tables.sql
+SQL_RESULTADO = """
+INSERT INTO resultado_despesas
+SELECT oc.RegistroANS, oc.CNPJ, oc.RazaoSocial, oc.Modalidade, oc.UF,
+       cd.Trimestre, cd.Ano, cd.ValorDespesas,
+       da.TotalDespesas, da.MediaTrimestral, da.DesvioPadrao
+FROM operadoras_cadastro oc
+JOIN consolidado_despesas cd ON oc.RegistroANS = cd.RegistroANS
+LEFT JOIN despesas_agregadas da ON oc.RegistroANS = da.RegistroANS
+ORDER BY oc.RegistroANS, cd.Ano, cd.Trimestre
+"""
+
+
+def _staging(tabela):
+    return sql.Identifier(f'stg_{tabela}')
+
+
+def _arquivo_csv(base):
+    """CSV de `base`; no formato parquet, exporta se o CSV não existir ou for mais antigo."""
+    destino = armazenamento.caminho(base, 'csv')
+    if armazenamento.existe(base, 'parquet') and (not os.path.exists(destino) or os.path.getmtime(
+            destino) < max(os.path.getmtime(a) for a in armazenamento.arquivos(base, 'parquet'))):
+        armazenamento.exportar_csv(base, 'parquet')
+    if not os.path.exists(destino):
+        raise FileNotFoundError(f"{destino} não encontrado. Execute o pipeline primeiro.")
+    return destino
+
+
+def _cabecalho(caminho):
+    with open(caminho, encoding='utf-8', newline='') as f:
+        return next(csv.reader(f))
+
+
+def copiar_para_staging(cur, tabela, caminho, colunas):
+    """Cria a tabela de staging (UNLOGGED, colunas texto) e envia o CSV via COPY.
+
+    O arquivo vai em blocos direto para o servidor, sem passar pelo pandas;
+    as conversões de tipo ficam para o upsert. Retorna as linhas copiadas.
+    """
+    cabecalho = _cabecalho(caminho)
+    faltando = [c for c in colunas if c not in cabecalho]
+    if faltando:
+        raise ValueError(f"{caminho}: colunas ausentes {faltando}")
+
+    # Colunas da staging com os nomes do CSV em minúsculas (como os identificadores sem aspas)
+    nomes = [sql.Identifier(c.lower()) for c in cabecalho]
+    cur.execute(sql.SQL("DROP TABLE IF EXISTS {}").format(_staging(tabela)))
+    cur.execute(sql.SQL("CREATE UNLOGGED TABLE {} ({})").format(
+        _staging(tabela), sql.SQL(', ').join(sql.SQL("{} text").format(n) for n in nomes)))
+
+    with open(caminho, 'rb') as f, cur.copy(sql.SQL(
+            "COPY {} ({}) FROM STDIN WITH (FORMAT csv, HEADER true, ENCODING 'UTF8')").format(
+                _staging(tabela), sql.SQL(', ').join(nomes))) as copy:
+        while bloco := f.read(BLOCO_COPY):
+            copy.write(bloco)
+    return cur.rowcount
+
+
+def _valor(coluna, tipo):
+    """Expressão de conversão do texto da staging (vazio vira NULL)."""
+    valor = sql.SQL("NULLIF(btrim({}), '')").format(sql.Identifier(coluna.lower()))
+    if tipo == 'integer':
+        # O pandas grava inteiros com NaN como float ("123.0")
+        return sql.SQL("{}::numeric::integer").format(valor)
+    return sql.SQL("{}::{}").format(valor, sql.SQL(tipo))
+
+
+def upsert(cur, tabela, chave, colunas):
+    """Insere ou atualiza `tabela` a partir da staging, pela chave primária.
+
+    Linhas repetidas na staging (mesma chave) são reduzidas a uma, já que o
+    ON CONFLICT não aceita atualizar a mesma linha duas vezes num comando.
+    Linhas iguais às da tabela não são regravadas. Retorna o RegistroANS de
+    cada linha inserida ou alterada.
+    """
+    alvo = [sql.Identifier(c.lower()) for c in colunas]
+    pk = [sql.Identifier(c.lower()) for c in chave]
+    valores = [sql.Identifier(c.lower()) for c in colunas if c not in chave]
+    atualizar = [sql.SQL("{0} = EXCLUDED.{0}").format(c) for c in valores]
+    cur.execute(sql.SQL("""
+        INSERT INTO {tabela} ({alvo})
+        SELECT DISTINCT ON ({pk}) {alvo}
+        FROM (SELECT {valores} FROM {staging}) s
+        WHERE {chave_preenchida}
+        ORDER BY {pk}
+        ON CONFLICT ({pk}) DO UPDATE SET {atualizar}
+        WHERE ({atuais}) IS DISTINCT FROM ({novos})
+        RETURNING registroans
+    """).format(
+        tabela=sql.Identifier(tabela),
+        alvo=sql.SQL(', ').join(alvo),
+        pk=sql.SQL(', ').join(pk),
+        valores=sql.SQL(', ').join(
+            sql.SQL("{} AS {}").format(_valor(c, t), sql.Identifier(c.lower()))
+            for c, t in colunas.items()),
+        staging=_staging(tabela),
+        chave_preenchida=sql.SQL(' AND ').join(
+            sql.SQL("{} IS NOT NULL").format(c) for c in pk),
+        atualizar=sql.SQL(', ').join(atualizar),
+        atuais=sql.SQL(', ').join(
+            sql.SQL("{}.{}").format(sql.Identifier(tabela), c) for c in valores),
+        novos=sql.SQL(', ').join(sql.SQL("EXCLUDED.{}").format(c) for c in valores),
+    ))
+    return [linha[0] for linha in cur.fetchall()]
+
+
+def inserir_operadoras_ausentes(cur):
+    """Cadastra as operadoras que aparecem nas despesas mas não no cadastro.
+
+    Só sobram as que nunca constaram no Relatorio_cadop (o registro do
+    pipeline, src/registro.py, guarda as que saíram dele): entram como
+    'Operadora N', modalidade 'Desconhecida', UF 'XX', e o cadastro real as
+    substitui quando a operadora aparecer.
+    """
+    origens = sql.SQL(' UNION ').join(
+        sql.SQL("SELECT {} AS registroans FROM {}").format(
+            _valor('RegistroANS', 'integer'), _staging(tabela))
+        for tabela, _, _, _ in TABELAS[1:])
+    cur.execute(sql.SQL("""
+        INSERT INTO operadoras_cadastro (RegistroANS, CNPJ, RazaoSocial, Modalidade, UF)
+        SELECT o.registroans, '00000000000000', 'Operadora ' || o.registroans, 'Desconhecida', 'XX'
+        FROM ({origens}) o
+        WHERE o.registroans IS NOT NULL
+        ON CONFLICT (RegistroANS) DO NOTHING
+        RETURNING RegistroANS
+    """).format(origens=origens))
+    return [linha[0] for linha in cur.fetchall()]
+
+
+def atualizar_analytics(cur, operadoras):
+    """Recalcula o resumo de db/analytics_materializado.sql só para `operadoras`.
+
+    São as operadoras com linhas inseridas ou alteradas pela carga: as outras
+    têm em resultado_despesas exatamente o que o resumo já reflete.
+    """
+    cur.execute("SELECT to_regprocedure('atualizar_analytics(integer[])') IS NOT NULL AS existe")
+    if not cur.fetchone()[0]:
+        return
+    if not operadoras:
+        print("📈 Resumo de analytics sem mudanças")
+        return
+    cur.execute("CALL atualizar_analytics(%s)", (sorted(operadoras),))
+    print(f"📈 Resumo de analytics atualizado para {len(operadoras)} operadoras")
+
+
+def carregar_banco(dsn=DSN, tabelas=TABELAS):
+    """Carrega as saídas do pipeline no PostgreSQL numa única transação.
+
+    COPY para tabelas de staging UNLOGGED, upsert nas tabelas finais pelas
+    chaves primárias (com as FKs adiadas para o COMMIT) e recálculo de
+    resultado_despesas. Leitores continuam vendo a versão anterior até o
+    COMMIT; em caso de erro, nada é alterado.
+    """
+    inicio = time.perf_counter()
+    arquivos = {tabela: _arquivo_csv(base) for tabela, base, _, _ in tabelas}
+
+    with psycopg.connect(dsn) as conn, conn.cursor() as cur:
+        # Uma carga por vez (as tabelas de staging têm nomes fixos)
+        cur.execute("SELECT pg_advisory_xact_lock(hashtext('carga_banco_ans'))")
+        cur.execute("SET CONSTRAINTS ALL DEFERRED")
+
+        for tabela, _, _, colunas in tabelas:
+            linhas = copiar_para_staging(cur, tabela, arquivos[tabela], colunas)
+            print(f"📥 {tabela}: {linhas} linhas copiadas de {arquivos[tabela]}")
+
+        # Operadoras cujo resumo de analytics muda com esta carga
+        alteradas = set()
+        for tabela, _, chave, colunas in tabelas:
+            registros = upsert(cur, tabela, chave, colunas)
+            print(f"🔁 {tabela}: {len(registros)} linhas inseridas/atualizadas")
+            if tabela in TABELAS_ANALYTICS:
+                alteradas.update(registros)
+
+        ausentes = inserir_operadoras_ausentes(cur)
+        if ausentes:
+            print(f"⚠️ {len(ausentes)} operadoras sem cadastro incluídas como 'Desconhecida'")
+            alteradas.update(ausentes)
+
+        # DELETE (e não TRUNCATE): consultas concorrentes não ficam bloqueadas até o COMMIT
+        cur.execute("DELETE FROM resultado_despesas")
+        cur.execute(SQL_RESULTADO)
+        print(f"🧮 resultado_despesas: {cur.rowcount} linhas")
+
+        atualizar_analytics(cur, alteradas)
+
+        for tabela, _, _, _ in tabelas:
+            cur.execute(sql.SQL("DROP TABLE {}").format(_staging(tabela)))
+        for tabela in [t for t, _, _, _ in tabelas] + ['resultado_despesas']:
+            cur.execute(sql.SQL("ANALYZE {}").format(sql.Identifier(tabela)))
+
+    print(f"✅ Carga concluída em {time.perf_counter() - inicio:.1f}s")
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(
+        description="Carrega os CSVs do pipeline no PostgreSQL (db/create_tables.sql)")
+    parser.add_argument('--dsn', default=DSN,
+                        help="string de conexão (padrão: ANS_DATABASE_URL ou variáveis PG*)")
+    args = parser.parse_args()
+    carregar_banco(args.dsn)
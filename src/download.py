@@ -0,0 +1,278 @@
+# src/download.py
+import hashlib
+import json
+import os
+import re
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from urllib.parse import urljoin
+
+import requests
+from bs4 import BeautifulSoup
+from requests.adapters import HTTPAdapter
+from urllib3.util.retry import Retry
+
+HEADERS = {'User-Agent': 'Mozilla/5.0'}
+CHUNK_SIZE = 1024 * 1024  # 1 MiB por leitura: limita a memória por download
+MAX_WORKERS = 4
+
+# Cache de downloads (ZIPs trimestrais e Relatorio_cadop.csv), indexado por URL
+CACHE_DIR = os.environ.get('ANS_CACHE_DIR', 'data/cache')
+CACHE_MAX_BYTES = int(os.environ.get('ANS_CACHE_MAX_BYTES', 5 * 1024 ** 3))
+_lock_indice = threading.Lock()
+
+
+def criar_sessao(max_workers=MAX_WORKERS, verify=True):
+    """Cria uma sessão HTTP com pool de conexões e novas tentativas automáticas."""
+    session = requests.Session()
+    retry = Retry(total=3, backoff_factor=1,
+                  status_forcelist=[429, 500, 502, 503, 504],
+                  allowed_methods=['GET', 'HEAD'])
+    adapter = HTTPAdapter(pool_connections=max_workers,
+                          pool_maxsize=max_workers, max_retries=retry)
+    session.mount('http://', adapter)
+    session.mount('https://', adapter)
+    session.headers.update(HEADERS)
+    session.verify = verify
+    return session
+
+
+def listar_links(session, url, filtro):
+    """Retorna os links (absolutos) de uma listagem de diretório que passam no filtro."""
+    res = session.get(url, timeout=15)
+    res.raise_for_status()
+    soup = BeautifulSoup(res.text, 'html.parser')
+    return [urljoin(url, a['href']) for a in soup.find_all('a', href=True)
+            if filtro(a['href'])]
+
+
+def listar_zips_ano(session, url_ano):
+    """Lista os ZIPs trimestrais de um diretório de ano, do mais recente ao mais antigo."""
+    zips = listar_links(session, url_ano,
+                        lambda href: href.lower().endswith('.zip'))
+    return sorted(zips, reverse=True)
+
+
+def get_last_quarters(base_url, quantidade, session=None, max_workers=MAX_WORKERS):
+    """Busca os `quantidade` ZIPs mais recentes, varrendo os anos em paralelo.
+
+    Os anos são visitados em lotes de `max_workers` (do mais recente ao mais
+    antigo) e a varredura para assim que há trimestres suficientes.
+    """
+    session = session or criar_sessao(max_workers)
+    anos = sorted(listar_links(session, base_url,
+                               lambda href: re.match(r'20\d{2}/?', href)), reverse=True)
+
+    links = []
+    with ThreadPoolExecutor(max_workers=max_workers) as executor:
+        for i in range(0, len(anos), max_workers):
+            lote = anos[i:i + max_workers]
+            # map preserva a ordem dos anos, mesmo com as requisições em paralelo
+            for zips in executor.map(lambda url: listar_zips_ano(session, url), lote):
+                links.extend(zips)
+            if len(links) >= quantidade:
+                break
+    return links[:quantidade]
+
+
+def _validador(headers):
+    """Validador aceito no If-Range: ETag forte ou, sem ele, o Last-Modified."""
+    etag = headers.get('ETag')
+    if etag and not etag.startswith('W/'):
+        return etag
+    return headers.get('Last-Modified')
+
+
+def _descartar_parcial(parcial):
+    for caminho in (parcial, parcial + '.validador'):
+        if os.path.exists(caminho):
+            os.remove(caminho)
+
+
+def baixar_arquivo(session, url, destino, headers=None, chunk_size=CHUNK_SIZE):
+    """Baixa `url` em `destino` por streaming, retomando um download parcial se houver.
+
+    O conteúdo é gravado em `destino + '.part'` e só é renomeado quando o
+    download termina, então um arquivo em `destino` está sempre completo.
+    O validador da resposta que começou o parcial (ETag ou Last-Modified) fica
+    em `.part.validador` e vai no If-Range da retomada: se o arquivo mudou no
+    servidor, a resposta é 200 com o arquivo novo inteiro, e não 206 com
+    bytes do novo emendados no antigo. Parcial sem validador é descartado.
+    Retorna os headers da resposta, ou None se o servidor responder 304
+    (requisição condicional e conteúdo inalterado).
+    """
+    parcial = destino + '.part'
+    arquivo_validador = parcial + '.validador'
+    inicio = os.path.getsize(parcial) if os.path.exists(parcial) else 0
+    validador = None
+    if inicio and os.path.exists(arquivo_validador):
+        with open(arquivo_validador, encoding='utf-8') as f:
+            validador = f.read().strip() or None
+    if inicio and validador is None:
+        _descartar_parcial(parcial)
+        inicio = 0
+    headers = dict(headers or {})
+    if inicio:
+        headers['Range'] = f'bytes={inicio}-'
+        headers['If-Range'] = validador
+
+    with session.get(url, headers=headers, stream=True, timeout=120) as r:
+        if r.status_code == 304:
+            _descartar_parcial(parcial)
+            return None
+        if r.status_code == 416:
+            # Range fora do arquivo: o parcial já está completo (ou inválido), recomeça
+            _descartar_parcial(parcial)
+            headers.pop('Range')
+            headers.pop('If-Range')
+            return baixar_arquivo(session, url, destino, headers, chunk_size)
+        r.raise_for_status()
+
+        # 206: o servidor aceitou o Range; 200: devolveu o arquivo inteiro
+        modo = 'ab' if r.status_code == 206 else 'wb'
+        if modo == 'wb':
+            # Parcial novo: guarda o validador desta resposta para uma retomada futura
+            novo_validador = _validador(r.headers)
+            if novo_validador:
+                with open(arquivo_validador, 'w', encoding='utf-8') as f:
+                    f.write(novo_validador)
+            elif os.path.exists(arquivo_validador):
+                os.remove(arquivo_validador)
+        esperado = r.headers.get('Content-Length')
+        if esperado and r.headers.get('Content-Encoding', 'identity') == 'identity':
+            esperado = int(esperado) + (inicio if modo == 'ab' else 0)
+        else:
+            esperado = None  # sem tamanho confiável (ou conteúdo recodificado)
+
+        with open(parcial, modo) as f:
+            for chunk in r.iter_content(chunk_size=chunk_size):
+                f.write(chunk)
+        resposta = dict(r.headers)
+
+    if esperado is not None and os.path.getsize(parcial) != esperado:
+        raise IOError(
+            f"Download incompleto de {url}: {os.path.getsize(parcial)} de {esperado} bytes")
+
+    os.replace(parcial, destino)
+    if os.path.exists(arquivo_validador):
+        os.remove(arquivo_validador)
+    return resposta
+
+
+def carregar_indice(pasta):
+    """Lê o índice do cache ({url: metadados}); vazio se ainda não existir."""
+    caminho = os.path.join(pasta, 'index.json')
+    if not os.path.exists(caminho):
+        return {}
+    with open(caminho, encoding='utf-8') as f:
+        return json.load(f)
+
+
+def salvar_indice(pasta, indice):
+    caminho = os.path.join(pasta, 'index.json')
+    with open(caminho + '.tmp', 'w', encoding='utf-8') as f:
+        json.dump(indice, f, indent=2)
+    os.replace(caminho + '.tmp', caminho)
+
+
+def _nome_cache(url):
+    """Nome do arquivo em cache: hash da URL (evita colisões) + nome original."""
+    return hashlib.sha1(url.encode()).hexdigest()[:16] + '_' + url.rstrip('/').split('/')[-1]
+
+
+def _headers_condicionais(session, url, entrada):
+    """Monta If-None-Match/If-Modified-Since a partir da entrada do cache.
+
+    Sem validadores, compara o Content-Length de um HEAD com o tamanho
+    armazenado; retorna None quando isso já mostra que nada mudou.
+    """
+    headers = {}
+    if entrada.get('etag'):
+        headers['If-None-Match'] = entrada['etag']
+    if entrada.get('last_modified'):
+        headers['If-Modified-Since'] = entrada['last_modified']
+    if not headers and entrada.get('content_length'):
+        head = session.head(url, timeout=15, allow_redirects=True)
+        if head.ok and head.headers.get('Content-Length') == entrada['content_length']:
+            return None
+    return headers
+
+
+def _evict(pasta, indice, max_bytes, manter):
+    """Remove as entradas usadas há mais tempo até o cache caber em `max_bytes`.
+
+    As URLs de `manter` (o lote em download) nunca são removidas: o cache
+    pode passar do limite até o próximo download.
+    """
+    total = sum(e.get('tamanho', 0) for e in indice.values())
+    for url, entrada in sorted(indice.items(), key=lambda item: item[1].get('acesso', 0)):
+        if total <= max_bytes:
+            break
+        if url in manter:
+            continue
+        caminho = os.path.join(pasta, entrada['arquivo'])
+        if os.path.exists(caminho):
+            os.remove(caminho)
+        total -= entrada.get('tamanho', 0)
+        del indice[url]
+
+
+def baixar_cacheado(session, url, pasta=CACHE_DIR, max_bytes=CACHE_MAX_BYTES, manter=()):
+    """Baixa `url` através do cache em disco, revalidando com GET condicional.
+
+    `manter`: outras URLs que a limpeza do cache não pode remover (as do
+    mesmo lote, que ainda vão ser lidas).
+    Retorna (caminho, modificado): `modificado` é False quando o servidor
+    confirmou que o conteúdo em cache ainda é o atual.
+    """
+    os.makedirs(pasta, exist_ok=True)
+    destino = os.path.join(pasta, _nome_cache(url))
+    with _lock_indice:
+        entrada = carregar_indice(pasta).get(url)
+
+    if entrada and os.path.exists(destino):
+        headers = _headers_condicionais(session, url, entrada)
+        resposta = baixar_arquivo(
+            session, url, destino, headers) if headers is not None else None
+    else:
+        resposta = baixar_arquivo(session, url, destino)
+    modificado = resposta is not None
+
+    with _lock_indice:
+        indice = carregar_indice(pasta)
+        if modificado:
+            entrada = {
+                'arquivo': os.path.basename(destino),
+                'etag': resposta.get('ETag'),
+                'last_modified': resposta.get('Last-Modified'),
+                'content_length': resposta.get('Content-Length'),
+            }
+        entrada['tamanho'] = os.path.getsize(destino)
+        entrada['acesso'] = time.time()
+        indice[url] = entrada
+        _evict(pasta, indice, max_bytes, manter={url, *manter})
+        salvar_indice(pasta, indice)
+    return destino, modificado
+
+
+def baixar_trimestres(urls, pasta=CACHE_DIR, session=None, max_workers=MAX_WORKERS,
+                      max_bytes=CACHE_MAX_BYTES):
+    """Baixa vários ZIPs em paralelo, através do cache em `pasta`.
+
+    Nenhum ZIP do lote é removido pela limpeza do cache enquanto os outros
+    baixam, para todos os caminhos devolvidos existirem.
+    Retorna uma lista de (url, caminho ou None, modificado, erro) na mesma
+    ordem de `urls`.
+    """
+    session = session or criar_sessao(max_workers)
+    lote = frozenset(urls)
+
+    def _baixar(url):
+        try:
+            return (url, *baixar_cacheado(session, url, pasta, max_bytes, manter=lote), None)
+        except Exception as e:
+            return url, None, True, e
+
+    with ThreadPoolExecutor(max_workers=max_workers) as executor:
+        return list(executor.map(_baixar, urls))
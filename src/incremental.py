@@ -0,0 +1,97 @@
+# src/incremental.py
+import hashlib
+import json
+import os
+
+import numpy as np
+import pandas as pd
+
+CHAVE = ['RegistroANS', 'Trimestre', 'Ano']
+COLUNAS_ESTATISTICAS = ['RegistroANS', 'n', 'soma', 'soma_quadrados']
+
+
+def checksum_arquivo(caminho, chunk_size=1024 * 1024):
+    """SHA-256 do arquivo, lido em blocos."""
+    h = hashlib.sha256()
+    with open(caminho, 'rb') as f:
+        for bloco in iter(lambda: f.read(chunk_size), b''):
+            h.update(bloco)
+    return h.hexdigest()
+
+
+def carregar_manifesto(caminho):
+    """Lê o manifesto de ZIPs já ingeridos ({'zips': {nome: {...}}})."""
+    if not os.path.exists(caminho):
+        return {'zips': {}}
+    with open(caminho, encoding='utf-8') as f:
+        return json.load(f)
+
+
+def salvar_manifesto(caminho, manifesto):
+    with open(caminho + '.tmp', 'w', encoding='utf-8') as f:
+        json.dump(manifesto, f, indent=2)
+    os.replace(caminho + '.tmp', caminho)
+
+
+def registrar_zip(manifesto, zip_name, url, sha256, trimestre, ano):
+    manifesto['zips'][zip_name] = {
+        'url': url, 'sha256': sha256, 'Trimestre': trimestre, 'Ano': ano}
+
+
+def ja_ingerido(manifesto, zip_name, sha256):
+    """True se o ZIP com este nome e checksum já está no consolidado."""
+    return manifesto['zips'].get(zip_name, {}).get('sha256') == sha256
+
+
+def _contribuicoes(df):
+    """n, soma e soma dos quadrados de ValorDespesas por operadora."""
+    valores = pd.to_numeric(df['ValorDespesas'], errors='coerce').fillna(0)
+    return pd.DataFrame({
+        'RegistroANS': df['RegistroANS'].to_numpy(),
+        'n': 1,
+        'soma': valores.to_numpy(),
+        'soma_quadrados': valores.to_numpy() ** 2,
+    }).groupby('RegistroANS', as_index=False).sum()
+
+
+def carregar_estatisticas(caminho):
+    if not os.path.exists(caminho):
+        return pd.DataFrame(columns=COLUNAS_ESTATISTICAS)
+    return pd.read_csv(caminho)
+
+
+def calcular_estatisticas(df):
+    """Estatísticas acumuladas (n, soma, soma dos quadrados) a partir do consolidado."""
+    return _contribuicoes(df)[COLUNAS_ESTATISTICAS]
+
+
+def atualizar_estatisticas(estatisticas, novos, removidos):
+    """Soma a contribuição das linhas novas e desconta a das linhas substituídas."""
+    partes = [estatisticas, _contribuicoes(novos)]
+    if not removidos.empty:
+        negativo = _contribuicoes(removidos)
+        negativo[['n', 'soma', 'soma_quadrados']] *= -1
+        partes.append(negativo)
+
+    resultado = pd.concat(partes, ignore_index=True).groupby(
+        'RegistroANS', as_index=False).sum()
+    return resultado[resultado['n'] > 0][COLUNAS_ESTATISTICAS]
+
+
+def agregar_estatisticas(estatisticas):
+    """TotalDespesas, MediaTrimestral e DesvioPadrao (amostral) por operadora."""
+    n = estatisticas['n'].to_numpy(dtype=float)
+    soma = estatisticas['soma'].to_numpy(dtype=float)
+    soma_q = estatisticas['soma_quadrados'].to_numpy(dtype=float)
+
+    with np.errstate(divide='ignore', invalid='ignore'):
+        media = np.where(n > 0, soma / n, 0.0)
+        variancia = np.where(n > 1, (soma_q - soma * media) / (n - 1), 0.0)
+
+    return pd.DataFrame({
+        'RegistroANS': estatisticas['RegistroANS'].to_numpy(),
+        'TotalDespesas': soma,
+        'MediaTrimestral': media,
+        # Arredondamentos podem deixar a variância levemente negativa
+        'DesvioPadrao': np.sqrt(np.clip(variancia, 0, None)),
+    })
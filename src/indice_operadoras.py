@@ -0,0 +1,143 @@
+"""Estado do índice de operadoras da API: os arrays montados de um resultado_despesas.
+
+É o que o snapshot (src/snapshot_api.py) grava e o que o IndiceOperadoras
+(api/indice.py) consulta. Fica em src/ e só depende do numpy (e do pandas na
+montagem), para o ETL gravar o snapshot sem importar nada da API.
+"""
+import numpy as np
+
+
+def trigramas(texto):
+    return {texto[i:i + 3] for i in range(len(texto) - 2)}
+
+
+# Colunas de texto guardadas como códigos + tabela de valores distintos
+TEXTOS = ("razaosocial", "cnpj", "uf", "trimestre")
+NUMEROS = {"registroans": np.int64, "ano": np.int64, "valordespesas": np.float64,
+           "totaldespesas": np.float64, "mediatrimestral": np.float64, "desviopadrao": np.float64}
+
+
+def _tipo_codigos(quantidade):
+    """Menor inteiro que comporta os códigos: o mesmo que o pandas usa nas categorias,
+    para que pd.Categorical.from_codes aproveite o array sem convertê-lo."""
+    for tipo in (np.int8, np.int16, np.int32):
+        if quantidade < np.iinfo(tipo).max:
+            return tipo
+    return np.int64
+
+
+def _csr(chaves, quantidade):
+    """Agrupa as posições por chave (0..quantidade-1): (início de cada chave, posições).
+
+    As posições de uma chave são linhas[inicios[k]:inicios[k + 1]], em ordem crescente.
+    """
+    linhas = np.argsort(chaves, kind="stable")
+    inicios = np.searchsorted(chaves[linhas], np.arange(quantidade + 1))
+    return inicios.astype(np.int64), linhas.astype(np.int64)
+
+
+def estado_vazio():
+    """Estado de um índice sem linhas (sem importar o pandas)."""
+    estado = {c: np.zeros(0, dtype=tipo) for c, tipo in NUMEROS.items()}
+    for coluna in TEXTOS:
+        estado[f"{coluna}.codigos"] = np.zeros(0, dtype=np.int8)
+        estado[f"{coluna}.valores"] = ["N/A"]
+    for nome in ("operadoras", "documentos", "trigramas"):
+        estado[f"{nome}.inicios"] = np.zeros(1, dtype=np.int64)
+    estado["operadoras.registros"] = np.zeros(0, dtype=np.int64)
+    estado["operadoras.linhas"] = estado["documentos.linhas"] = np.zeros(0, dtype=np.int64)
+    for campo in ("razao", "registro", "cnpj"):
+        estado[f"documentos.{campo}"] = np.zeros(0, dtype=np.int64)
+    estado["trigramas.valores"] = []
+    estado["trigramas.documentos"] = np.zeros(0, dtype=np.int32)
+    return estado
+
+
+def montar_estado(df):
+    """Arrays que definem o índice de um DataFrame (o que o snapshot grava).
+
+    Cada valor é um array NumPy de tamanho fixo ou, nas tabelas de texto,
+    uma lista de str; nada depende de objetos por linha.
+    """
+    if df is None or df.empty:
+        return estado_vazio()
+    import pandas as pd  # só na montagem; quem abre um snapshot não precisa dele
+
+    total = len(df)
+    estado = {}
+    for coluna, tipo in NUMEROS.items():
+        if coluna not in df.columns:
+            estado[coluna] = np.zeros(total, dtype=tipo)
+        else:
+            valores = pd.to_numeric(df[coluna], errors="coerce").fillna(0)
+            estado[coluna] = valores.to_numpy(dtype=tipo)
+
+    for coluna in TEXTOS:
+        if coluna not in df.columns:
+            codigos, valores = np.zeros(total, dtype=np.int64), ["N/A"]
+        else:
+            # str() por valor distinto, como as rotas faziam por linha (nulo vira 'nan');
+            # refatorado depois do str() para a tabela ficar sem repetições e ordenada
+            codigos, unicos = pd.factorize(df[coluna], use_na_sentinel=False)
+            recodigos, valores = pd.factorize(
+                np.array([str(v) for v in unicos], dtype=object), sort=True)
+            codigos, valores = recodigos[codigos], list(valores)
+        estado[f"{coluna}.codigos"] = codigos.astype(_tipo_codigos(len(valores)))
+        estado[f"{coluna}.valores"] = valores
+
+    # RegistroANS -> linhas, em ordem (busca binária nos registros distintos)
+    registros, por_linha = np.unique(estado["registroans"], return_inverse=True)
+    estado["operadoras.registros"] = registros
+    estado["operadoras.inicios"], estado["operadoras.linhas"] = _csr(por_linha, len(registros))
+
+    # Documentos de busca: um por (razão social, registro, CNPJ) distinto
+    chaves = pd.DataFrame({
+        "razao": estado["razaosocial.codigos"],
+        "registro": estado["registroans"],
+        "cnpj": estado["cnpj.codigos"],
+    })
+    documento = chaves.groupby(list(chaves.columns), sort=False).ngroup().to_numpy()
+    quantidade = int(documento.max()) + 1
+    estado["documentos.inicios"], estado["documentos.linhas"] = _csr(documento, quantidade)
+    primeiras = estado["documentos.linhas"][estado["documentos.inicios"][:-1]]
+    for campo, origem in (("razao", "razaosocial.codigos"), ("registro", "registroans"),
+                          ("cnpj", "cnpj.codigos")):
+        estado[f"documentos.{campo}"] = estado[origem][primeiras]
+
+    # Trigramas -> documentos, também em CSR (tabela de trigramas ordenada)
+    postings = {}
+    for doc, textos in enumerate(textos_documentos(estado)):
+        for trigrama in set().union(*map(trigramas, textos)):
+            postings.setdefault(trigrama, []).append(doc)
+    valores = sorted(postings)
+    tamanhos = [len(postings[t]) for t in valores]
+    estado["trigramas.valores"] = valores
+    estado["trigramas.inicios"] = np.concatenate([[0], np.cumsum(tamanhos, dtype=np.int64)])
+    estado["trigramas.documentos"] = np.array(
+        [doc for t in valores for doc in postings[t]], dtype=np.int32)
+    return estado
+
+
+def textos_documentos(estado):
+    """(razão social minúscula, registro, CNPJ) de cada documento de busca."""
+    razoes = estado["razaosocial.valores"]
+    cnpjs = estado["cnpj.valores"]
+    return [(razoes[r].lower(), str(registro), cnpjs[c]) for r, registro, c in zip(
+        estado["documentos.razao"].tolist(), estado["documentos.registro"].tolist(),
+        estado["documentos.cnpj"].tolist())]
+
+
+def tabela(estado):
+    """resultado_despesas como DataFrame sobre os arrays de `estado`, sem cópia.
+
+    Os textos viram categorias (códigos + tabela ordenada), o que as
+    estatísticas (src/snapshot_api.py) agrupam como se fossem texto.
+    """
+    import pandas as pd
+
+    dados = {c: estado[c] for c in NUMEROS}
+    for coluna in TEXTOS:
+        dados[coluna] = pd.Categorical.from_codes(
+            estado[f"{coluna}.codigos"],
+            categories=pd.Index(estado[f"{coluna}.valores"], dtype=object), validate=False)
+    return pd.DataFrame(dados, copy=False)
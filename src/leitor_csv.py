@@ -0,0 +1,98 @@
+# src/leitor_csv.py
+import csv
+import re
+import warnings
+
+import pandas as pd
+import src.utils as utils
+
+CHUNK_LINHAS = 500_000  # Linhas por bloco: limita a memória por arquivo
+AMOSTRA_BYTES = 64 * 1024
+
+# Colunas usadas depois da normalização: as mapeadas por utils.normalizar_colunas
+# e as que o pipeline lê pelo nome original
+COLUNAS_EXTRAS = ['VL_SALDO_INICIAL', 'CD_CONTA_CONTABIL']
+COLUNAS_LIDAS = list(utils.MAPEAMENTO_COLUNAS) + COLUNAS_EXTRAS
+
+DTYPES = {
+    'REG_ANS': 'int32',
+    'VL_SALDO_INICIAL': 'float64',
+    'VL_SALDO_FINAL': 'float64',
+    'VALOR': 'float64',
+    'CD_CONTA_CONTABIL': 'category',
+}
+
+
+def detectar_formato(amostra):
+    """Detecta o delimitador e o separador decimal a partir das primeiras linhas."""
+    linhas = amostra.splitlines()[:50]
+    try:
+        sep = csv.Sniffer().sniff('\n'.join(linhas), delimiters=';,\t|').delimiter
+    except csv.Error:
+        sep = ';'  # padrão dos arquivos da ANS
+    decimal = ',' if sep != ',' and re.search(r'\d,\d', '\n'.join(linhas[1:])) else '.'
+    return sep, decimal
+
+
+def _ler_blocos(abrir, sep, decimal, dtype, relatorio):
+    """Gera os blocos do CSV com o parser C, registrando as linhas malformadas.
+
+    O arquivo é lido com todas as colunas e projetado bloco a bloco: com
+    `usecols` o parser C deixa de verificar a quantidade de campos, e as
+    linhas malformadas passariam sem aviso.
+    """
+    with abrir() as f:
+        leitor = pd.read_csv(f, sep=sep, decimal=decimal, encoding='latin1', dtype=dtype,
+                             engine='c', on_bad_lines='warn', chunksize=CHUNK_LINHAS)
+        while True:
+            with warnings.catch_warnings(record=True) as avisos:
+                warnings.simplefilter('always', pd.errors.ParserWarning)
+                try:
+                    bloco = next(leitor)
+                except StopIteration:
+                    break
+            for aviso in avisos:
+                relatorio['linhas_ignoradas'].extend(
+                    int(n) for n in re.findall(r'Skipping line (\d+)', str(aviso.message)))
+            yield bloco[[c for c in bloco.columns if c in COLUNAS_LIDAS]]
+
+
+def ler_csv(abrir, relatorio=None):
+    """Lê um CSV de demonstrações contábeis em blocos, com tipos compactos.
+
+    `abrir` é uma função que devolve um novo arquivo binário a cada chamada
+    (ex.: `lambda: z.open(nome)`): o formato é detectado uma vez a partir de
+    uma amostra e, se algum valor não couber nos tipos numéricos, o arquivo é
+    relido com as colunas numéricas como texto (a conversão fica a cargo de
+    utils.tratar_inconsistencias), a partir do bloco em que o erro ocorreu.
+
+    `relatorio` (dict) recebe o formato detectado, o total de linhas e os
+    números das linhas malformadas ignoradas.
+    """
+    relatorio = relatorio if relatorio is not None else {}
+    relatorio.update(linhas=0, linhas_ignoradas=[])
+
+    with abrir() as f:
+        amostra = f.read(AMOSTRA_BYTES).decode('latin1')
+    sep, decimal = detectar_formato(amostra)
+    relatorio.update(sep=sep, decimal=decimal, tipos='compactos')
+
+    emitidos = 0
+    try:
+        for bloco in _ler_blocos(abrir, sep, decimal, DTYPES, relatorio):
+            emitidos += 1
+            relatorio['linhas'] += len(bloco)
+            yield bloco
+        return
+    except (ValueError, TypeError):
+        pass
+
+    # Valores fora do tipo esperado (ex.: REG_ANS vazio): relê como texto,
+    # pulando os blocos já entregues
+    relatorio.update(linhas_ignoradas=[], tipos='texto')
+    dtype_texto = {c: ('category' if t == 'category' else object)
+                   for c, t in DTYPES.items()}
+    for i, bloco in enumerate(_ler_blocos(abrir, sep, decimal, dtype_texto, relatorio)):
+        if i >= emitidos:
+            relatorio['linhas'] += len(bloco)
+            yield bloco
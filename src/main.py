@@ -1,108 +1,380 @@
 import os
-import requests
+import argparse
+import multiprocessing
 import zipfile
+from concurrent.futures import ProcessPoolExecutor
 import pandas as pd
-from bs4 import BeautifulSoup
-from urllib.parse import urljoin
-import io
 import re
+import time
 import src.utils as utils
+import src.download as download
+import src.incremental as incremental
+import src.leitor_csv as leitor_csv
+import src.armazenamento as armazenamento
+import src.perfil as perfil
 
 # Configurações de Caminho
-BASE_URL = "https://dadosabertos.ans.gov.br/FTP/PDA/demonstracoes_contabeis/"
-OUTPUT_CSV = "data/consolidado_despesas.csv"
-TRIMESTRES_ALVO = 3
+# ANS_BASE_URL permite apontar o crawler para um espelho local do FTP da ANS
+BASE_URL = os.environ.get(
+    "ANS_BASE_URL", "https://dadosabertos.ans.gov.br/FTP/PDA/demonstracoes_contabeis/")
+BASE_CONSOLIDADO = "data/consolidado_despesas"  # .csv ou .parquet (ANS_FORMATO)
+OUTPUT_CONSOLIDADO = armazenamento.caminho(BASE_CONSOLIDADO)
+MANIFESTO = "data/manifest.json"  # ZIPs já ingeridos (nome, URL e checksum)
+ESTATISTICAS_CSV = "data/estatisticas_operadoras.csv"  # n, soma e soma dos quadrados por operadora
+# Trimestres mais recentes processados (ex.: ANS_TRIMESTRES=40 para reprocessar o histórico)
+TRIMESTRES_ALVO = int(os.environ.get("ANS_TRIMESTRES", 3))
+MAX_WORKERS = download.MAX_WORKERS
+# Processos que leem e tratam os CSVs dos ZIPs em paralelo; 1 processa tudo no próprio processo
+WORKERS_PROCESSAMENTO = int(os.environ.get(
+    "ANS_WORKERS_PROCESSAMENTO", min(MAX_WORKERS, os.cpu_count() or 1)))
+COLUNAS = ['CNPJ', 'RegistroANS', 'RazaoSocial',
+           'Trimestre', 'Ano', 'ValorDespesas', 'VL_SALDO_INICIAL']
+# Agregação das linhas de mesma chave; também mescla somas parciais (first e sum são associativas)
+AGREGACOES = {
+    'CNPJ': 'first',  # Mantém o primeiro CNPJ
+    'RazaoSocial': 'first',  # Mantém a Razão Social mais recente
+    'ValorDespesas': 'sum',  # Soma as despesas para registros duplicados
+    'VL_SALDO_INICIAL': 'sum'  # Soma os saldos iniciais
+}
 
 
-def get_last_3_quarters():
-    headers = {'User-Agent': 'Mozilla/5.0'}
-    all_quarter_links = []
+def get_last_3_quarters(session=None):
     try:
-        res_anos = requests.get(BASE_URL, headers=headers, timeout=15)
-        soup_anos = BeautifulSoup(res_anos.text, 'html.parser')
-        anos = sorted([a['href'] for a in soup_anos.find_all(
-            'a') if re.match(r'20\d{2}/?', a['href'])], reverse=True)
-
-        for ano in anos:
-            url_ano = urljoin(BASE_URL, ano)
-            res_q = requests.get(url_ano, headers=headers, timeout=15)
-            soup_q = BeautifulSoup(res_q.text, 'html.parser')
-            zips = [urljoin(url_ano, a['href']) for a in soup_q.find_all(
-                'a') if a['href'].lower().endswith('.zip')]
-            zips.sort(reverse=True)
-            for z in zips:
-                all_quarter_links.append(z)
-                if len(all_quarter_links) == TRIMESTRES_ALVO:
-                    return all_quarter_links
+        return download.get_last_quarters(
+            BASE_URL, TRIMESTRES_ALVO, session=session, max_workers=MAX_WORKERS)
     except Exception as e:
         print(f"Erro ao buscar diretórios: {e}")
-    return all_quarter_links
+    return []
 
 
-def download_and_process():
-    targets = get_last_3_quarters()
+def blocos_membro(z, file_name, zip_name, medidas=None):
+    """Gera os blocos normalizados e limpos de um CSV (`file_name`) do ZIP aberto `z`.
+
+    `medidas` (dict), se informado, acumula o tempo de leitura e de tratamento
+    e as linhas lidas e mantidas.
+    """
+    print(f"📄 Processando arquivo: {file_name}")
+    medidas = medidas if medidas is not None else {}
+    for chave in ('leitura_s', 'tratamento_s', 'linhas_lidas', 'linhas_tratadas'):
+        medidas.setdefault(chave, 0)
+    relatorio = {}
+    # Leitura em blocos: cada bloco é tratado e reduzido antes do próximo
+    blocos = leitor_csv.ler_csv(lambda: z.open(file_name), relatorio)
+    while True:
+        inicio = time.perf_counter()
+        df = next(blocos, None)
+        medidas['leitura_s'] += time.perf_counter() - inicio
+        if df is None:
+            break
+        inicio = time.perf_counter()
+        medidas['linhas_lidas'] += len(df)
+
+        # Normaliza as colunas do DataFrame
+        df = utils.normalizar_colunas(df)
+
+        # Aplica as inconsistências
+        df = utils.tratar_inconsistencias(df)
+
+        # Adiciona as colunas Trimestre e Ano
+        df['Trimestre'] = re.findall(r'(\dT)', zip_name)[
+            0] if re.search(r'\dT', zip_name) else "N/A"
+        df['Ano'] = re.findall(r'(20\d{2})', zip_name)[
+            0] if re.search(r'20\d{2}', zip_name) else "N/A"
+
+        # Exclui as linhas onde ambas as colunas de valor são zero
+        df = df[~((df['VL_SALDO_INICIAL'] == 0)
+                  & (df['ValorDespesas'] == 0))]
+
+        medidas['tratamento_s'] += time.perf_counter() - inicio
+        medidas['linhas_tratadas'] += len(df)
+        yield df
+
+    ignoradas = relatorio['linhas_ignoradas']
+    if ignoradas:
+        print(f"⚠️ {len(ignoradas)} linha(s) malformada(s) ignorada(s) em {file_name}: "
+              f"{ignoradas[:10]}{' ...' if len(ignoradas) > 10 else ''}")
+
+
+def _para_arrow(df):
+    """DataFrame -> buffer IPC do Arrow: colunas contíguas, sem serializar objeto a objeto."""
+    import pyarrow as pa
+
+    tabela = pa.Table.from_pandas(df, preserve_index=False)
+    destino = pa.BufferOutputStream()
+    with pa.ipc.new_stream(destino, tabela.schema) as escritor:
+        escritor.write_table(tabela)
+    return destino.getvalue()
+
+
+def _de_arrow(buffer):
+    import pyarrow as pa
+
+    return pa.ipc.open_stream(buffer).read_all().to_pandas()
+
+
+def processar_membro(zip_path, zip_name, file_name, streaming=False):
+    """Lê e trata um CSV do ZIP (executado nos workers).
+
+    Devolve (medidas, buffer): as medidas de blocos_membro e as linhas
+    tratadas, ou as somas parciais por chave no modo streaming, como buffer
+    Arrow (None se o arquivo não tiver linhas).
+    """
+    medidas = {}
+    with zipfile.ZipFile(zip_path) as z:
+        blocos = blocos_membro(z, file_name, zip_name, medidas)
+        if streaming:
+            df = consolidar_blocos(blocos)
+        else:
+            dados = list(blocos)
+            df = pd.concat(dados, ignore_index=True) if dados else None
+    return medidas, None if df is None else _para_arrow(df)
+
+
+class _Adiado:
+    """Resultado calculado só quando pedido (mesma interface de um Future)."""
+
+    def __init__(self, funcao, args):
+        self.funcao, self.args = funcao, args
+
+    def result(self):
+        return self.funcao(*self.args)
+
+
+class _ExecutorLocal:
+    """Substitui o pool com um só worker: processa no próprio processo, na ordem de consumo."""
+
+    def submit(self, funcao, *args):
+        return _Adiado(funcao, args)
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        return False
+
+
+def criar_executor(workers=WORKERS_PROCESSAMENTO):
+    if workers <= 1:
+        return _ExecutorLocal()
+    # spawn: os workers não herdam as threads e as conexões dos downloads
+    return ProcessPoolExecutor(max_workers=workers, mp_context=multiprocessing.get_context("spawn"))
+
+
+def submeter_zip(executor, zip_path, zip_name, streaming=False):
+    """Agenda cada CSV do ZIP no executor; os futuros ficam na ordem dos arquivos."""
+    with zipfile.ZipFile(zip_path) as z:
+        print(f"Arquivos no ZIP: {z.namelist()}")
+        membros = [nome for nome in z.namelist() if nome.lower().endswith('.csv')]
+    return [executor.submit(processar_membro, zip_path, zip_name, nome, streaming)
+            for nome in membros]
+
+
+def juntar_membros(futuros, streaming=False, medidas=None):
+    """Resultado do ZIP, montado sempre na ordem dos arquivos (independe do número de workers).
+
+    `medidas` (dict), se informado, acumula as medidas dos arquivos.
+    """
+    partes = []
+    for futuro in futuros:
+        medidas_membro, buffer = futuro.result()
+        if medidas is not None:
+            for chave, valor in medidas_membro.items():
+                medidas[chave] = medidas.get(chave, 0) + valor
+        if buffer is not None:
+            partes.append(_de_arrow(buffer))
+    if not partes:
+        return None
+    if streaming:
+        return consolidar_blocos(partes)
+    return pd.concat(partes, ignore_index=True)
+
+
+def processar_zip(zip_path, zip_name, streaming=False, executor=None):
+    """Lê, normaliza e limpa todos os CSVs de um ZIP trimestral.
+
+    No modo streaming devolve as somas parciais por chave em vez das linhas.
+    """
+    executor = executor or _ExecutorLocal()
+    return juntar_membros(submeter_zip(executor, zip_path, zip_name, streaming), streaming)
+
+
+def _agrupar(df):
+    """Agrupa por (RegistroANS, Trimestre, Ano) só as colunas presentes em `df`."""
+    return df.groupby(['RegistroANS', 'Trimestre', 'Ano'], as_index=False).agg(
+        {col: func for col, func in AGREGACOES.items() if col in df.columns})
+
+
+def mesclar_parcial(parcial, df):
+    """Soma as linhas de `df` às somas parciais por chave (`parcial`, None no início).
+
+    Colunas ausentes não são preenchidas aqui: ficam nulas e o 'first' pega o
+    valor de outro bloco, como aconteceria com todas as linhas concatenadas.
+    """
+    agrupado = _agrupar(df)
+    if parcial is None:
+        return agrupado
+    return _agrupar(pd.concat([parcial, agrupado], ignore_index=True))
+
+
+def consolidar_blocos(blocos, parcial=None):
+    """Consolida os blocos um a um, sem manter as linhas brutas em memória.
+
+    O resultado é o mesmo de consolidar(pd.concat(blocos)), a menos do
+    arredondamento das somas; None se não houver blocos.
+    """
+    for df in blocos:
+        parcial = mesclar_parcial(parcial, df)
+    return parcial
+
+
+def consolidar(df):
+    """Agrupa as linhas por (RegistroANS, Trimestre, Ano) no layout do consolidado."""
+    # Garantir que as colunas estejam no formato correto
+    for col in COLUNAS:
+        if col not in df.columns:
+            df[col] = ""
+
+    # Eliminar duplicidades com base nas colunas 'RegistroANS', 'Trimestre', 'Ano', e 'ValorDespesas'
+    # Caso existam duplicatas, mantém a primeira ocorrência e soma os valores das despesas
+    df = _agrupar(df)
+    return df[COLUNAS]
+
+
+def listar_trimestres(session):
+    """URLs dos ZIPs trimestrais mais recentes (etapa crawl)."""
+    with perfil.etapa('crawl') as e:
+        targets = get_last_3_quarters(session)
+        e.linhas_saida = len(targets)
+    return targets
+
+
+def baixar_trimestres(targets, session):
+    """Baixa os ZIPs pelo cache: [(url, caminho, modificado, erro)], na ordem de `targets`."""
+    # Downloads em paralelo, gravados em disco por streaming através do cache;
+    # o processamento abre um ZIP de cada vez a partir do disco
+    with perfil.etapa('download') as e:
+        baixados = download.baixar_trimestres(
+            targets, session=session, max_workers=MAX_WORKERS)
+        e.detalhes['zips_modificados'] = sum(1 for _, _, modificado, _ in baixados if modificado)
+        e.detalhes['erros'] = sum(1 for *_, erro in baixados if erro is not None)
+    return baixados
+
+
+def consolidar_trimestres(baixados, modo_incremental=False, modo_streaming=False, reaproveitar=True):
+    """Lê, trata e consolida os ZIPs baixados, gravando o consolidado e as estatísticas.
+
+    Com `reaproveitar`, não faz nada se nenhum ZIP mudou desde a última
+    execução. Retorna os nomes dos ZIPs que falharam (os demais seguem).
+    """
+    manifesto = incremental.carregar_manifesto(MANIFESTO)
+    if modo_incremental and not (os.path.exists(OUTPUT_CONSOLIDADO) and os.path.exists(ESTATISTICAS_CSV)):
+        print("ℹ️ Sem consolidado/estatísticas anteriores: executando carga completa.")
+        modo_incremental = False
+
+    # Nada mudou desde a última execução: o consolidado atual continua válido
+    urls_ingeridas = {z['url'] for z in manifesto['zips'].values()}
+    if (reaproveitar and not modo_incremental and os.path.exists(OUTPUT_CONSOLIDADO)
+            and not any(modificado for _, _, modificado, _ in baixados)
+            and urls_ingeridas == {url for url, *_ in baixados}):
+        print(f"✅ Nenhum trimestre alterado; '{OUTPUT_CONSOLIDADO}' já está atualizado.")
+        return []
+
+    if modo_incremental:
+        estatisticas = incremental.carregar_estatisticas(ESTATISTICAS_CSV)
+    else:
+        manifesto = {'zips': {}}
+        consolidated_data = []
+
+    falhas = []
+    # Tempo de leitura e de tratamento somado em todos os arquivos (e workers)
+    medidas = {}
+    with perfil.etapa('processamento') as etapa_processamento, criar_executor() as executor:
+        etapa_processamento.detalhes = medidas
+        # Agenda os CSVs de todos os ZIPs de uma vez: os workers não esperam o ZIP anterior terminar
+        agendados = []
+        for zip_url, zip_path, _, erro in baixados:
+            zip_name = zip_url.split('/')[-1]
+            try:
+                if erro is not None:
+                    raise erro
+                checksum = incremental.checksum_arquivo(zip_path)
+                if modo_incremental and incremental.ja_ingerido(manifesto, zip_name, checksum):
+                    print(f"⏭️ {zip_name} já ingerido; ignorando.")
+                    continue
+
+                print(f"📦 Processando: {zip_name}")
+                # No modo streaming cada CSV volta como somas parciais por chave
+                futuros = submeter_zip(executor, zip_path, zip_name, modo_streaming)
+                agendados.append((zip_url, zip_name, checksum, futuros))
+            except Exception as e:
+                print(f"⚠️ Erro no ZIP {zip_name}: {e}")
+                falhas.append(zip_name)
+
+        # Resultados na ordem dos ZIPs (e dos arquivos dentro de cada um)
+        for zip_url, zip_name, checksum, futuros in agendados:
+            try:
+                df = juntar_membros(futuros, modo_streaming, medidas)
+                if df is None:
+                    continue
+
+                if modo_incremental:
+                    # Upsert apenas do trimestre novo e atualização das somas acumuladas
+                    novos = consolidar(df)
+                    removidos = armazenamento.upsert_periodo(
+                        BASE_CONSOLIDADO, novos, incremental.CHAVE)
+                    estatisticas = incremental.atualizar_estatisticas(
+                        estatisticas, novos, removidos)
+                else:
+                    consolidated_data.append(df)
+
+                incremental.registrar_zip(
+                    manifesto, zip_name, zip_url, checksum,
+                    df['Trimestre'].iloc[0], df['Ano'].iloc[0])
+            except Exception as e:
+                print(f"⚠️ Erro no ZIP {zip_name}: {e}")
+                falhas.append(zip_name)
+        etapa_processamento.linhas_entrada = medidas.get('linhas_lidas')
+        etapa_processamento.linhas_saida = medidas.get('linhas_tratadas')
+
+    if modo_incremental:
+        with perfil.etapa('gravacao', linhas_entrada=len(estatisticas)):
+            estatisticas.to_csv(ESTATISTICAS_CSV, index=False, encoding='utf-8')
+            incremental.salvar_manifesto(MANIFESTO, manifesto)
+        print(f"✨ SUCESSO! '{OUTPUT_CONSOLIDADO}' atualizado.")
+    elif consolidated_data:
+        # No modo streaming os itens já são as somas parciais de cada ZIP
+        with perfil.etapa('consolidacao') as e:
+            final_df = pd.concat(consolidated_data, ignore_index=True)
+            e.linhas_entrada = len(final_df)
+            final_df = consolidar(final_df)
+            e.linhas_saida = len(final_df)
+
+        # Salvamento do consolidado (CSV ou parquet particionado por Ano/Trimestre)
+        with perfil.etapa('gravacao', linhas_entrada=len(final_df)):
+            armazenamento.salvar(final_df, BASE_CONSOLIDADO, particionar=True)
+            incremental.calcular_estatisticas(final_df).to_csv(
+                ESTATISTICAS_CSV, index=False, encoding='utf-8')
+            incremental.salvar_manifesto(MANIFESTO, manifesto)
+        print(f"✨ SUCESSO! '{OUTPUT_CONSOLIDADO}' gerado.")
+    return falhas
+
+
+def download_and_process(modo_incremental=False, modo_streaming=False):
+    session = download.criar_sessao(MAX_WORKERS)
+    targets = listar_trimestres(session)
     if not targets:
         return
-
-    consolidated_data = []
-    for zip_url in targets:
-        zip_name = zip_url.split('/')[-1]
-        print(f"📦 Processando: {zip_name}")
-        try:
-            r = requests.get(zip_url, timeout=120)
-            with zipfile.ZipFile(io.BytesIO(r.content)) as z:
-                print(f"Arquivos no ZIP: {z.namelist()}")
-                for file_name in z.namelist():
-                    print(f"📄 Processando arquivo: {file_name}")
-                    if file_name.lower().endswith('.csv'):
-                        with z.open(file_name) as f:
-                            df = pd.read_csv(
-                                f, sep=None, engine='python', encoding='latin1', on_bad_lines='skip')
-
-                            # Normaliza as colunas do DataFrame
-                            df = utils.normalizar_colunas(df)
-
-                            # Aplica as inconsistências
-                            df = utils.tratar_inconsistencias(df)
-
-                            # Adiciona as colunas Trimestre e Ano
-                            df['Trimestre'] = re.findall(r'(\dT)', zip_name)[
-                                0] if re.search(r'\dT', zip_name) else "N/A"
-                            df['Ano'] = re.findall(r'(20\d{2})', zip_name)[
-                                0] if re.search(r'20\d{2}', zip_name) else "N/A"
-
-                            # Exclui as linhas onde ambas as colunas de valor são zero
-                            df = df[~((df['VL_SALDO_INICIAL'] == 0)
-                                      & (df['ValorDespesas'] == 0))]
-
-                            consolidated_data.append(df)
-        except Exception as e:
-            print(f"⚠️ Erro no ZIP {zip_name}: {e}")
-
-    if consolidated_data:
-        final_df = pd.concat(consolidated_data, ignore_index=True)
-
-        # Garantir que as colunas estejam no formato correto
-        colunas = ['CNPJ', 'RegistroANS', 'RazaoSocial',
-                   'Trimestre', 'Ano', 'ValorDespesas', 'VL_SALDO_INICIAL']
-
-        for col in colunas:
-            if col not in final_df.columns:
-                final_df[col] = ""
-
-        # Eliminar duplicidades com base nas colunas 'RegistroANS', 'Trimestre', 'Ano', e 'ValorDespesas'
-        # Caso existam duplicatas, mantém a primeira ocorrência e soma os valores das despesas
-        final_df = final_df.groupby(['RegistroANS', 'Trimestre', 'Ano'], as_index=False).agg({
-            'CNPJ': 'first',  # Mantém o primeiro CNPJ
-            'RazaoSocial': 'first',  # Mantém a Razão Social mais recente
-            'ValorDespesas': 'sum',  # Soma as despesas para registros duplicados
-            'VL_SALDO_INICIAL': 'sum'  # Soma os saldos iniciais
-        })
-
-        # Salvamento no CSV de saída
-        final_df[colunas].to_csv(OUTPUT_CSV, index=False, encoding='utf-8')
-        print(f"✨ SUCESSO! '{OUTPUT_CSV}' gerado.")
+    baixados = baixar_trimestres(targets, session)
+    consolidar_trimestres(baixados, modo_incremental, modo_streaming)
 
 
 if __name__ == "__main__":
-    download_and_process()
+    parser = argparse.ArgumentParser(
+        description="Download e consolidação das demonstrações contábeis da ANS.")
+    parser.add_argument("--incremental", action="store_true",
+                        help="processa apenas os ZIPs ainda não ingeridos (ver data/manifest.json)")
+    parser.add_argument("--streaming", action="store_true",
+                        help="consolida cada bloco de linhas ao ser lido, sem juntar os ZIPs inteiros em memória")
+    args = parser.parse_args()
+    with perfil.execucao('main'):
+        download_and_process(modo_incremental=args.incremental, modo_streaming=args.streaming)
@@ -0,0 +1,388 @@
+# src/pacote.py
+"""Empacotamento do ZIP final: membros gerados em fluxo e comprimidos em paralelo.
+
+Cada membro é uma sequência de blocos de bytes (ex.: o CSV de um arquivo do
+pipeline, lote a lote), escrita direto no ZIP, sem arquivo intermediário.
+No deflate, os blocos são comprimidos em threads como no pigz: cada um usa
+os 32 KiB anteriores como dicionário e termina alinhado em byte
+(Z_SYNC_FLUSH), então a concatenação é um único fluxo deflate válido. O
+zlib libera o GIL enquanto comprime, e as threads ocupam os núcleos.
+
+Ao lado do ZIP fica um manifesto JSON com o SHA-256 de cada membro (do
+conteúdo descomprimido) e das origens dele. Na execução seguinte, os
+membros cujas origens têm o mesmo conteúdo são copiados já comprimidos do
+ZIP anterior, sem gerar nem comprimir de novo.
+"""
+import contextlib
+import hashlib
+import json
+import os
+import struct
+import time
+import zlib
+from collections import deque, namedtuple
+from concurrent.futures import ThreadPoolExecutor
+
+try:  # opcional: sem ele (e sem o compression.zstd do Python 3.14) só deflate/stored
+    import zstandard
+except ImportError:
+    zstandard = None
+
+try:
+    from compression import zstd as zstd_stdlib
+except ImportError:
+    zstd_stdlib = None
+
+# Método de compressão dos membros: 'deflate' (padrão), 'zstd' ou 'stored'
+METODO = os.environ.get('ANS_ZIP_METODO', 'deflate').lower()
+NIVEL = int(os.environ.get('ANS_ZIP_NIVEL', 6))
+THREADS = int(os.environ.get('ANS_ZIP_THREADS', os.cpu_count() or 1))
+# Bloco comprimido por thread (no mínimo 64 KiB, para o dicionário de 32 KiB caber)
+BLOCO = max(int(os.environ.get('ANS_ZIP_BLOCO', 1024 * 1024)), 64 * 1024)
+# ZIP64: 'auto' para membros grandes (os de tamanho desconhecido decidem ao final), '1' sempre, '0' nunca
+ZIP64 = os.environ.get('ANS_ZIP64', 'auto').lower()
+
+# nome no ZIP, arquivos de origem (para o reaproveitamento), função que gera os
+# blocos de bytes e tamanho esperado (ou None, se desconhecido)
+Membro = namedtuple('Membro', ['nome', 'origens', 'blocos', 'tamanho'])
+
+CODIGOS = {'stored': 0, 'deflate': 8, 'zstd': 93}
+VERSOES = {'stored': 20, 'deflate': 20, 'zstd': 63}
+LIMITE_32 = 0xFFFFFFFF
+DICIONARIO = 32 * 1024
+# Fim do fluxo deflate: bloco final vazio (os blocos terminam com Z_SYNC_FLUSH)
+FIM_DEFLATE = b'\x03\x00'
+# Extra de preenchimento (o de alinhamento do zipalign, ignorado pelos leitores):
+# reserva no cabeçalho local o espaço do extra ZIP64 de membros de tamanho
+# desconhecido, que vira ZIP64 só se o membro passar de 4 GiB
+EXTRA_RESERVA = 0xD935
+
+
+def caminho_manifesto(destino):
+    return os.path.splitext(destino)[0] + '.manifest.json'
+
+
+def sha256_arquivo(caminho, chunk_size=1024 * 1024):
+    h = hashlib.sha256()
+    with open(caminho, 'rb') as f:
+        for bloco in iter(lambda: f.read(chunk_size), b''):
+            h.update(bloco)
+    return h.hexdigest()
+
+
+def hash_origens(caminhos, conhecidas):
+    """SHA-256 do conteúdo de `caminhos` e o estado de cada arquivo ({caminho: {...}}).
+
+    Arquivos com o mesmo tamanho e mtime de `conhecidas` (do manifesto
+    anterior) não são relidos.
+    """
+    h = hashlib.sha256()
+    estados = {}
+    for caminho in caminhos:
+        info = os.stat(caminho)
+        anterior = conhecidas.get(caminho, {})
+        if anterior.get('tamanho') == info.st_size and anterior.get('mtime_ns') == info.st_mtime_ns:
+            digest = anterior['sha256']
+        else:
+            digest = sha256_arquivo(caminho)
+        estados[caminho] = {'tamanho': info.st_size, 'mtime_ns': info.st_mtime_ns, 'sha256': digest}
+        h.update(f"{os.path.basename(caminho)}:{digest}\n".encode())
+    return h.hexdigest(), estados
+
+
+def _reblocar(blocos, tamanho):
+    """Os bytes de `blocos` reagrupados em blocos de `tamanho` (o último pode ser menor)."""
+    pendente = bytearray()
+    for bloco in blocos:
+        pendente += bloco
+        while len(pendente) >= tamanho:
+            yield bytes(pendente[:tamanho])
+            del pendente[:tamanho]
+    if pendente:
+        yield bytes(pendente)
+
+
+def _deflate_bloco(bloco, dicionario, nivel):
+    if dicionario:
+        compressor = zlib.compressobj(nivel, zlib.DEFLATED, -15, zdict=dicionario)
+    else:
+        compressor = zlib.compressobj(nivel, zlib.DEFLATED, -15)
+    return compressor.compress(bloco) + compressor.flush(zlib.Z_SYNC_FLUSH)
+
+
+def _compressor_zstd(nivel, threads):
+    """Compressor zstd com threads próprias (um único frame), do zstandard ou do stdlib."""
+    if zstandard is not None:
+        return zstandard.ZstdCompressor(level=nivel, threads=threads if threads > 1 else 0).compressobj()
+    opcoes = {zstd_stdlib.CompressionParameter.nb_workers: threads} if threads > 1 else None
+    return zstd_stdlib.ZstdCompressor(level=nivel, options=opcoes)
+
+
+def metodo_disponivel(metodo):
+    if metodo not in CODIGOS:
+        raise ValueError(f"método de compressão inválido: {metodo!r}; use {', '.join(CODIGOS)}")
+    if metodo == 'zstd' and zstandard is None and zstd_stdlib is None:
+        print("⚠️ zstd indisponível (instale o pacote zstandard); usando deflate.")
+        return 'deflate'
+    return metodo
+
+
+def _data_hora_dos(instante):
+    t = time.localtime(instante)
+    return ((t.tm_year - 1980) << 9 | t.tm_mon << 5 | t.tm_mday,
+            t.tm_hour << 11 | t.tm_min << 5 | t.tm_sec // 2)
+
+
+class _EscritorZip:
+    """Escrita sequencial de um ZIP num arquivo com seek.
+
+    O cabeçalho local é gravado antes dos dados e corrigido depois (CRC e
+    tamanhos), como faz o zipfile em arquivos com seek; o diretório central
+    vai no final.
+    """
+
+    def __init__(self, arquivo, pool, metodo, nivel, zip64):
+        self.arquivo = arquivo
+        self.pool = pool
+        self.metodo = metodo
+        self.nivel = nivel
+        self.zip64 = zip64
+        self.entradas = []
+        self.data, self.hora = _data_hora_dos(time.time())
+
+    def _usar_zip64(self, tamanho):
+        """True/False se já se sabe se o membro usa ZIP64; None se só ao final dele."""
+        if self.zip64 in ('0', '1'):
+            return self.zip64 == '1'
+        if tamanho is None:
+            return None
+        return tamanho >= LIMITE_32 // 2
+
+    def _escrever_dados(self, blocos, threads):
+        """Comprime e grava os blocos; retorna (crc, tamanho, comprimido, sha256)."""
+        crc, tamanho, comprimido = 0, 0, 0
+        h = hashlib.sha256()
+
+        def gravar(dados):
+            nonlocal comprimido
+            self.arquivo.write(dados)
+            comprimido += len(dados)
+
+        if self.metodo == 'deflate':
+            pendentes = deque()
+            anterior = b''
+            for bloco in _reblocar(blocos, BLOCO):
+                if self.pool is None:
+                    gravar(_deflate_bloco(bloco, anterior[-DICIONARIO:], self.nivel))
+                else:
+                    pendentes.append(self.pool.submit(
+                        _deflate_bloco, bloco, anterior[-DICIONARIO:], self.nivel))
+                # CRC e hash aqui enquanto as threads comprimem
+                crc = zlib.crc32(bloco, crc)
+                h.update(bloco)
+                tamanho += len(bloco)
+                anterior = bloco
+                # Janela limitada: a memória não cresce com o tamanho do membro
+                while len(pendentes) > 2 * threads:
+                    gravar(pendentes.popleft().result())
+            while pendentes:
+                gravar(pendentes.popleft().result())
+            gravar(FIM_DEFLATE)
+        else:
+            compressor = _compressor_zstd(self.nivel, threads) if self.metodo == 'zstd' else None
+            for bloco in _reblocar(blocos, BLOCO):
+                crc = zlib.crc32(bloco, crc)
+                h.update(bloco)
+                tamanho += len(bloco)
+                gravar(compressor.compress(bloco) if compressor else bloco)
+            if compressor:
+                gravar(compressor.flush())
+        return crc, tamanho, comprimido, h.hexdigest()
+
+    def adicionar(self, membro, threads):
+        """Grava `membro` comprimido; retorna a entrada do manifesto (sem a origem)."""
+        nome = membro.nome.encode('utf-8')
+        flags = 0 if membro.nome.isascii() else 0x800
+        zip64 = self._usar_zip64(membro.tamanho)
+        versao = max(VERSOES[self.metodo], 45 if zip64 else 0)
+        extra = b''
+        if zip64 is not False:
+            extra = struct.pack('<HHQQ', 1 if zip64 else EXTRA_RESERVA, 16, 0, 0)
+
+        deslocamento = self.arquivo.tell()
+        self.arquivo.write(struct.pack(
+            '<IHHHHHIIIHH', 0x04034b50, versao, flags, CODIGOS[self.metodo], self.hora,
+            self.data, 0, 0, 0, len(nome), len(extra)) + nome + extra)
+        cabecalho = self.arquivo.tell() - deslocamento
+
+        crc, tamanho, comprimido, sha256 = self._escrever_dados(membro.blocos(), threads)
+        if zip64 is None:
+            # Tamanho desconhecido: o espaço reservado vira o extra ZIP64 se preciso
+            zip64 = max(tamanho, comprimido) >= LIMITE_32
+            versao = max(VERSOES[self.metodo], 45 if zip64 else 0)
+        elif not zip64 and max(tamanho, comprimido) >= LIMITE_32:
+            raise RuntimeError(f"{membro.nome} passou de 4 GiB; use ANS_ZIP64=1 ou auto")
+
+        fim = self.arquivo.tell()
+        self.arquivo.seek(deslocamento + 4)
+        self.arquivo.write(struct.pack('<H', versao))
+        self.arquivo.seek(deslocamento + 14)
+        if zip64:
+            self.arquivo.write(struct.pack('<III', crc, LIMITE_32, LIMITE_32))
+            self.arquivo.seek(deslocamento + 30 + len(nome))
+            self.arquivo.write(struct.pack('<HHQQ', 1, 16, tamanho, comprimido))
+        else:
+            self.arquivo.write(struct.pack('<III', crc, comprimido, tamanho))
+        self.arquivo.seek(fim)
+
+        entrada = {
+            'nome': membro.nome, 'sha256': sha256, 'tamanho': tamanho, 'comprimido': comprimido,
+            'crc32': crc, 'metodo': self.metodo, 'nivel': self.nivel, 'zip64': zip64,
+            'versao': versao, 'flags': flags, 'data_hora': [self.data, self.hora],
+            'cabecalho': cabecalho,
+        }
+        self._registrar(entrada, deslocamento)
+        return entrada
+
+    def copiar(self, origem, entrada):
+        """Copia um membro já comprimido (cabeçalho local + dados) de outro ZIP."""
+        deslocamento = self.arquivo.tell()
+        origem.seek(entrada['deslocamento'])
+        restante = entrada['cabecalho'] + entrada['comprimido']
+        while restante:
+            bloco = origem.read(min(restante, 1024 * 1024))
+            if not bloco:
+                raise ValueError(f"ZIP anterior truncado em {entrada['nome']}")
+            self.arquivo.write(bloco)
+            restante -= len(bloco)
+        entrada = dict(entrada)
+        self._registrar(entrada, deslocamento)
+        return entrada
+
+    def _registrar(self, entrada, deslocamento):
+        entrada['deslocamento'] = deslocamento
+        self.entradas.append(entrada)
+
+    def fechar(self):
+        """Grava o diretório central (com os registros ZIP64 quando necessários)."""
+        inicio = self.arquivo.tell()
+        for e in self.entradas:
+            nome = e['nome'].encode('utf-8')
+            valores = []
+            tamanho, comprimido, deslocamento = e['tamanho'], e['comprimido'], e['deslocamento']
+            # No diretório central o extra ZIP64 leva só os campos que estouram 32 bits
+            if e['zip64'] or tamanho >= LIMITE_32:
+                valores.append(tamanho)
+                tamanho = LIMITE_32
+            if e['zip64'] or comprimido >= LIMITE_32:
+                valores.append(comprimido)
+                comprimido = LIMITE_32
+            if deslocamento >= LIMITE_32:
+                valores.append(deslocamento)
+                deslocamento = LIMITE_32
+            extra = struct.pack(f'<HH{len(valores)}Q', 1, 8 * len(valores), *valores) if valores else b''
+            versao = max(e['versao'], 45 if valores else 0)
+            data, hora = e['data_hora']
+            self.arquivo.write(struct.pack(
+                '<IHHHHHHIIIHHHHHII', 0x02014b50, (3 << 8) | versao, versao, e['flags'],
+                CODIGOS[e['metodo']], hora, data, e['crc32'], comprimido, tamanho,
+                len(nome), len(extra), 0, 0, 0, 0o100644 << 16, deslocamento) + nome + extra)
+        fim = self.arquivo.tell()
+
+        entradas, tamanho_central = len(self.entradas), fim - inicio
+        if entradas >= 0xFFFF or tamanho_central >= LIMITE_32 or inicio >= LIMITE_32:
+            self.arquivo.write(struct.pack(
+                '<IQHHIIQQQQ', 0x06064b50, 44, 45, 45, 0, 0, entradas, entradas,
+                tamanho_central, inicio))
+            self.arquivo.write(struct.pack('<IIQI', 0x07064b50, 0, fim, 1))
+            entradas, tamanho_central, inicio = 0xFFFF, LIMITE_32, LIMITE_32
+        self.arquivo.write(struct.pack(
+            '<IHHHHIIH', 0x06054b50, 0, 0, entradas, entradas, tamanho_central, inicio, 0))
+
+
+def carregar_manifesto(caminho):
+    if not os.path.exists(caminho):
+        return {'membros': [], 'origens': {}}
+    with open(caminho, encoding='utf-8') as f:
+        return json.load(f)
+
+
+def salvar_manifesto(caminho, manifesto):
+    with open(caminho + '.tmp', 'w', encoding='utf-8') as f:
+        json.dump(manifesto, f, indent=2, ensure_ascii=False)
+    os.replace(caminho + '.tmp', caminho)
+
+
+def _zip_confere(destino, manifesto):
+    """O ZIP em disco é o descrito pelo manifesto (mesmo tamanho e mtime)?"""
+    try:
+        info = os.stat(destino)
+    except FileNotFoundError:
+        return False
+    return manifesto.get('tamanho') == info.st_size and manifesto.get('mtime_ns') == info.st_mtime_ns
+
+
+def empacotar(destino, membros, metodo=METODO, nivel=NIVEL, threads=THREADS, zip64=ZIP64):
+    """Gera o ZIP `destino` com `membros` e grava o manifesto ao lado.
+
+    Membros com as mesmas origens, método e nível do ZIP anterior são
+    copiados dele sem recompressão; se todos forem iguais, o ZIP fica como
+    está. Retorna o manifesto, com a lista dos membros reaproveitados.
+    """
+    metodo = metodo_disponivel(metodo)
+    arquivo_manifesto = caminho_manifesto(destino)
+    anterior = carregar_manifesto(arquivo_manifesto)
+    zip_anterior = destino if _zip_confere(destino, anterior) else None
+    anteriores = {m['nome']: m for m in anterior['membros']} if zip_anterior else {}
+
+    origens, hashes = {}, {}
+    for membro in membros:
+        hashes[membro.nome], estados = hash_origens(membro.origens, anterior.get('origens', {}))
+        origens.update(estados)
+
+    def reaproveitavel(membro):
+        m = anteriores.get(membro.nome)
+        return (m is not None and m['origem'] == hashes[membro.nome]
+                and m['metodo'] == metodo and m['nivel'] == nivel)
+
+    reaproveitados = [m.nome for m in membros if reaproveitavel(m)]
+    if zip_anterior and reaproveitados == [m['nome'] for m in anterior['membros']] == [
+            m.nome for m in membros]:
+        # ZIP inalterado; só o estado das origens (ex.: mtime de um arquivo regravado) muda
+        anterior['origens'] = origens
+        salvar_manifesto(arquivo_manifesto, anterior)
+        anterior['reaproveitados'] = reaproveitados
+        return anterior
+
+    temporario = f"{destino}.tmp{os.getpid()}"
+    pool = ThreadPoolExecutor(max_workers=threads, thread_name_prefix='zip') if threads > 1 else None
+    try:
+        with open(temporario, 'wb') as arquivo, \
+                (open(zip_anterior, 'rb') if zip_anterior else contextlib.nullcontext()) as velho:
+            escritor = _EscritorZip(arquivo, pool, metodo, nivel, zip64)
+            for membro in membros:
+                if membro.nome in reaproveitados:
+                    entrada = escritor.copiar(velho, anteriores[membro.nome])
+                else:
+                    entrada = escritor.adicionar(membro, threads)
+                entrada['origem'] = hashes[membro.nome]
+            escritor.fechar()
+        os.replace(temporario, destino)
+    finally:
+        if pool is not None:
+            pool.shutdown()
+        if os.path.exists(temporario):
+            os.remove(temporario)
+
+    info = os.stat(destino)
+    manifesto = {
+        'zip': os.path.basename(destino),
+        'sha256': sha256_arquivo(destino),
+        'tamanho': info.st_size,
+        'mtime_ns': info.st_mtime_ns,
+        'membros': escritor.entradas,
+        'origens': origens,
+    }
+    salvar_manifesto(arquivo_manifesto, manifesto)
+    manifesto['reaproveitados'] = reaproveitados
+    return manifesto
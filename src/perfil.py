@@ -0,0 +1,310 @@
+# src/perfil.py
+"""Medição das etapas do pipeline (main.py, transform.py e pipeline.py).
+
+Cada etapa registra tempo de relógio, tempo de CPU, pico de memória, bytes
+lidos/escritos e linhas de entrada/saída. Ao final da execução um relatório
+JSON é gravado em ANS_PERFIL_DIR, para comparar execuções e o efeito do
+crescimento dos dados.
+
+Uso:
+    with perfil.execucao('transform'):
+        with perfil.etapa('agregacao', linhas_entrada=len(df)) as e:
+            agregado = agregar(df)
+            e.linhas_saida = len(agregado)
+
+Com ANS_PERFIL_ETAPA=<nome> a etapa indicada roda sob cProfile e/ou
+tracemalloc (ANS_PERFIL_MODO=cprofile,tracemalloc); as estatísticas vão para
+o relatório e os arquivos .prof/.tracemalloc ficam ao lado dele.
+
+CPU, bytes de E/S e pico de RSS são medidas do processo inteiro. Etapas que
+rodam ao mesmo tempo em outra thread (src/pipeline.py) saem marcadas como
+`concorrente`: os valores delas incluem o trabalho das outras.
+"""
+import contextlib
+import json
+import os
+import platform
+import sys
+import threading
+import time
+from datetime import datetime
+
+PERFIL_DIR = os.environ.get("ANS_PERFIL_DIR", "data/perfil")
+PERFIL_ETAPA = os.environ.get("ANS_PERFIL_ETAPA", "")
+PERFIL_MODO = os.environ.get("ANS_PERFIL_MODO", "cprofile").lower()
+TOP_PERFIL = 20  # Linhas de cProfile/tracemalloc guardadas no relatório
+
+_etapas = []  # Todas as etapas da execução, na ordem em que começaram
+_abertas = []  # Etapas em andamento, de todas as threads (para o pico de memória)
+# Pilha das etapas em andamento em cada thread (etapas podem ser aninhadas, e o
+# src/pipeline.py roda etapas independentes em threads ao mesmo tempo)
+_pilhas = threading.local()
+_lock = threading.Lock()
+_rotulo_execucao = "execucao"  # Prefixo do relatório e dos arquivos de perfil
+
+
+def _ler_status(campo):
+    """Valor (KiB) de um campo de /proc/self/status, ou None fora do Linux."""
+    try:
+        with open('/proc/self/status') as f:
+            for linha in f:
+                if linha.startswith(campo + ':'):
+                    return int(linha.split()[1])
+    except OSError:
+        pass
+    return None
+
+
+def _pico_rss_kib():
+    pico = _ler_status('VmHWM')
+    if pico is None:
+        try:
+            import resource
+        except ImportError:
+            return None
+        pico = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+        # ru_maxrss vem em bytes no macOS e em KiB no Linux
+        pico = pico // 1024 if sys.platform == 'darwin' else pico
+    return pico
+
+
+def _zerar_pico_rss():
+    """Reinicia o pico de RSS do processo (Linux); False se não for possível."""
+    try:
+        with open('/proc/self/clear_refs', 'w') as f:
+            f.write('5')
+        return True
+    except OSError:
+        return False
+
+
+def _io():
+    """(bytes lidos, bytes escritos) pelo processo, incluindo rede e pipes (Linux)."""
+    try:
+        with open('/proc/self/io') as f:
+            valores = dict(linha.split(': ') for linha in f.read().splitlines())
+        return int(valores['rchar']), int(valores['wchar'])
+    except (OSError, KeyError, ValueError):
+        return None, None
+
+
+def _cpu():
+    """CPU do processo e dos filhos já encerrados (ex.: workers de um pool finalizado)."""
+    t = os.times()
+    return t.user + t.system, t.children_user + t.children_system
+
+
+def _diferenca(fim, inicio):
+    return None if fim is None or inicio is None else fim - inicio
+
+
+def _pilha():
+    if not hasattr(_pilhas, 'etapas'):
+        _pilhas.etapas = []
+    return _pilhas.etapas
+
+
+def _observar_pico():
+    """Repassa o pico desde a última leitura a todas as etapas em andamento."""
+    pico = _pico_rss_kib()
+    if pico is not None:
+        for etapa_aberta in _abertas:
+            etapa_aberta.pico_kib = max(etapa_aberta.pico_kib or 0, pico)
+
+
+class Etapa:
+    """Medidas de uma etapa; `linhas_entrada`/`linhas_saida` podem ser preenchidas no bloco."""
+
+    def __init__(self, nome, linhas_entrada=None, linhas_saida=None):
+        self.nome = nome
+        self.pai = _pilha()[-1].nome if _pilha() else None
+        self.linhas_entrada = linhas_entrada
+        self.linhas_saida = linhas_saida
+        self.pico_kib = None
+        self.pico_por_etapa = False
+        # Houve etapa de outra thread em andamento junto com esta
+        self.concorrente = False
+        self.thread = threading.get_ident()
+        self.perfil = None
+        self.erro = None
+        # Medidas extras da etapa (ex.: tempo de leitura e de tratamento somado nos workers)
+        self.detalhes = {}
+
+    def _iniciar(self):
+        with _lock:
+            _observar_pico()
+            outras = [e for e in _abertas if e.thread != self.thread]
+            for e in outras:
+                e.concorrente = True
+            self.concorrente = bool(outras)
+            _abertas.append(self)
+            _pilha().append(self)
+            # Zerar o pico apagaria o das etapas das outras threads
+            self.pico_por_etapa = not outras and _zerar_pico_rss()
+        self._cpu = _cpu()
+        self._io = _io()
+        self._inicio = time.perf_counter()
+
+    def _finalizar(self):
+        self.wall_s = time.perf_counter() - self._inicio
+        cpu, cpu_filhos = _cpu()
+        self.cpu_s = cpu - self._cpu[0]
+        self.cpu_filhos_s = cpu_filhos - self._cpu[1]
+        lidos, escritos = _io()
+        self.bytes_lidos = _diferenca(lidos, self._io[0])
+        self.bytes_escritos = _diferenca(escritos, self._io[1])
+        with _lock:
+            _observar_pico()
+            _abertas.remove(self)
+            _pilha().remove(self)
+
+    def como_dict(self):
+        return {
+            'nome': self.nome,
+            'pai': self.pai,
+            'wall_s': round(self.wall_s, 4),
+            'cpu_s': round(self.cpu_s, 4),
+            'cpu_filhos_s': round(self.cpu_filhos_s, 4),
+            'pico_rss_mib': None if self.pico_kib is None else round(self.pico_kib / 1024, 1),
+            'pico_rss_da_etapa': self.pico_por_etapa,
+            # CPU, E/S e RSS somam o trabalho das etapas que rodaram junto
+            'concorrente': self.concorrente,
+            'bytes_lidos': self.bytes_lidos,
+            'bytes_escritos': self.bytes_escritos,
+            'linhas_entrada': self.linhas_entrada,
+            'linhas_saida': self.linhas_saida,
+            'detalhes': self.detalhes,
+            'erro': self.erro,
+            'perfil': self.perfil,
+        }
+
+
+@contextlib.contextmanager
+def _perfilar(etapa_medida):
+    """cProfile/tracemalloc na etapa escolhida por ANS_PERFIL_ETAPA."""
+    if etapa_medida.nome != PERFIL_ETAPA:
+        yield
+        return
+
+    os.makedirs(PERFIL_DIR, exist_ok=True)
+    base = os.path.join(PERFIL_DIR, f"{_rotulo_execucao}_{etapa_medida.nome}")
+    etapa_medida.perfil = {}
+    perfilador = None
+    if 'cprofile' in PERFIL_MODO:
+        import cProfile
+        perfilador = cProfile.Profile()
+    if 'tracemalloc' in PERFIL_MODO:
+        import tracemalloc
+        tracemalloc.start(10)
+    if perfilador is not None:
+        perfilador.enable()
+    try:
+        yield
+    finally:
+        if perfilador is not None:
+            import io
+            import pstats
+            perfilador.disable()
+            perfilador.dump_stats(base + '.prof')
+            saida = io.StringIO()
+            pstats.Stats(perfilador, stream=saida).sort_stats('cumulative').print_stats(TOP_PERFIL)
+            etapa_medida.perfil['cprofile'] = {
+                'arquivo': base + '.prof',
+                'top_cumulativo': [l for l in saida.getvalue().splitlines() if l.strip()],
+            }
+        if 'tracemalloc' in PERFIL_MODO:
+            import tracemalloc
+            snapshot = tracemalloc.take_snapshot()
+            _, pico = tracemalloc.get_traced_memory()
+            tracemalloc.stop()
+            snapshot.dump(base + '.tracemalloc')
+            etapa_medida.perfil['tracemalloc'] = {
+                'arquivo': base + '.tracemalloc',
+                'pico_alocado_mib': round(pico / 1024 ** 2, 1),
+                'top_linhas': [str(s) for s in snapshot.statistics('lineno')[:TOP_PERFIL]],
+            }
+
+
+@contextlib.contextmanager
+def etapa(nome, linhas_entrada=None, linhas_saida=None):
+    """Mede o bloco como a etapa `nome` (pode ser aninhada em outra etapa)."""
+    medida = Etapa(nome, linhas_entrada, linhas_saida)
+    _etapas.append(medida)
+    medida._iniciar()
+    try:
+        with _perfilar(medida):
+            yield medida
+    except BaseException as e:
+        medida.erro = repr(e)
+        raise
+    finally:
+        medida._finalizar()
+
+
+def relatorio(script, inicio, duracao, erro=None):
+    import numpy as np
+    import pandas as pd
+
+    return {
+        'script': script,
+        'argv': sys.argv[1:],
+        'inicio': inicio.isoformat(timespec='seconds'),
+        'duracao_s': round(duracao, 4),
+        'erro': erro,
+        'ambiente': {
+            'python': platform.python_version(),
+            'pandas': pd.__version__,
+            'numpy': np.__version__,
+            'cpus': os.cpu_count(),
+            'plataforma': platform.platform(),
+            # Variáveis de configuração do pipeline (ANS_FORMATO, ANS_TRIMESTRES, ...)
+            'config': {k: v for k, v in sorted(os.environ.items()) if k.startswith('ANS_')},
+        },
+        'etapas': [e.como_dict() for e in _etapas],
+    }
+
+
+def resumo():
+    """Uma linha por etapa, para o final da execução."""
+    linhas = []
+    for e in _etapas:
+        recuo = '  ' if e.pai else ''
+        pico = f"{e.pico_kib / 1024:,.0f} MiB" if e.pico_kib is not None else "-"
+        linhas_fluxo = ''
+        if e.linhas_entrada is not None or e.linhas_saida is not None:
+            linhas_fluxo = f"  linhas {e.linhas_entrada if e.linhas_entrada is not None else '-'}" \
+                           f" -> {e.linhas_saida if e.linhas_saida is not None else '-'}"
+        marca = '*' if e.concorrente else ' '
+        linhas.append(f"  {marca}{recuo}{e.nome:<{22 - len(recuo)}} {e.wall_s:8.2f}s  cpu {e.cpu_s + e.cpu_filhos_s:8.2f}s"
+                      f"  pico {pico:>10}{linhas_fluxo}")
+    if any(e.concorrente for e in _etapas):
+        linhas.append("   * em paralelo com outras etapas: CPU, E/S e pico são do processo inteiro")
+    return '\n'.join(linhas)
+
+
+@contextlib.contextmanager
+def execucao(script):
+    """Envolve a execução de um script: ao sair, imprime o resumo e grava o relatório JSON."""
+    global _rotulo_execucao
+    inicio = datetime.now()
+    _rotulo_execucao = f"{script}_{inicio:%Y%m%d-%H%M%S}"
+    _etapas.clear()
+    relogio = time.perf_counter()
+    erro = None
+    try:
+        yield
+    except BaseException as e:
+        erro = repr(e)
+        raise
+    finally:
+        dados = relatorio(script, inicio, time.perf_counter() - relogio, erro)
+        try:
+            os.makedirs(PERFIL_DIR, exist_ok=True)
+            caminho = os.path.join(PERFIL_DIR, f"{_rotulo_execucao}.json")
+            with open(caminho, 'w', encoding='utf-8') as f:
+                json.dump(dados, f, indent=2, ensure_ascii=False)
+            if _etapas:
+                print(f"⏱️ Etapas:\n{resumo()}")
+            print(f"📝 Relatório de execução: {caminho}")
+        except OSError as e:
+            print(f"⚠️ Não foi possível gravar o relatório de execução: {e}")
@@ -0,0 +1,314 @@
+# src/pipeline.py
+"""Pipeline inteiro (main.py, transform.py e carga no banco) como um grafo de etapas.
+
+Cada etapa declara de quais outras depende, os parâmetros que mudam a saída
+dela e os arquivos que grava. A impressão de entrada de uma etapa é o hash
+dos parâmetros e das impressões de saída das dependências; a de saída, o
+hash dos arquivos gravados. Se a entrada é a mesma da última execução
+bem-sucedida e os arquivos continuam iguais, a etapa é pulada.
+
+O estado fica em ANS_PIPELINE_ESTADO (padrão data/pipeline.json), gravado ao
+fim de cada etapa: uma execução que falhou recomeça da etapa que falhou,
+reaproveitando as anteriores.
+
+As etapas sem dependência entre si rodam ao mesmo tempo, em threads (ex.: o
+download do cadastro junto com a varredura e o download dos trimestres).
+crawl, download e cadastro rodam sempre, já que só consultando a ANS se
+sabe se algo mudou; pelo cache HTTP, a consulta sem mudança é barata.
+
+Uso (na raiz do projeto):
+    python -m src.pipeline [--incremental] [--streaming] [--banco] [--refazer ETAPA]
+"""
+import argparse
+import hashlib
+import json
+import os
+import sys
+import threading
+import time
+from collections import namedtuple
+from concurrent.futures import FIRST_COMPLETED, ThreadPoolExecutor, wait
+from datetime import datetime
+
+import src.armazenamento as armazenamento
+import src.download as download
+import src.main as main
+import src.pacote as pacote
+import src.perfil as perfil
+import src.transform as transform
+
+ARQUIVO_ESTADO = os.environ.get('ANS_PIPELINE_ESTADO', 'data/pipeline.json')
+# Etapas independentes executadas ao mesmo tempo. As medidas do perfil.py
+# (CPU, E/S, pico de RSS) são do processo: com 1, cada etapa é medida sozinha
+WORKERS = int(os.environ.get('ANS_PIPELINE_WORKERS', 4))
+
+# nome, etapas de que depende, função que a executa (recebe o contexto),
+# parâmetros que mudam a saída (função sem argumentos), arquivos gravados
+# (função do resultado; None quando a saída é o próprio resultado) e se roda sempre
+Tarefa = namedtuple('Tarefa', ['nome', 'dependencias', 'executar', 'parametros', 'arquivos', 'sempre'])
+
+
+def _hash(valor):
+    return hashlib.sha256(json.dumps(valor, sort_keys=True, default=str).encode()).hexdigest()
+
+
+def hash_arquivos(caminhos, conhecidos):
+    """Impressão do conteúdo de `caminhos` e o estado de cada arquivo ({caminho: {...}}).
+
+    Arquivos com o mesmo tamanho e mtime de `conhecidos` (da execução
+    anterior) não são relidos. Entra no hash a pasta de cada arquivo (no
+    parquet particionado, a partição), mas não o nome: os arquivos das
+    partições ganham um nome novo a cada gravação.
+    """
+    estados = {}
+    for caminho in sorted(caminhos):
+        info = os.stat(caminho)
+        anterior = conhecidos.get(caminho, {})
+        if anterior.get('tamanho') == info.st_size and anterior.get('mtime_ns') == info.st_mtime_ns:
+            digest = anterior['sha256']
+        else:
+            digest = pacote.sha256_arquivo(caminho)
+        estados[caminho] = {'tamanho': info.st_size, 'mtime_ns': info.st_mtime_ns, 'sha256': digest}
+    return _hash(sorted((os.path.dirname(c), e['sha256']) for c, e in estados.items())), estados
+
+
+def carregar_estado(caminho=ARQUIVO_ESTADO):
+    """Estado das etapas concluídas ({'etapas': {nome: {...}}})."""
+    if not os.path.exists(caminho):
+        return {'etapas': {}}
+    with open(caminho, encoding='utf-8') as f:
+        return json.load(f)
+
+
+def salvar_estado(caminho, estado):
+    os.makedirs(os.path.dirname(caminho) or '.', exist_ok=True)
+    with open(caminho + '.tmp', 'w', encoding='utf-8') as f:
+        json.dump(estado, f, indent=2)
+    os.replace(caminho + '.tmp', caminho)
+
+
+# --- Etapas --- #
+
+def _crawl(contexto):
+    contexto['sessao'] = download.criar_sessao(main.MAX_WORKERS)
+    targets = main.listar_trimestres(contexto['sessao'])
+    if not targets:
+        raise RuntimeError(f"nenhum trimestre encontrado em {main.BASE_URL}")
+    return targets
+
+
+def _download(contexto):
+    baixados = main.baixar_trimestres(contexto['resultados']['crawl'], contexto['sessao'])
+    erros = [url for url, _, _, erro in baixados if erro is not None]
+    if erros:
+        raise RuntimeError(f"{len(erros)} ZIP(s) não baixados: {', '.join(erros)}")
+    return baixados
+
+
+def _cadastro(contexto):
+    with perfil.etapa('cadastro') as e:
+        caminho_cadop, modificado = transform.baixar_cadastro()
+        e.detalhes['modificado'] = bool(modificado)
+    return caminho_cadop
+
+
+def _consolidado(contexto):
+    opcoes = contexto['opcoes']
+    # O próprio pipeline decide se a etapa roda: aqui sempre reprocessa
+    falhas = main.consolidar_trimestres(
+        contexto['resultados']['download'], opcoes['incremental'], opcoes['streaming'],
+        reaproveitar=False)
+    if falhas:
+        raise RuntimeError(f"falha ao processar {', '.join(falhas)}")
+    if not armazenamento.existe(main.BASE_CONSOLIDADO):
+        raise RuntimeError(f"{main.OUTPUT_CONSOLIDADO} não foi gerado")
+
+
+def _registro(contexto):
+    with perfil.etapa('registro') as e:
+        df_registro = transform.atualizar_registro(contexto['resultados']['cadastro'])
+        if df_registro is None:
+            raise RuntimeError("falha ao atualizar o registro de operadoras")
+        e.linhas_saida = len(df_registro)
+
+
+def _agregacao(contexto):
+    modo_incremental = contexto['opcoes']['incremental'] and os.path.exists(
+        transform.ARQUIVO_ESTATISTICAS)
+    transform.gerar_saidas(transform.ler_registro(), modo_incremental)
+
+
+def _pacote(contexto):
+    transform.gerar_zip()
+
+
+def _banco(contexto):
+    # psycopg só é necessário com --banco
+    from src.carga_banco import DSN, carregar_banco
+    with perfil.etapa('banco'):
+        carregar_banco(DSN)
+
+
+def _arquivos(*bases):
+    return [a for base in bases for a in armazenamento.arquivos(base)]
+
+
+def tarefas(opcoes):
+    """Grafo do pipeline para as opções da linha de comando."""
+    formato = armazenamento.FORMATO
+    lista = [
+        Tarefa('crawl', [], _crawl,
+               lambda: {'url': main.BASE_URL, 'trimestres': main.TRIMESTRES_ALVO}, None, True),
+        Tarefa('download', ['crawl'], _download,
+               lambda: {}, lambda baixados: [caminho for _, caminho, _, _ in baixados], True),
+        Tarefa('cadastro', [], _cadastro,
+               lambda: {'url': transform.URL_CADASTRO}, lambda caminho: [caminho], True),
+        Tarefa('consolidado', ['download'], _consolidado,
+               lambda: {'formato': formato, 'incremental': opcoes['incremental'],
+                        'streaming': opcoes['streaming']},
+               lambda _: _arquivos(main.BASE_CONSOLIDADO) + [main.ESTATISTICAS_CSV, main.MANIFESTO],
+               False),
+        Tarefa('registro', ['cadastro'], _registro,
+               lambda: {'formato': formato},
+               lambda _: _arquivos(transform.BASE_REGISTRO, transform.BASE_CADASTRO_LIMPO)
+               + [transform.ARQUIVO_VERSOES_REGISTRO],
+               False),
+        Tarefa('agregacao', ['consolidado', 'registro'], _agregacao,
+               lambda: {'formato': formato, 'incremental': opcoes['incremental'],
+                        'snapshot_api': transform.PASTA_SNAPSHOT_API},
+               lambda _: _arquivos(transform.BASE_SAIDA_AGREGADO, *(
+                   [transform.BASE_RESULTADO] if formato == 'parquet' else [])),
+               False),
+        Tarefa('pacote', ['consolidado', 'registro', 'agregacao'], _pacote,
+               lambda: {'metodo': pacote.METODO, 'nivel': pacote.NIVEL, 'bloco': pacote.BLOCO,
+                        'zip64': pacote.ZIP64},
+               lambda _: [transform.caminho_zip(), pacote.caminho_manifesto(transform.caminho_zip())],
+               False),
+    ]
+    if opcoes['banco']:
+        # Só o hash da conexão vai para o estado (a URL pode ter senha)
+        lista.append(Tarefa(
+            'banco', ['consolidado', 'registro', 'agregacao'], _banco,
+            lambda: {'dsn': _hash(os.environ.get('ANS_DATABASE_URL', ''))}, None, False))
+    return lista
+
+
+# --- Execução --- #
+
+class Execucao:
+    """Uma execução do grafo: agenda as etapas prontas e registra o estado de cada uma."""
+
+    def __init__(self, lista, opcoes, refazer=(), caminho_estado=ARQUIVO_ESTADO):
+        self.tarefas = {t.nome: t for t in lista}
+        self.refazer = set(refazer)
+        self.caminho_estado = caminho_estado
+        self.estado = carregar_estado(caminho_estado)
+        self.contexto = {'opcoes': opcoes, 'resultados': {}}
+        self.saidas = {}  # nome -> impressão da saída
+        self.situacao = {}  # nome -> executada, reaproveitada, falhou ou bloqueada
+        self.duracoes = {}
+        self._lock = threading.Lock()
+
+    def _registrar(self, nome, registro):
+        with self._lock:
+            if registro is None:
+                self.estado['etapas'].pop(nome, None)
+            else:
+                self.estado['etapas'][nome] = registro
+            salvar_estado(self.caminho_estado, self.estado)
+
+    def _saida(self, tarefa, resultado, anterior):
+        if tarefa.arquivos is None:
+            return _hash(resultado), {}
+        return hash_arquivos(tarefa.arquivos(resultado), anterior.get('arquivos', {}))
+
+    def rodar(self, tarefa):
+        """Executa (ou reaproveita) uma etapa; devolve a impressão da saída e a situação."""
+        entrada = _hash({'parametros': tarefa.parametros(),
+                         'dependencias': {d: self.saidas[d] for d in tarefa.dependencias}})
+        anterior = self.estado['etapas'].get(tarefa.nome, {})
+
+        if not tarefa.sempre and tarefa.nome not in self.refazer and anterior.get('entrada') == entrada:
+            try:
+                saida, _ = self._saida(tarefa, None, anterior)
+            except OSError:  # algum arquivo da execução anterior sumiu
+                saida = None
+            if saida == anterior.get('saida'):
+                print(f"⏭️ Etapa {tarefa.nome}: entradas e arquivos inalterados.")
+                return saida, 'reaproveitada'
+
+        inicio = time.perf_counter()
+        resultado = tarefa.executar(self.contexto)
+        self.duracoes[tarefa.nome] = time.perf_counter() - inicio
+        self.contexto['resultados'][tarefa.nome] = resultado
+        saida, arquivos = self._saida(tarefa, resultado, anterior)
+        self._registrar(tarefa.nome, {
+            'entrada': entrada, 'saida': saida, 'arquivos': arquivos,
+            'concluida_em': datetime.now().isoformat(timespec='seconds'),
+            'duracao_s': round(self.duracoes[tarefa.nome], 3),
+        })
+        return saida, 'executada'
+
+    def executar(self, workers=WORKERS):
+        """Roda o grafo; True se todas as etapas terminaram (executadas ou reaproveitadas)."""
+        pendentes = dict(self.tarefas)
+        em_andamento = {}
+        with ThreadPoolExecutor(max_workers=workers, thread_name_prefix='etapa') as executor:
+            while pendentes or em_andamento:
+                for nome, tarefa in list(pendentes.items()):
+                    if any(self.situacao.get(d) in ('falhou', 'bloqueada') for d in tarefa.dependencias):
+                        self.situacao[nome] = 'bloqueada'
+                        del pendentes[nome]
+                    elif all(d in self.saidas for d in tarefa.dependencias):
+                        del pendentes[nome]
+                        em_andamento[executor.submit(self.rodar, tarefa)] = nome
+                if not em_andamento:
+                    break
+
+                prontos, _ = wait(em_andamento, return_when=FIRST_COMPLETED)
+                for futuro in prontos:
+                    nome = em_andamento.pop(futuro)
+                    try:
+                        self.saidas[nome], self.situacao[nome] = futuro.result()
+                    except Exception as e:
+                        print(f"❌ Etapa {nome} falhou: {e}")
+                        self.situacao[nome] = 'falhou'
+                        # Sem registro, a próxima execução recomeça desta etapa
+                        self._registrar(nome, None)
+        return all(s in ('executada', 'reaproveitada') for s in self.situacao.values())
+
+    def resumo(self):
+        linhas = []
+        for nome in self.tarefas:
+            duracao = f"{self.duracoes[nome]:8.2f}s" if nome in self.duracoes else ''
+            linhas.append(f"   {nome:<14} {self.situacao.get(nome, '-'):<14}{duracao}")
+        return '\n'.join(linhas)
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(
+        description="Pipeline completo: download, consolidação, enriquecimento, agregação, ZIP e banco.")
+    parser.add_argument("--incremental", action="store_true",
+                        help="processa apenas os ZIPs ainda não ingeridos e agrega pelas somas acumuladas")
+    parser.add_argument("--streaming", action="store_true",
+                        help="consolida cada bloco de linhas ao ser lido (ver main.py)")
+    parser.add_argument("--banco", action="store_true",
+                        help="inclui a carga no PostgreSQL (src/carga_banco.py, ANS_DATABASE_URL)")
+    parser.add_argument("--refazer", action="append", default=[], metavar="ETAPA",
+                        help="executa a etapa mesmo com as entradas inalteradas (pode repetir)")
+    parser.add_argument("--forcar", action="store_true", help="executa todas as etapas")
+    args = parser.parse_args()
+
+    opcoes = {'incremental': args.incremental, 'streaming': args.streaming, 'banco': args.banco}
+    lista = tarefas(opcoes)
+    desconhecidas = set(args.refazer) - {t.nome for t in lista}
+    if desconhecidas:
+        parser.error(f"etapa(s) desconhecida(s): {', '.join(sorted(desconhecidas))}")
+
+    execucao = Execucao(lista, opcoes, [t.nome for t in lista] if args.forcar else args.refazer)
+    with perfil.execucao('pipeline'):
+        # Com cProfile/tracemalloc numa etapa, as etapas rodam uma de cada vez
+        sucesso = execucao.executar(1 if perfil.PERFIL_ETAPA else WORKERS)
+    print(f"🧭 Pipeline ({ARQUIVO_ESTADO}):\n{execucao.resumo()}")
+    if not sucesso:
+        sys.exit(1)
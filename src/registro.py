@@ -0,0 +1,193 @@
+# src/registro.py
+"""Registro persistente de operadoras, montado a partir do Relatorio_cadop.
+
+O Relatorio_cadop só traz as operadoras ativas: as que saem dele continuam
+no registro com os últimos dados conhecidos (UltimaVersao antiga), para que
+as despesas históricas ainda encontrem razão social e UF. Cada download
+novo do cadastro é uma versão, identificada pela data do download.
+
+As consultas são por chave inteira (RegistroANS e CNPJ sem pontuação),
+com busca binária em arrays ordenados: o enriquecimento de um DataFrame é
+um único `take` por coluna, e as chaves sem cadastro são contadas.
+"""
+import json
+import os
+from collections import Counter
+
+import numpy as np
+import pandas as pd
+
+COLUNAS = ['RegistroANS', 'CNPJ', 'RazaoSocial', 'Modalidade', 'UF']
+COLUNAS_REGISTRO = COLUNAS + ['DataRegistroANS', 'PrimeiraVersao', 'UltimaVersao']
+
+# Nomes do Relatorio_cadop (em maiúsculas) -> nomes do pipeline
+RENOMEAR = {
+    'REGISTRO_OPERADORA': 'RegistroANS',
+    'RAZÃO_SOCIAL': 'RazaoSocial',
+    'RAZAO_SOCIAL': 'RazaoSocial',
+    'DATA_REGISTRO_ANS': 'DataRegistroANS',
+    'MODALIDADE': 'Modalidade',
+}
+
+
+def cnpj_inteiro(valores):
+    """CNPJ como int64 (só os dígitos); -1 quando vazio ou inválido."""
+    digitos = pd.Series(valores, dtype=object).astype(str).str.replace(r'\D', '', regex=True)
+    digitos = digitos.where(digitos.str.len().between(1, 14), '')
+    return pd.to_numeric(digitos, errors='coerce').fillna(-1).to_numpy(dtype=np.int64)
+
+
+def cnpj_texto(inteiros):
+    """Inverso de cnpj_inteiro: 14 dígitos com zeros à esquerda (None para -1)."""
+    return [f'{c:014d}' if c >= 0 else None for c in np.asarray(inteiros).tolist()]
+
+
+def localizar(chaves_ordenadas, consultas):
+    """Posição de cada consulta em `chaves_ordenadas` (int64, sem repetição); -1 se ausente."""
+    consultas = np.asarray(consultas, dtype=np.int64)
+    posicoes = np.searchsorted(chaves_ordenadas, consultas)
+    posicoes[posicoes == len(chaves_ordenadas)] = 0
+    encontradas = len(chaves_ordenadas) > 0
+    if encontradas:
+        encontradas = chaves_ordenadas[posicoes] == consultas
+    return np.where(encontradas, posicoes, -1)
+
+
+def ler_cadop(caminho):
+    """Relatorio_cadop.csv com as colunas do registro; uma linha por RegistroANS.
+
+    Registros repetidos ficam com a linha de DataRegistroANS mais recente.
+    """
+    df = pd.read_csv(caminho, sep=';', encoding='latin1', on_bad_lines='skip',
+                     dtype={'CNPJ': str, 'REGISTRO_OPERADORA': str})
+    df.columns = df.columns.str.strip().str.upper()
+    df = df.rename(columns=RENOMEAR)
+
+    df['RegistroANS'] = pd.to_numeric(df['RegistroANS'], errors='coerce')
+    df = df.dropna(subset=['RegistroANS']).astype({'RegistroANS': np.int64})
+    df['CNPJ'] = cnpj_texto(cnpj_inteiro(df['CNPJ']))
+    df['DataRegistroANS'] = pd.to_datetime(
+        df['DataRegistroANS'], errors='coerce').dt.strftime('%Y-%m-%d')
+
+    df = df.sort_values(['RegistroANS', 'DataRegistroANS'], ascending=[True, False],
+                        na_position='last')
+    return df.drop_duplicates(subset=['RegistroANS'], keep='first')[
+        COLUNAS + ['DataRegistroANS']].reset_index(drop=True)
+
+
+def mesclar_versao(anterior, cadop, versao):
+    """Registro com o cadastro baixado em `versao` (data AAAA-MM-DD) aplicado.
+
+    Operadoras do cadastro novo são atualizadas (mantendo a PrimeiraVersao
+    em que apareceram); as que não estão nele ficam como estavam.
+    Retorna (registro, resumo da versão).
+    """
+    cadop = cadop.assign(PrimeiraVersao=versao, UltimaVersao=versao)
+    if anterior is not None and len(anterior):
+        posicoes = localizar(anterior['RegistroANS'].to_numpy(dtype=np.int64),
+                             cadop['RegistroANS'].to_numpy(dtype=np.int64))
+        conhecidas = posicoes >= 0
+        primeira = cadop['PrimeiraVersao'].to_numpy(dtype=object)
+        primeira[conhecidas] = anterior['PrimeiraVersao'].to_numpy(dtype=object)[posicoes[conhecidas]]
+        cadop['PrimeiraVersao'] = primeira
+        fora = np.ones(len(anterior), dtype=bool)
+        fora[posicoes[conhecidas]] = False
+        registro = pd.concat([cadop, anterior[fora]], ignore_index=True)
+        novas, saidas = int((~conhecidas).sum()), int((fora & (anterior['UltimaVersao'] != versao)).sum())
+    else:
+        registro, novas, saidas = cadop, len(cadop), 0
+
+    registro = registro.sort_values('RegistroANS', ignore_index=True)[COLUNAS_REGISTRO]
+    resumo = {'versao': versao, 'ativas': len(cadop), 'novas': novas,
+              'fora_do_cadastro': saidas, 'total': len(registro)}
+    return registro, resumo
+
+
+def carregar_versoes(caminho):
+    """Histórico das versões do registro ({'versoes': [...]})."""
+    if not os.path.exists(caminho):
+        return {'versoes': []}
+    with open(caminho, encoding='utf-8') as f:
+        return json.load(f)
+
+
+def salvar_versoes(caminho, versoes):
+    with open(caminho + '.tmp', 'w', encoding='utf-8') as f:
+        json.dump(versoes, f, indent=2)
+    os.replace(caminho + '.tmp', caminho)
+
+
+class RegistroOperadoras:
+    """Índices por RegistroANS e CNPJ sobre o registro, em arrays ordenados.
+
+    `ausentes` conta, por chave, as linhas consultadas sem cadastro.
+    """
+
+    def __init__(self, df):
+        df = df.astype({'RegistroANS': np.int64}).sort_values('RegistroANS', ignore_index=True)
+        self.df = df
+        self.versao = df['UltimaVersao'].max() if 'UltimaVersao' in df.columns and len(df) else None
+        self.registros = df['RegistroANS'].to_numpy()
+
+        # CNPJ -> linha: com o CNPJ repetido, vale a operadora vista por último no
+        # cadastro e, nela, o registro mais recente
+        cnpj = cnpj_inteiro(df['CNPJ'])
+        # lexsort: a última chave é a principal; datas em ordem decrescente (vazias por último)
+        chaves = [-(pd.factorize(df[c], sort=True)[0] + 1)
+                  for c in ('DataRegistroANS', 'UltimaVersao') if c in df.columns]
+        ordem = np.lexsort(chaves + [cnpj])
+        ordem = ordem[cnpj[ordem] >= 0]
+        primeira = np.ones(len(ordem), dtype=bool)
+        primeira[1:] = cnpj[ordem][1:] != cnpj[ordem][:-1]
+        self.cnpjs = cnpj[ordem][primeira]
+        self.linhas_cnpj = ordem[primeira]
+
+        self.ausentes = Counter()
+
+    def __len__(self):
+        return len(self.df)
+
+    def posicoes(self, registros):
+        """Linhas do registro para cada RegistroANS (-1 sem cadastro)."""
+        return localizar(self.registros, registros)
+
+    def posicoes_cnpj(self, cnpjs):
+        """Linhas do registro para cada CNPJ (com ou sem pontuação; -1 sem cadastro)."""
+        posicoes = localizar(self.cnpjs, cnpj_inteiro(cnpjs))
+        encontradas = posicoes >= 0
+        posicoes[encontradas] = self.linhas_cnpj[posicoes[encontradas]]
+        return posicoes
+
+    def enriquecer(self, df, colunas, chave='RegistroANS'):
+        """`df` com `colunas` do registro, pela `chave` (RegistroANS ou CNPJ).
+
+        Só ficam as linhas com cadastro (como um inner join), na ordem de
+        `df`; as demais são contadas em `ausentes[chave]`.
+        """
+        if chave == 'CNPJ':
+            posicoes = self.posicoes_cnpj(df[chave])
+        else:
+            valores = pd.to_numeric(df[chave], errors='coerce')
+            posicoes = self.posicoes(valores.fillna(-1).to_numpy(dtype=np.int64))
+        encontradas = posicoes >= 0
+        self.ausentes[chave] += int((~encontradas).sum())
+
+        resultado = df[encontradas].copy() if not encontradas.all() else df.copy()
+        linhas = posicoes[encontradas]
+        for coluna in colunas:
+            resultado[coluna] = self.df[coluna].to_numpy()[linhas]
+        return resultado
+
+    def consultar(self, registros=(), cnpjs=()):
+        """Cadastro (dict com COLUNAS, ou None) de cada RegistroANS e de cada CNPJ pedido."""
+        registros = pd.to_numeric(pd.Series(list(registros), dtype=object), errors='coerce')
+        resultado = {}
+        for nome, chave, posicoes in (
+                ('registros', 'RegistroANS', self.posicoes(registros.fillna(-1).to_numpy(dtype=np.int64))),
+                ('cnpjs', 'CNPJ', self.posicoes_cnpj(list(cnpjs)))):
+            encontradas = posicoes >= 0
+            valores = {c: self.df[c].to_numpy()[posicoes[encontradas]].tolist() for c in COLUNAS}
+            linhas = iter([dict(zip(COLUNAS, linha)) for linha in zip(*valores.values())])
+            resultado[nome] = [next(linhas) if achou else None for achou in encontradas.tolist()]
+            self.ausentes[chave] += int((~encontradas).sum())
+        return resultado
@@ -0,0 +1,400 @@
+"""Snapshot do índice da API em disco: layout da pasta, gravação e leitura.
+
+O primeiro processo que carrega um arquivo de dados grava o estado do
+índice de operadoras (src/indice_operadoras.py) numa pasta: um .npy por
+array de tamanho fixo (colunas numéricas, códigos dos textos, índices em
+CSR) e, para cada tabela de texto, os bytes UTF-8 concatenados mais os
+deslocamentos. Os outros workers (e as próximas partidas) só abrem a pasta:
+os arrays são mapeados somente leitura, então as páginas ficam no cache do
+sistema e são compartilhadas entre os processos em vez de copiadas em cada um.
+
+Fica em src/ e não importa nada da API: o src/transform.py grava o
+snapshot e as estatísticas já na geração do resultado, e a API
+(api/snapshot.py, api/dados.py, api/estatisticas.py) procura e lê pelo
+mesmo código, com a mesma pasta e o mesmo formato.
+
+Cada processo que usa um snapshot mantém uma trava compartilhada no arquivo
+`.em_uso` da pasta (`usar`); a limpeza só apaga as pastas que nenhum
+processo tem abertas, então um worker que ainda não trocou de versão
+continua lendo a dele.
+"""
+import contextlib
+import hashlib
+import json
+import os
+import shutil
+import time
+from pathlib import Path
+
+import numpy as np
+
+from src.indice_operadoras import montar_estado, tabela
+
+try:  # trava entre processos; sem fcntl (Windows) cada worker grava o seu
+    import fcntl
+except ImportError:
+    fcntl = None
+
+# Muda quando o layout dos arquivos muda: snapshots antigos são regravados
+FORMATO = 1
+META = "meta.json"
+USO = ".em_uso"
+
+COLUNAS_API = ["registroans", "cnpj", "razaosocial", "uf", "trimestre", "ano",
+               "valordespesas", "totaldespesas", "mediatrimestral", "desviopadrao"]
+
+
+# --- Leitura do resultado_despesas --- #
+
+def carregar_parquet(caminho):
+    """Lê o resultado colunar, projetando só as colunas usadas pelas rotas.
+
+    Os valores já vêm tipados, sem a normalização de texto exigida pelo CSV.
+    """
+    import pandas as pd
+    import pyarrow.parquet as pq
+
+    # Os nomes no arquivo seguem o padrão do pipeline (ex.: RegistroANS)
+    nomes = {c.lower(): c for c in pq.ParquetDataset(caminho).schema.names}
+    df = pd.read_parquet(caminho, columns=[nomes[c] for c in COLUNAS_API if c in nomes])
+    df.columns = [c.lower() for c in df.columns]
+    for col in ("ano", "trimestre"):  # colunas de partição voltam como categorias
+        if isinstance(df[col].dtype, pd.CategoricalDtype):
+            df[col] = df[col].astype(df[col].cat.categories.dtype)
+    return df.sort_values(["registroans", "ano", "trimestre"], ignore_index=True)
+
+
+def carregar_csv(caminho):
+    import pandas as pd
+
+    df = pd.read_csv(caminho, encoding="utf-8", sep=None, engine='python')
+
+    df.columns = [c.lower().strip() for c in df.columns]
+
+    num_cols = ["valordespesas", "totaldespesas",
+                "mediatrimestral", "desviopadrao", "registroans", "ano"]
+    for col in num_cols:
+        if col in df.columns:
+            df[col] = (
+                df[col].astype(str)
+                .str.replace('.', '', regex=False)
+                .str.replace(',', '.', regex=False)
+                .str.strip()
+            )
+            df[col] = pd.to_numeric(df[col], errors='coerce').fillna(0)
+    return df
+
+
+def ler_arquivo(caminho):
+    """resultado_despesas de `caminho` (Parquet ou CSV), sem as linhas inválidas."""
+    print(f"Carregando arquivo: {caminho}")
+    if Path(caminho).suffix == ".parquet":
+        resultado_despesas = carregar_parquet(caminho)
+    else:
+        resultado_despesas = carregar_csv(caminho)
+
+    if not resultado_despesas.empty:
+        resultado_despesas = resultado_despesas.dropna(
+            subset=["registroans", "razaosocial"])
+
+        print(f"Sucesso! {len(resultado_despesas)} linhas carregadas.")
+    return resultado_despesas
+
+
+def assinatura(caminho):
+    """(caminho, mtime, tamanho): muda quando o arquivo é substituído ou reescrito."""
+    if caminho is None:
+        return None
+    info = os.stat(caminho)
+    return str(caminho), info.st_mtime_ns, info.st_size
+
+
+# --- Layout da pasta --- #
+
+def pasta_snapshot(raiz, assinatura):
+    """Pasta do snapshot de um arquivo de dados, identificada pela assinatura dele.
+
+    Usa só o nome do arquivo (não o caminho), para que a API e o ETL
+    cheguem à mesma pasta mesmo rodando de diretórios diferentes.
+    """
+    nome, mtime, tamanho = assinatura
+    chave = json.dumps([FORMATO, Path(nome).name, mtime, tamanho]).encode()
+    return Path(raiz) / hashlib.sha256(chave).hexdigest()[:16]
+
+
+def existe(pasta):
+    return (Path(pasta) / META).exists()
+
+
+@contextlib.contextmanager
+def trava(caminho):
+    """Exclusão entre os workers pelo arquivo `caminho`: um grava, os outros esperam."""
+    with open(caminho, "w") as arquivo:
+        if fcntl is not None:
+            fcntl.flock(arquivo, fcntl.LOCK_EX)
+        yield
+
+
+def _gravar_textos(pasta, nome, textos):
+    dados = [t.encode("utf-8") for t in textos]
+    deslocamentos = np.zeros(len(dados) + 1, dtype=np.int64)
+    np.cumsum([len(d) for d in dados], out=deslocamentos[1:])
+    (pasta / f"{nome}.txt").write_bytes(b"".join(dados))
+    np.save(pasta / f"{nome}.offsets.npy", deslocamentos)
+
+
+def _ler_textos(pasta, nome):
+    dados = (pasta / f"{nome}.txt").read_bytes()
+    deslocamentos = np.load(pasta / f"{nome}.offsets.npy").tolist()
+    return [dados[a:b].decode("utf-8") for a, b in zip(deslocamentos[:-1], deslocamentos[1:])]
+
+
+def gravar(estado, pasta, assinatura):
+    """Grava `estado` (src/indice_operadoras.py) em `pasta` (numa pasta temporária, renomeada no fim)."""
+    pasta = Path(pasta)
+    temporaria = pasta.with_name(f"{pasta.name}.tmp{os.getpid()}")
+    shutil.rmtree(temporaria, ignore_errors=True)
+    temporaria.mkdir(parents=True)
+
+    arrays, textos = [], []
+    for nome, valor in estado.items():
+        if isinstance(valor, np.ndarray):
+            np.save(temporaria / f"{nome}.npy", np.ascontiguousarray(valor))
+            arrays.append(nome)
+        else:
+            _gravar_textos(temporaria, nome, valor)
+            textos.append(nome)
+    (temporaria / META).write_text(json.dumps({
+        "formato": FORMATO,
+        "assinatura": list(assinatura),
+        "linhas": len(estado["registroans"]),
+        "arrays": arrays,
+        "textos": textos,
+        "criado_em": time.time(),
+    }, ensure_ascii=False))
+
+    if pasta.exists() and not existe(pasta):  # sobra de uma gravação interrompida
+        shutil.rmtree(pasta)
+    try:
+        temporaria.rename(pasta)
+    except OSError:  # outro processo gravou a mesma pasta antes
+        shutil.rmtree(temporaria, ignore_errors=True)
+
+
+def _mapear(caminho):
+    try:
+        return np.load(caminho, mmap_mode="r")
+    except ValueError:  # array vazio: não há o que mapear
+        return np.load(caminho)
+
+
+def ler_estado(pasta):
+    """Estado do índice com os arrays de `pasta` mapeados (somente leitura)."""
+    pasta = Path(pasta)
+    meta = json.loads((pasta / META).read_text())
+    estado = {nome: _mapear(pasta / f"{nome}.npy") for nome in meta["arrays"]}
+    estado.update({nome: _ler_textos(pasta, nome) for nome in meta["textos"]})
+    return estado
+
+
+def usar(pasta):
+    """Marca `pasta` como aberta por este processo: trava compartilhada em `.em_uso`.
+
+    Vale enquanto o arquivo devolvido estiver aberto (fechá-lo, ou descartá-lo,
+    libera a pasta para a limpeza).
+    """
+    arquivo = open(Path(pasta) / USO, "a")
+    if fcntl is not None:
+        fcntl.flock(arquivo, fcntl.LOCK_SH)
+    return arquivo
+
+
+def _em_uso(pasta):
+    """True se algum processo tem a pasta aberta (trava compartilhada em `.em_uso`)."""
+    if fcntl is None or not (Path(pasta) / USO).exists():
+        return False
+    with open(Path(pasta) / USO, "a") as arquivo:
+        try:
+            fcntl.flock(arquivo, fcntl.LOCK_EX | fcntl.LOCK_NB)
+        except BlockingIOError:
+            return True
+    return False
+
+
+def limpar(raiz, manter):
+    """Apaga os snapshots de outros arquivos que nenhum processo tem abertos.
+
+    Chamada sob a trava da raiz, como `usar` em `preparar`: nenhum processo
+    passa a usar uma pasta entre a verificação e a remoção.
+    """
+    for pasta in Path(raiz).iterdir():
+        if pasta.is_dir() and pasta.name != Path(manter).name and not _em_uso(pasta):
+            shutil.rmtree(pasta, ignore_errors=True)
+
+
+def preparar(caminho, raiz):
+    """Pasta do snapshot de `caminho` em `raiz`, gravando-o antes se ainda não existir.
+
+    A trava faz um único processo ler o arquivo e gravar; os outros esperam
+    e usam o mesmo snapshot. Retorna (pasta, uso): `uso` é o arquivo de
+    `usar`, que o chamador mantém aberto enquanto ler a pasta.
+    """
+    pasta = pasta_snapshot(raiz, assinatura(caminho))
+    Path(raiz).mkdir(parents=True, exist_ok=True)
+    with trava(Path(raiz) / ".trava"):
+        if not existe(pasta):
+            gravar(montar_estado(ler_arquivo(caminho)), pasta, assinatura(caminho))
+            print(f"Snapshot gravado em {pasta}")
+        uso = usar(pasta)
+        limpar(raiz, manter=pasta)
+    return pasta, uso
+
+
+# --- Estatísticas --- #
+
+# 1. Operadoras com Maior Crescimento Percentual
+def calcular_crescimento(resultado_despesas):
+    if resultado_despesas.empty:
+        return []
+
+    # 1. Criar a chave temporal correta primeiro
+    df = resultado_despesas.copy()
+    df['periodo'] = df['ano'].astype(str) + '-' + df['trimestre'].astype(str)
+
+    # 2. Agrupar para achar o min/max do PERÍODO, não só do ano
+    primeiro_ultimo = df.groupby(['registroans', 'razaosocial']).agg(
+        primeiro_periodo=('periodo', 'min'),
+        ultimo_periodo=('periodo', 'max')
+    ).reset_index()
+
+    # 3. Merge para buscar os valores iniciais
+    primeiro_ultimo = primeiro_ultimo.merge(
+        df[['registroans', 'periodo', 'valordespesas']],
+        left_on=['registroans', 'primeiro_periodo'],
+        right_on=['registroans', 'periodo'],
+        how='left'
+    ).rename(columns={'valordespesas': 'valordespesas_inicial'}).drop(columns=['periodo'])
+
+    # 4. Merge para buscar os valores finais
+    primeiro_ultimo = primeiro_ultimo.merge(
+        df[['registroans', 'periodo', 'valordespesas']],
+        left_on=['registroans', 'ultimo_periodo'],
+        right_on=['registroans', 'periodo'],
+        how='left'
+    ).rename(columns={'valordespesas': 'valordespesas_final'}).drop(columns=['periodo'])
+
+    # 5. Cálculo com a mesma lógica do SQL (* 100)
+    # tratando a divisão por zero
+    mask = primeiro_ultimo['valordespesas_inicial'] != 0
+    primeiro_ultimo['crescimento_percentual'] = 0.0
+
+    primeiro_ultimo.loc[mask, 'crescimento_percentual'] = (
+        (primeiro_ultimo['valordespesas_final'] - primeiro_ultimo['valordespesas_inicial']) /
+        primeiro_ultimo['valordespesas_inicial']
+    ) * 100
+
+    # Ordenação e limpeza
+    top_5 = primeiro_ultimo.sort_values(
+        by='crescimento_percentual', ascending=False).head(5)
+    return top_5.to_dict(orient='records')
+
+
+# 2. Distribuição de Despesas por UF
+def calcular_despesas_uf(resultado_despesas):
+    if resultado_despesas.empty:
+        return []
+
+    despesas_por_uf = resultado_despesas.groupby(['uf']).agg(
+        total_despesas_uf=('totaldespesas', 'sum'),
+        media_despesas_por_operadora=('totaldespesas', 'mean')
+    ).reset_index()
+
+    # Seleciona os 5 estados com maiores despesas totais
+    top_5_uf = despesas_por_uf.sort_values(
+        by='total_despesas_uf', ascending=False).head(5)
+
+    return top_5_uf.to_dict(orient='records')
+
+
+# 3. Operadoras Acima da Média
+def calcular_acima_media(resultado_despesas):
+    if resultado_despesas.empty:
+        return []
+
+    # 1. Calcular a média geral das despesas
+    media_geral = resultado_despesas['valordespesas'].mean()
+
+    # 2. Criar a coluna 'acima_media' que indica se as despesas estão acima da média
+    operadoras_acima_media = resultado_despesas.copy()
+    operadoras_acima_media['acima_media'] = operadoras_acima_media['valordespesas'] > media_geral
+
+    # 3. Contagem dos trimestres acima da média e soma das despesas
+    operadoras_acima_media = operadoras_acima_media.groupby(['registroans', 'razaosocial']).agg(
+        trimestres_acima_media=('acima_media', 'sum'),
+        total_despesas_acima_media=('valordespesas', 'sum')
+    ).reset_index()
+
+    # 4. Filtrar as operadoras que têm mais de 2 trimestres acima da média
+    operadoras_acima_media = operadoras_acima_media[operadoras_acima_media['trimestres_acima_media'] >= 2]
+
+    # 5. Simular o RANK() (classificação) com base na lógica do SQL
+    operadoras_acima_media['ranking'] = operadoras_acima_media['trimestres_acima_media'] * \
+        1000 + operadoras_acima_media['total_despesas_acima_media']
+
+    # 6. Ordenar pela classificação para obter o ranking desejado
+    operadoras_acima_media = operadoras_acima_media.sort_values(
+        by=['trimestres_acima_media', 'total_despesas_acima_media'],
+        ascending=[False, False]
+    ).reset_index(drop=True)
+
+    # 7. Retornar apenas as colunas desejadas
+    return operadoras_acima_media[['registroans', 'razaosocial', 'trimestres_acima_media', 'total_despesas_acima_media', 'ranking']].to_dict(orient='records')
+
+
+# Cálculo e colunas que ele usa (só essas são enviadas ao processo que calcula)
+CALCULOS = {
+    "crescimento": (calcular_crescimento,
+                    ["registroans", "razaosocial", "ano", "trimestre", "valordespesas"]),
+    "despesas_uf": (calcular_despesas_uf, ["uf", "totaldespesas"]),
+    "acima_media": (calcular_acima_media, ["registroans", "razaosocial", "valordespesas"]),
+}
+
+
+def serializar(conteudo):
+    """JSON com as mesmas opções da JSONResponse do FastAPI.
+
+    Os cálculos devolvem só tipos nativos (to_dict), então o resultado é o
+    mesmo do jsonable_encoder, sem depender dele.
+    """
+    return json.dumps(conteudo, ensure_ascii=False, allow_nan=False,
+                      indent=None, separators=(",", ":")).encode("utf-8")
+
+
+def ler_estatistica(pasta, nome):
+    """Corpo JSON da estatística `nome` já calculada por algum worker, ou None."""
+    try:
+        return (Path(pasta) / f"estatistica_{nome}.json").read_bytes()
+    except FileNotFoundError:
+        return None
+
+
+def gravar_estatistica(pasta, nome, corpo):
+    destino = Path(pasta) / f"estatistica_{nome}.json"
+    temporario = destino.with_name(f"{destino.name}.tmp{os.getpid()}")
+    temporario.write_bytes(corpo)
+    os.replace(temporario, destino)
+
+
+def materializar(pasta, nome):
+    """Corpo JSON da estatística `nome` do snapshot em `pasta`, calculando e gravando se faltar.
+
+    Um cálculo por snapshot: os outros workers esperam e leem o resultado.
+    """
+    calcular, colunas = CALCULOS[nome]
+    pasta = Path(pasta)
+    with trava(pasta / f".trava_{nome}"):
+        corpo = ler_estatistica(pasta, nome)
+        if corpo is None:
+            corpo = serializar(calcular(tabela(ler_estado(pasta))[colunas]))
+            gravar_estatistica(pasta, nome, corpo)
+    return corpo
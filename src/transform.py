@@ -1,9 +1,16 @@
+import numpy as np
 import pandas as pd
-import requests
-import io
+import argparse
 import os
-import zipfile
-import utils
+import functools
+from datetime import date
+import src.download as download
+import src.incremental as incremental
+import src.registro as registro
+import src.pacote as pacote
+import src.armazenamento as armazenamento
+import src.perfil as perfil
+import src.snapshot_api as snapshot_api
 import logging
 import urllib3
 
@@ -12,91 +19,273 @@ urllib3.disable_warnings(urllib3.exceptions.InsecureRequestWarning)
 logging.captureWarnings(True)
 
 # Configurações de Caminho (Relativos à pasta src)
-ARQUIVO_ETAPA1 = "data/consolidado_despesas.csv"
-URL_CADASTRO = "https://dadosabertos.ans.gov.br/FTP/PDA/operadoras_de_plano_de_saude_ativas/Relatorio_cadop.csv"
-ARQUIVO_SAIDA_AGREGADO = "data/despesas_agregadas.csv"
-ARQUIVO_CADASTRO_LIMPO = "data/tabela_cadastro_operadoras_limpo.csv"
-PASTA_ZIP = "data"  # Caminho da pasta onde os arquivos CSV e o ZIP são salvos
+URL_CADASTRO = os.environ.get(
+    "ANS_URL_CADASTRO", "https://dadosabertos.ans.gov.br/FTP/PDA/operadoras_de_plano_de_saude_ativas/Relatorio_cadop.csv")
 
+# Bases (sem extensão) dos arquivos intermediários: .csv ou .parquet conforme ANS_FORMATO
+BASE_ETAPA1 = "data/consolidado_despesas"
+BASE_SAIDA_AGREGADO = "data/despesas_agregadas"
+BASE_CADASTRO_LIMPO = "data/tabela_cadastro_operadoras_limpo"
+# Registro persistente de operadoras (src/registro.py) e o histórico das versões dele
+BASE_REGISTRO = "data/registro_operadoras"
+ARQUIVO_VERSOES_REGISTRO = "data/registro_operadoras.json"
+BASE_RESULTADO = "data/resultado_despesas"  # Lido pela API (somente no formato parquet)
+# Snapshot do índice da API ao lado do resultado (src/snapshot_api.py); vazio não gera
+PASTA_SNAPSHOT_API = os.environ.get("API_SNAPSHOT_DIR", "data/snapshot")
 
-def processar_transform():
-    print("🚀 Iniciando Transformação e Enriquecimento...")
-
-    # 1. Verificação do arquivo de entrada
-    if not os.path.exists(ARQUIVO_ETAPA1):
-        print(
-            f"❌ Erro: {ARQUIVO_ETAPA1} não encontrado. Execute o main.py primeiro.")
-        return
+ARQUIVO_ESTATISTICAS = "data/estatisticas_operadoras.csv"  # Somas acumuladas pelo main.py
+PASTA_ZIP = "data"  # Caminho da pasta onde o ZIP e o manifesto dele são salvos
+# Conteúdo do ZIP final (src/pacote.py): base do pipeline -> nome do CSV no ZIP
+MEMBROS_ZIP = [
+    (BASE_SAIDA_AGREGADO, "despesas_agregadas.csv"),
+    (BASE_ETAPA1, "consolidado_despesas.csv"),
+    (BASE_CADASTRO_LIMPO, "tabela_cadastro_operadoras_limpo.csv"),
+]
 
-    # Carregar o CSV consolidado
-    df_fin = pd.read_csv(ARQUIVO_ETAPA1)
+# Colunas do consolidado usadas na agregação; chave e período em tipos compactos
+COLUNAS_AGREGACAO = ['RegistroANS', 'Trimestre', 'Ano', 'ValorDespesas']
+TIPOS_CONSOLIDADO = {'Trimestre': 'category', 'Ano': 'category'}
 
-    # Tratar duplicidade de consolidado_despesas (df_fin)
-    print("🔍 Tratando duplicidades no arquivo consolidado_despesas...")
-    df_fin['ValorDespesas'] = pd.to_numeric(
-        df_fin['ValorDespesas'], errors='coerce').fillna(0)
 
-    # Remover duplicatas baseadas em RegistroANS, Ano, Trimestre e ValorDespesas
-    df_fin = df_fin.drop_duplicates(
-        subset=['RegistroANS', 'Trimestre', 'Ano', 'ValorDespesas']
-    )
+def atualizar_registro(caminho_cadop):
+    """Aplica o Relatorio_cadop baixado ao registro persistente de operadoras.
 
-    # 2. Download e Preparação do Cadastro
+    A versão é a data do download; operadoras que saíram do cadastro ficam no
+    registro com os últimos dados conhecidos. Salva também a tabela limpa
+    (uma linha por RegistroANS), usada no ZIP e na carga do banco.
+    """
     try:
-        print("🌐 Baixando cadastro de operadoras da ANS...")
-        resp = requests.get(URL_CADASTRO, timeout=30, verify=False)
-        df_cadop = pd.read_csv(io.BytesIO(resp.content),
-                               sep=';', encoding='latin1', on_bad_lines='skip')
-
-        # Limpeza básica de nomes
-        df_cadop.columns = df_cadop.columns.str.strip().str.upper()
-
-        # Renomeando colunas para garantir que coincidam com as esperadas
-        df_cadop = df_cadop.rename(columns={
-            'REGISTRO_OPERADORA': 'RegistroANS',
-            'RAZÃO_SOCIAL': 'RazaoSocial',
-            'RAZAO_SOCIAL': 'RazaoSocial',
-            'UF': 'UF',
-            'DATA_REGISTRO_ANS': 'DataRegistroANS',  # Data de registro ANS
-            'MODALIDADE': 'Modalidade'
-        })
-
-        # Ordenando pelo CNPJ e, em seguida, pela Data de Registro ANS (para manter a RazaoSocial mais recente)
-        df_cadop['DataRegistroANS'] = pd.to_datetime(
-            df_cadop['DataRegistroANS'], errors='coerce')
-        df_cadop = df_cadop.sort_values(
-            by=['CNPJ', 'DataRegistroANS'], ascending=[True, False])
-
-        # Remover duplicatas de CNPJ, mantendo a RazaoSocial mais recente
-        df_cadop = df_cadop.drop_duplicates(subset=['CNPJ'], keep='first')
-
-        # Filtrando apenas as colunas necessárias
-        df_cadop = df_cadop[['RegistroANS', 'CNPJ',
-                             'RazaoSocial', 'Modalidade', 'UF']]
-
-        # Salvando o arquivo tratado
-        df_cadop.to_csv(ARQUIVO_CADASTRO_LIMPO, index=False, encoding='utf-8')
+        df_cadop = registro.ler_cadop(caminho_cadop)
+        anterior = None
+        if armazenamento.existe(BASE_REGISTRO):
+            anterior = armazenamento.ler(BASE_REGISTRO, dtype={'CNPJ': str})
+        df_registro, resumo = registro.mesclar_versao(
+            anterior, df_cadop, date.today().isoformat())
+
+        armazenamento.salvar(df_registro, BASE_REGISTRO)
+        armazenamento.salvar(df_registro[registro.COLUNAS], BASE_CADASTRO_LIMPO)
+        versoes = registro.carregar_versoes(ARQUIVO_VERSOES_REGISTRO)
+        versoes['versoes'] = [v for v in versoes['versoes']
+                              if v['versao'] != resumo['versao']] + [resumo]
+        registro.salvar_versoes(ARQUIVO_VERSOES_REGISTRO, versoes)
 
     except Exception as e:
         print(f"❌ Erro no processamento do cadastro: {e}")
-        return
+        return None
+
+    print(f"🗂️ Registro de operadoras {resumo['versao']}: {resumo['ativas']} no cadastro, "
+          f"{resumo['novas']} novas, {resumo['fora_do_cadastro']} fora dele")
+    return df_registro
+
+
+def juntar_cadastro(cadastro, df, colunas, etapa):
+    """`df` com `colunas` do registro, por RegistroANS (linhas sem cadastro saem e são contadas)."""
+    antes = cadastro.ausentes['RegistroANS']
+    resultado = cadastro.enriquecer(df, colunas)
+    sem_cadastro = cadastro.ausentes['RegistroANS'] - antes
+    etapa.detalhes['sem_cadastro'] = sem_cadastro
+    if sem_cadastro:
+        print(f"⚠️ {sem_cadastro} linhas sem o RegistroANS no cadastro de operadoras")
+    return resultado
+
+
+def dimensao_operadoras(cadastro, estatisticas, etapa):
+    """Estatísticas por operadora com RazaoSocial e UF, juntadas só ao final da agregação.
+
+    Cadastros sem razão social ou UF ficam de fora (como no agrupamento por
+    essas colunas).
+    """
+    estatisticas = estatisticas.astype({'RegistroANS': np.int64})
+    resultado = juntar_cadastro(cadastro, estatisticas, ['RazaoSocial', 'UF'], etapa)
+    resultado = resultado.dropna(subset=['RazaoSocial', 'UF']).astype({'UF': 'category'})
+    # Operadora com um trimestre só: desvio NaN vira 0, como no modo incremental
+    valores = ['TotalDespesas', 'MediaTrimestral', 'DesvioPadrao']
+    resultado[valores] = resultado[valores].fillna(0)
+    colunas = ['RegistroANS', 'RazaoSocial', 'UF'] + valores
+    return resultado[colunas].sort_values('RegistroANS', ignore_index=True)
+
+
+def ler_consolidado_compacto():
+    """Consolidado só com as colunas da agregação: RegistroANS int32, período categórico.
+
+    Linhas sem RegistroANS são descartadas (não casariam com o cadastro).
+    """
+    df = armazenamento.ler(BASE_ETAPA1, colunas=COLUNAS_AGREGACAO, dtype=TIPOS_CONSOLIDADO)
+    df['ValorDespesas'] = pd.to_numeric(df['ValorDespesas'], errors='coerce').fillna(0)
+    df['RegistroANS'] = pd.to_numeric(df['RegistroANS'], errors='coerce')
+    if df['RegistroANS'].isna().any():
+        df = df.dropna(subset=['RegistroANS'])
+    return df.astype({'RegistroANS': 'int32', **TIPOS_CONSOLIDADO})
+
 
-    # 3. Merge entre os dados consolidados e o cadastro tratado
+def remover_duplicadas(df):
+    """Mesmo resultado de drop_duplicates(COLUNAS_AGREGACAO), sem fatorar as quatro colunas.
+
+    (RegistroANS, Trimestre, Ano) cabe num int64: chaves repetidas ficam
+    vizinhas depois de ordenar (o consolidado do main.py já sai ordenado).
+    Só as linhas de chave repetida passam pela comparação completa, que
+    inclui o valor.
+    """
+    chave = df['RegistroANS'].to_numpy(dtype=np.int64) << 32
+    chave |= (df['Trimestre'].cat.codes.to_numpy().astype(np.int64) + 1) << 16
+    chave |= df['Ano'].cat.codes.to_numpy().astype(np.int64) + 1
+
+    ordem = None
+    if not (chave[1:] > chave[:-1]).all():
+        ordem = np.argsort(chave, kind='stable')
+        chave = chave[ordem]
+    iguais = chave[1:] == chave[:-1]
+    del chave
+    if not iguais.any():
+        return df
+
+    repetidas = np.zeros(len(df), dtype=bool)
+    repetidas[1:] |= iguais
+    repetidas[:-1] |= iguais
+    if ordem is not None:
+        # volta para a ordem original das linhas
+        repetidas[ordem] = repetidas.copy()
+
+    manter = ~repetidas
+    posicoes = np.flatnonzero(repetidas)
+    manter[posicoes[~df.iloc[posicoes].duplicated(subset=COLUNAS_AGREGACAO).to_numpy()]] = True
+    return df[manter]
+
+
+def agregar_por_registro(registro, valores):
+    """TotalDespesas, MediaTrimestral e DesvioPadrao por operadora numa só passada agrupada.
+
+    A chave é fatorada uma vez; contagem e soma saem de np.bincount e o desvio
+    (amostral, como o std do pandas) da soma dos quadrados das diferenças para
+    a média do grupo, sem a perda de precisão de soma_quadrados - soma * media.
+    """
+    codigos, registros = pd.factorize(registro, sort=True)
+    n = np.bincount(codigos)
+    soma = np.bincount(codigos, weights=valores)
+    media = soma / n
+
+    diferencas = media[codigos]
+    np.subtract(valores, diferencas, out=diferencas)
+    np.square(diferencas, out=diferencas)
+    with np.errstate(divide='ignore', invalid='ignore'):
+        desvio = np.sqrt(np.bincount(codigos, weights=diferencas) / (n - 1))
+
+    return pd.DataFrame({
+        'RegistroANS': registros,
+        'TotalDespesas': soma,
+        'MediaTrimestral': media,
+        'DesvioPadrao': desvio,  # NaN com um trimestre só, como no pandas
+    })
+
+
+def agregar_completo(cadastro):
+    """Recalcula as estatísticas por operadora a partir do consolidado inteiro."""
+    # Carregar o consolidado (apenas as colunas usadas na agregação, em tipos compactos)
+    with perfil.etapa('leitura_consolidado') as e:
+        df_fin = ler_consolidado_compacto()
+        e.linhas_saida = len(df_fin)
+
+    # Remover duplicatas baseadas em RegistroANS, Ano, Trimestre e ValorDespesas
+    print("🔍 Tratando duplicidades no arquivo consolidado_despesas...")
+    with perfil.etapa('deduplicacao', linhas_entrada=len(df_fin)) as e:
+        df_fin = remover_duplicadas(df_fin)
+        e.linhas_saida = len(df_fin)
+
+    # Agregação pela chave inteira; razão social e UF entram só no resultado
     print("📊 Cruzando dados e calculando estatísticas...")
+    with perfil.etapa('estatisticas', linhas_entrada=len(df_fin)) as e:
+        estatisticas = agregar_por_registro(
+            df_fin['RegistroANS'].to_numpy(), df_fin['ValorDespesas'].to_numpy(dtype=np.float64))
+        e.linhas_saida = len(estatisticas)
+    del df_fin
+
+    with perfil.etapa('juncao_cadastro', linhas_entrada=len(estatisticas)) as e:
+        resultado = dimensao_operadoras(cadastro, estatisticas, e)
+        e.linhas_saida = len(resultado)
+    return resultado
+
+
+def agregar_incremental(cadastro):
+    """Estatísticas por operadora a partir das somas acumuladas pelo main.py --incremental."""
+    print("📊 Calculando estatísticas a partir das somas acumuladas...")
+    estatisticas = incremental.agregar_estatisticas(
+        incremental.carregar_estatisticas(ARQUIVO_ESTATISTICAS))
+
+    with perfil.etapa('juncao_cadastro', linhas_entrada=len(estatisticas)) as e:
+        resultado = dimensao_operadoras(cadastro, estatisticas, e)
+        e.linhas_saida = len(resultado)
+    return resultado
 
-    df_res = pd.merge(
-        df_cadop[['RegistroANS', 'RazaoSocial', 'UF']],
-        df_fin.drop(columns=['RazaoSocial'], errors='ignore'),
-        on='RegistroANS',
-        how='left'  # Mantém todos os dados de df_fin e adiciona informações do cadastro
-    )
 
-    # Agregação solicitada
-    agregado = df_res.groupby(['RegistroANS', 'RazaoSocial', 'UF'])['ValorDespesas'].agg(
-        TotalDespesas='sum',
-        MediaTrimestral='mean',
-        DesvioPadrao='std'
-    ).reset_index().fillna(0)
+def gerar_resultado_despesas(cadastro, agregado, etapa):
+    """Equivalente à tabela 4 de db/create_tables.sql, particionado por Ano/Trimestre."""
+    df_fin = armazenamento.ler(
+        BASE_ETAPA1, colunas=['RegistroANS', 'Trimestre', 'Ano', 'ValorDespesas'])
+    resultado = juntar_cadastro(
+        cadastro, df_fin, ['CNPJ', 'RazaoSocial', 'Modalidade', 'UF'], etapa)
+    resultado['RegistroANS'] = resultado['RegistroANS'].astype(np.int64)
+
+    # Estatísticas da operadora pela mesma busca na chave (LEFT JOIN: NaN sem agregado)
+    ordem = np.argsort(agregado['RegistroANS'].to_numpy(dtype=np.int64), kind='stable')
+    posicoes = registro.localizar(
+        agregado['RegistroANS'].to_numpy(dtype=np.int64)[ordem], resultado['RegistroANS'])
+    for coluna in ['TotalDespesas', 'MediaTrimestral', 'DesvioPadrao']:
+        valores = agregado[coluna].to_numpy(dtype=np.float64)[ordem]
+        resultado[coluna] = np.where(posicoes >= 0, valores[np.maximum(posicoes, 0)], np.nan)
+
+    resultado = resultado[registro.COLUNAS + [
+        'Trimestre', 'Ano', 'ValorDespesas', 'TotalDespesas', 'MediaTrimestral', 'DesvioPadrao'
+    ]].sort_values(['RegistroANS', 'Ano', 'Trimestre'])
+    armazenamento.salvar(resultado, BASE_RESULTADO, particionar=True)
+
+
+def preparar_snapshot_api(caminho_resultado):
+    """Grava o snapshot que a API mapeia ao subir, com as estatísticas já calculadas.
+
+    Assim a API não lê o Parquet nem monta índices na partida: só abre a
+    pasta. Usa o mesmo código da API (src/snapshot_api.py), sem FastAPI,
+    para a pasta e o formato serem exatamente os que ela procura.
+    """
+    pasta, uso = snapshot_api.preparar(caminho_resultado, PASTA_SNAPSHOT_API)
+    with uso:
+        for nome in snapshot_api.CALCULOS:
+            snapshot_api.materializar(pasta, nome)
+    print(f"⚡ Snapshot da API pronto em {pasta}")
+
+
+def baixar_cadastro():
+    """Relatorio_cadop.csv pelo cache: (caminho, modificado desde o último download)."""
+    print("🌐 Baixando cadastro de operadoras da ANS...")
+    session = download.criar_sessao(verify=False)
+    return download.baixar_cacheado(session, URL_CADASTRO)
+
+
+def carregar_cadastro(caminho_cadop, modificado):
+    """RegistroOperadoras do cadastro baixado (None se o processamento falhar)."""
+    if not modificado and armazenamento.existe(BASE_REGISTRO):
+        # Cadastro inalterado desde a última execução: reaproveita o registro
+        print("✅ Cadastro inalterado; reutilizando o registro de operadoras.")
+        df_registro = armazenamento.ler(BASE_REGISTRO, dtype={'CNPJ': str})
+    else:
+        df_registro = atualizar_registro(caminho_cadop)
+        if df_registro is None:
+            return None
+    return registro.RegistroOperadoras(df_registro)
+
+
+def ler_registro():
+    """RegistroOperadoras gravado pela última atualização do cadastro."""
+    return registro.RegistroOperadoras(armazenamento.ler(BASE_REGISTRO, dtype={'CNPJ': str}))
+
+
+def gerar_saidas(cadastro, modo_incremental=False):
+    """Agregação por operadora, gravação de despesas_agregadas e, em parquet, do resultado da API."""
+    with perfil.etapa('agregacao') as etapa_agregacao:
+        if modo_incremental:
+            agregado = agregar_incremental(cadastro)
+        else:
+            agregado = agregar_completo(cadastro)
+        etapa_agregacao.linhas_saida = len(agregado)
 
     # Excluir linhas onde as colunas de valores (TotalDespesas, MediaTrimestral, DesvioPadrao) são 0
     agregado = agregado[
@@ -106,38 +295,93 @@ def processar_transform():
     ]
 
     # 4. Salvamento dos arquivos locais
-    agregado.to_csv(ARQUIVO_SAIDA_AGREGADO, index=False, encoding='utf-8')
+    with perfil.etapa('gravacao', linhas_entrada=len(agregado)):
+        armazenamento.salvar(agregado, BASE_SAIDA_AGREGADO)
 
-    # 5. Geração do ZIP final na pasta 'data'
-    print("📦 Gerando pacote ZIP final...")
+    if armazenamento.FORMATO == 'parquet':
+        # Mesma junção da tabela resultado_despesas do banco, já no formato lido pela API
+        with perfil.etapa('resultado_despesas') as etapa_resultado:
+            gerar_resultado_despesas(cadastro, agregado, etapa_resultado)
 
-    try:
-        # Caminho completo para o arquivo ZIP na pasta 'data'
-        zip_path = os.path.join(PASTA_ZIP, "Teste_Caroline_Alexandre.zip")
+        if PASTA_SNAPSHOT_API:
+            with perfil.etapa('snapshot_api'):
+                preparar_snapshot_api(armazenamento.caminho(BASE_RESULTADO))
 
-        # Verificação se os arquivos existem antes de criar o ZIP
-        if not os.path.exists(ARQUIVO_SAIDA_AGREGADO):
-            raise FileNotFoundError(
-                f"O arquivo {ARQUIVO_SAIDA_AGREGADO} não foi encontrado.")
-        if not os.path.exists(ARQUIVO_ETAPA1):
-            raise FileNotFoundError(
-                f"O arquivo {ARQUIVO_ETAPA1} não foi encontrado.")
-        if not os.path.exists(ARQUIVO_CADASTRO_LIMPO):
+
+def caminho_zip():
+    return os.path.join(PASTA_ZIP, "Teste_Caroline_Alexandre.zip")
+
+
+def gerar_zip():
+    """Gera (ou reaproveita) o ZIP final em PASTA_ZIP; retorna o manifesto do pacote."""
+    print("📦 Gerando pacote ZIP final...")
+    zip_path = caminho_zip()
+
+    # Cada CSV do ZIP sai em fluxo do arquivo do pipeline (em parquet, lote a lote)
+    membros = []
+    for base, nome in MEMBROS_ZIP:
+        if not armazenamento.existe(base):
             raise FileNotFoundError(
-                f"O arquivo {ARQUIVO_CADASTRO_LIMPO} não foi encontrado.")
+                f"O arquivo {armazenamento.caminho(base)} não foi encontrado.")
+        membros.append(pacote.Membro(
+            nome, armazenamento.arquivos(base), functools.partial(armazenamento.iterar_csv, base),
+            os.path.getsize(armazenamento.caminho(base)) if armazenamento.FORMATO != 'parquet' else None))
 
-        # Criação do arquivo ZIP
-        with zipfile.ZipFile(zip_path, 'w', zipfile.ZIP_DEFLATED) as z:
-            z.write(ARQUIVO_SAIDA_AGREGADO, arcname="despesas_agregadas.csv")
-            z.write(ARQUIVO_ETAPA1, arcname="consolidado_despesas.csv")
-            z.write(ARQUIVO_CADASTRO_LIMPO,
-                    arcname="tabela_cadastro_operadoras_limpo.csv")
+    with perfil.etapa('zip') as etapa_zip:
+        manifesto = pacote.empacotar(zip_path, membros)
+        etapa_zip.detalhes['reaproveitados'] = manifesto['reaproveitados']
+        etapa_zip.detalhes['bytes'] = manifesto['tamanho']
 
+    if len(manifesto['reaproveitados']) == len(membros):
+        print(f"✅ ZIP inalterado: {zip_path}.")
+    else:
         print(f"✨ Sucesso! O arquivo ZIP foi criado em {zip_path}.")
+    return manifesto
+
+
+def processar_transform(modo_incremental=False):
+    print("🚀 Iniciando Transformação e Enriquecimento...")
+
+    # 1. Verificação do arquivo de entrada
+    if not armazenamento.existe(BASE_ETAPA1):
+        print(
+            f"❌ Erro: {armazenamento.caminho(BASE_ETAPA1)} não encontrado. Execute o main.py primeiro.")
+        return
+
+    if modo_incremental and not os.path.exists(ARQUIVO_ESTATISTICAS):
+        print(f"ℹ️ {ARQUIVO_ESTATISTICAS} não encontrado: recalculando tudo.")
+        modo_incremental = False
+
+    # 2. Download e Preparação do Cadastro
+    with perfil.etapa('cadastro') as etapa_cadastro:
+        try:
+            caminho_cadop, modificado = baixar_cadastro()
+        except Exception as e:
+            print(f"❌ Erro no download do cadastro: {e}")
+            return
+
+        cadastro = carregar_cadastro(caminho_cadop, modificado)
+        if cadastro is None:
+            return
+        etapa_cadastro.linhas_saida = len(cadastro)
+        etapa_cadastro.detalhes['modificado'] = bool(modificado)
+        etapa_cadastro.detalhes['versao'] = cadastro.versao
+
+    gerar_saidas(cadastro, modo_incremental)
+
+    # 5. Geração do ZIP final na pasta 'data'
+    try:
+        gerar_zip()
     except Exception as e:
         print(f"⚠️ Erro ao criar o ZIP: {e}")
 
 
 # Ponto de entrada do script
 if __name__ == "__main__":
-    processar_transform()
+    parser = argparse.ArgumentParser(
+        description="Enriquecimento, agregação e empacotamento dos dados consolidados.")
+    parser.add_argument("--incremental", action="store_true",
+                        help=f"agrega a partir de {ARQUIVO_ESTATISTICAS} em vez do consolidado inteiro")
+    args = parser.parse_args()
+    with perfil.execucao('transform'):
+        processar_transform(modo_incremental=args.incremental)
@@ -1,8 +1,20 @@
 # src/utils.py
+import numpy as np
 import pandas as pd
 import re
 from collections import Counter
 
+# Colunas variadas dos arquivos da ANS -> padrão do projeto
+MAPEAMENTO_COLUNAS = {
+    'CNPJ_OPERADORA': 'CNPJ',
+    'REG_ANS': 'RegistroANS',
+    'RAZAO_SOCIAL': 'RazaoSocial',
+    'NM_RAZAO_SOCIAL': 'RazaoSocial',
+    'VL_SALDO_FINAL': 'ValorDespesas',
+    'VALOR': 'ValorDespesas',
+    'DT_REGISTRO': 'Data'
+}
+
 
 def limpar_cnpj(cnpj):
     """Remove caracteres não numéricos do CNPJ."""
@@ -33,20 +45,92 @@ def validar_cnpj(cnpj):
     return cnpj[-2:] == f"{dv1}{dv2}"
 
 
+# Pesos dos dígitos verificadores, como vetores para o cálculo em lote
+PESOS_DV1 = np.array([5, 4, 3, 2, 9, 8, 7, 6, 5, 4, 3, 2])
+PESOS_DV2 = np.array([6, 5, 4, 3, 2, 9, 8, 7, 6, 5, 4, 3, 2])
+
+
+def _por_valor_unico(serie, funcao):
+    """Aplica `funcao` (Series -> array) só aos valores distintos e expande o resultado.
+
+    Colunas como CNPJ e Trimestre repetem poucos valores em milhões de linhas.
+    """
+    codigos, unicos = pd.factorize(serie, use_na_sentinel=False)
+    resultado = np.asarray(funcao(pd.Series(unicos, dtype=object)))
+    return pd.Series(resultado[codigos], index=serie.index)
+
+
+def limpar_cnpj_serie(serie):
+    """Versão vetorizada de limpar_cnpj para uma Series inteira."""
+    # Nulos viram '' (str(nan) também não tem dígitos) e depois 14 zeros
+    return _por_valor_unico(serie, lambda unicos: unicos.astype(str).str.replace(
+        r'\D', '', regex=True).fillna('').str.zfill(14).astype(object))
+
+
+def validar_cnpj_serie(serie):
+    """Versão vetorizada de validar_cnpj: dígitos verificadores sobre uma matriz NumPy."""
+    return _por_valor_unico(serie, _validar_cnpjs_unicos)
+
+
+def _validar_cnpjs_unicos(serie):
+    cnpjs = limpar_cnpj_serie(serie)
+    validos = np.zeros(len(cnpjs), dtype=bool)
+
+    # Só CNPJs com 14 dígitos ASCII entram na matriz; os demais (raros) usam a versão escalar
+    candidatos = ((cnpjs.str.len() == 14) & cnpjs.str.isascii()).to_numpy(dtype=bool)
+    outros = ~candidatos & (cnpjs.str.len() == 14).to_numpy(dtype=bool)
+
+    if candidatos.any():
+        texto = ''.join(cnpjs[candidatos]).encode('ascii')
+        digitos = np.frombuffer(texto, dtype=np.uint8).reshape(-1, 14).astype(np.int64) - 48
+
+        resto1 = digitos[:, :12] @ PESOS_DV1 % 11
+        dv1 = np.where(resto1 < 2, 0, 11 - resto1)
+        resto2 = digitos[:, :13] @ PESOS_DV2 % 11
+        dv2 = np.where(resto2 < 2, 0, 11 - resto2)
+
+        validos[candidatos] = (digitos[:, 12] == dv1) & (digitos[:, 13] == dv2)
+
+    if outros.any():
+        validos[outros] = [validar_cnpj(c) for c in cnpjs[outros]]
+
+    return validos
+
+
 def normalizar_colunas(df):
     """Mapeia colunas variadas da ANS para o padrão do projeto."""
-    mapeamento = {
-        'CNPJ_OPERADORA': 'CNPJ',
-        'REG_ANS': 'RegistroANS',
-        'RAZAO_SOCIAL': 'RazaoSocial',
-        'NM_RAZAO_SOCIAL': 'RazaoSocial',
-        'VL_SALDO_FINAL': 'ValorDespesas',
-        'VALOR': 'ValorDespesas',
-        'DT_REGISTRO': 'Data'
-    }
     # Renomeia apenas as colunas que existirem no DF atual
     df = df.rename(
-        columns={k: v for k, v in mapeamento.items() if k in df.columns})
+        columns={k: v for k, v in MAPEAMENTO_COLUNAS.items() if k in df.columns})
+    return df
+
+
+def _limpar_valor(serie):
+    """Converte valores monetários ('1234,56') em número; negativos e inválidos viram 0."""
+    if not pd.api.types.is_numeric_dtype(serie):
+        serie = serie.astype(str).str.replace(',', '.')
+    return pd.to_numeric(serie, errors='coerce').fillna(0).clip(lower=0)
+
+
+def _corrigir_razao_social_duplicada(df):
+    """Unifica a RazaoSocial de CNPJs com nomes diferentes, usando a linha de Data mais recente."""
+    n_razoes = df.groupby('CNPJ', sort=False)['RazaoSocial'].transform(
+        'nunique', dropna=False)
+    conflito = (n_razoes > 1).to_numpy()
+    if not conflito.any():
+        return df
+
+    # Uma única ordenação: a primeira linha de cada CNPJ é a de Data mais recente
+    recentes = df.loc[conflito & df['Data'].notna().to_numpy(), ['CNPJ', 'Data', 'RazaoSocial']] \
+        .sort_values('Data', ascending=False, kind='stable') \
+        .drop_duplicates('CNPJ')
+    print(f"⚠️ Inconsistência detectada em {df.loc[conflito, 'CNPJ'].nunique()} CNPJ(s): "
+          "Razões sociais diferentes.")
+
+    # CNPJs em conflito sem nenhuma Data preenchida ficam como estão
+    corrigir = conflito & df['CNPJ'].isin(recentes['CNPJ']).to_numpy()
+    df.loc[corrigir, 'RazaoSocial'] = df.loc[corrigir, 'CNPJ'].map(
+        recentes.set_index('CNPJ')['RazaoSocial'])
     return df
 
 
@@ -55,70 +139,46 @@ def tratar_inconsistencias(df):
 
     # 1. Garantir CNPJ se ele existir (pode vir como CNPJ ou CNPJ_OPERADORA)
     if 'CNPJ' in df.columns:
-        df['CNPJ'] = df['CNPJ'].apply(limpar_cnpj)
-        df['CNPJ_STATUS'] = df['CNPJ'].apply(
-            lambda x: 'Inconsistente' if not validar_cnpj(x) else 'Válido')
+        df['CNPJ'] = limpar_cnpj_serie(df['CNPJ'])
+        df['CNPJ_STATUS'] = np.where(
+            validar_cnpj_serie(df['CNPJ']), 'Válido', 'Inconsistente')
 
     # 2. Garantir REG_ANS como string/inteiro limpo
     if 'RegistroANS' in df.columns:
         df['RegistroANS'] = pd.to_numeric(
             df['RegistroANS'], errors='coerce').fillna(0).astype(int)
 
-    # 3. Tratar valores (Despesas)
+    # 3. Tratar valores (Despesas), substituindo negativos por 0
     if 'ValorDespesas' in df.columns:
-        if df['ValorDespesas'].dtype == 'object':
-            df['ValorDespesas'] = df['ValorDespesas'].str.replace(',', '.')
-        df['ValorDespesas'] = pd.to_numeric(
-            df['ValorDespesas'], errors='coerce').fillna(0)
-
-        # Substituindo valores negativos por 0
-        df['ValorDespesas'] = df['ValorDespesas'].apply(
-            lambda x: 0 if x < 0 else x)
+        df['ValorDespesas'] = _limpar_valor(df['ValorDespesas'])
 
     if 'VL_SALDO_INICIAL' in df.columns:
-        if df['VL_SALDO_INICIAL'].dtype == 'object':
-            df['VL_SALDO_INICIAL'] = df['VL_SALDO_INICIAL'].str.replace(
-                ',', '.')
-        df['VL_SALDO_INICIAL'] = pd.to_numeric(
-            df['VL_SALDO_INICIAL'], errors='coerce').fillna(0)
-
-        # Substituindo valores negativos por 0
-        df['VL_SALDO_INICIAL'] = df['VL_SALDO_INICIAL'].apply(
-            lambda x: 0 if x < 0 else x)
+        df['VL_SALDO_INICIAL'] = _limpar_valor(df['VL_SALDO_INICIAL'])
 
     # 4. Excluir linhas onde VL_SALDO_INICIAL e ValorDespesas são ambos 0
     if 'VL_SALDO_INICIAL' in df.columns and 'ValorDespesas' in df.columns:
         df = df[~((df['VL_SALDO_INICIAL'] == 0) & (df['ValorDespesas'] == 0))]
 
     # 5. Verificar CNPJs duplicados com diferentes Razões Sociais
-    if 'CNPJ' in df.columns and 'RazaoSocial' in df.columns:
-        duplicated_cnpjs = df[df.duplicated(subset='CNPJ', keep=False)]
-
-        for cnpj, group in duplicated_cnpjs.groupby('CNPJ'):
-            razoes_sociais = group['RazaoSocial'].unique()
-            if len(razoes_sociais) > 1:
-                print(
-                    f"⚠️ Inconsistência detectada no CNPJ {cnpj}: Razões sociais diferentes.")
-                # Escolher a razão social mais recente, com base na Data
-                grupo_com_data = group.dropna(
-                    subset=['Data']).sort_values('Data', ascending=False)
-                razao_social_recente = grupo_com_data.iloc[0]['RazaoSocial']
-                # Corrige para a mais recente
-                df.loc[df['CNPJ'] == cnpj, 'RazaoSocial'] = razao_social_recente
+    if 'CNPJ' in df.columns and 'RazaoSocial' in df.columns and 'Data' in df.columns:
+        df = _corrigir_razao_social_duplicada(df)
 
     # 6. Validar Trimestres
     if 'Trimestre' in df.columns:
-        df['Trimestre'] = df['Trimestre'].apply(
-            lambda x: 'Inconsistente' if not re.match(r'\dT\d{4}', str(x)) else x)
+        valido = _por_valor_unico(df['Trimestre'], lambda unicos: unicos.astype(
+            str).str.match(r'\dT\d{4}').fillna(False).astype(bool))
+        df['Trimestre'] = df['Trimestre'].where(valido, 'Inconsistente')
 
     # 7. Validar Anos
     if 'Ano' in df.columns:
-        df['Ano'] = df['Ano'].apply(
-            lambda x: 'Inconsistente' if not re.match(r'\d{4}', str(x)) else x)
+        valido = _por_valor_unico(df['Ano'], lambda unicos: unicos.astype(
+            str).str.match(r'\d{4}').fillna(False).astype(bool))
+        df['Ano'] = df['Ano'].where(valido, 'Inconsistente')
 
     # 8. Preencher razão social vazia com "Razão Social Não Informada"
     if 'RazaoSocial' in df.columns:
-        df['RazaoSocial'] = df['RazaoSocial'].apply(
-            lambda x: x if pd.notnull(x) and x != '' else 'Razão Social Não Informada')
+        preenchida = df['RazaoSocial'].notna() & (df['RazaoSocial'] != '')
+        df['RazaoSocial'] = df['RazaoSocial'].where(
+            preenchida, 'Razão Social Não Informada')
 
     return df
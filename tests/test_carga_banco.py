@@ -0,0 +1,117 @@
+"""Carga no PostgreSQL (src/carga_banco.py) contra um banco real.
+
+Roda só com ANS_TEST_DATABASE_URL definido; as tabelas ficam num schema
+temporário, apagado no fim, então o banco pode ser o de desenvolvimento.
+"""
+import csv
+import os
+import re
+import uuid
+from pathlib import Path
+
+import pytest
+
+psycopg = pytest.importorskip("psycopg")
+from psycopg import sql
+from psycopg.conninfo import make_conninfo
+
+from src import carga_banco
+
+DSN = os.environ.get("ANS_TEST_DATABASE_URL")
+DB_DIR = Path(__file__).resolve().parent.parent / "db"
+
+pytestmark = pytest.mark.skipif(not DSN, reason="ANS_TEST_DATABASE_URL não definido")
+
+CADASTRO = [
+    {"RegistroANS": 100, "CNPJ": "01234567000189", "RazaoSocial": "ALFA SAUDE",
+     "Modalidade": "Medicina de Grupo", "UF": "SP"},
+    {"RegistroANS": 200, "CNPJ": "98765432000110", "RazaoSocial": "BETA SAUDE",
+     "Modalidade": "Cooperativa Médica", "UF": "RJ"},
+]
+
+
+def _despesas(valores):
+    """Linhas do consolidado a partir de {(registro, ano, trimestre): valor}."""
+    return [{"CNPJ": "", "RegistroANS": r, "Trimestre": t, "Ano": a, "ValorDespesas": v}
+            for (r, a, t), v in valores.items()]
+
+
+def _agregadas(consolidado):
+    totais = {}
+    for linha in consolidado:
+        totais.setdefault(linha["RegistroANS"], []).append(linha["ValorDespesas"])
+    return [{"RegistroANS": r, "RazaoSocial": f"OPERADORA {r}", "UF": "SP",
+             "TotalDespesas": sum(v), "MediaTrimestral": sum(v) / len(v), "DesvioPadrao": 0}
+            for r, v in totais.items()]
+
+
+def _gravar(base, linhas):
+    with open(f"{base}.csv", "w", encoding="utf-8", newline="") as f:
+        escritor = csv.DictWriter(f, fieldnames=list(linhas[0]))
+        escritor.writeheader()
+        escritor.writerows(linhas)
+
+
+@pytest.fixture
+def banco(tmp_path):
+    """(DSN restrito a um schema novo, tabelas apontando para CSVs em tmp_path)."""
+    schema = f"teste_carga_{uuid.uuid4().hex[:8]}"
+    with psycopg.connect(DSN, autocommit=True) as conn:
+        conn.execute(sql.SQL("CREATE SCHEMA {}").format(sql.Identifier(schema)))
+    dsn = make_conninfo(DSN, options=f"-c search_path={schema}")
+    try:
+        with psycopg.connect(dsn, autocommit=True) as conn:
+            for script in ("create_tables.sql", "analytics_materializado.sql"):
+                texto = (DB_DIR / script).read_text(encoding="utf-8")
+                # O índice de trigramas depende da extensão, que fica fora do schema
+                conn.execute(re.sub(r"[^;]*(pg_trgm|gin_trgm_ops)[^;]*;", "", texto))
+        tabelas = [(tabela, str(tmp_path / tabela), chave, colunas)
+                   for tabela, _, chave, colunas in carga_banco.TABELAS]
+        yield dsn, tabelas
+    finally:
+        with psycopg.connect(DSN, autocommit=True) as conn:
+            conn.execute(sql.SQL("DROP SCHEMA {} CASCADE").format(sql.Identifier(schema)))
+
+
+def _carregar(dsn, tabelas, consolidado):
+    arquivos = dict(zip(
+        [t for t, _, _, _ in tabelas], [CADASTRO, consolidado, _agregadas(consolidado)]))
+    for tabela, base, _, _ in tabelas:
+        _gravar(base, arquivos[tabela])
+    carga_banco.carregar_banco(dsn, tabelas)
+
+
+def _consultar(dsn, comando):
+    with psycopg.connect(dsn) as conn:
+        return conn.execute(comando).fetchall()
+
+
+def test_carga_de_dois_periodos_e_recarga_de_um(banco):
+    dsn, tabelas = banco
+    _carregar(dsn, tabelas, _despesas({
+        (100, 2025, "1T"): 10.0, (200, 2025, "1T"): 20.0,
+        (100, 2025, "2T"): 30.0, (200, 2025, "2T"): 40.0,
+        (300, 2025, "2T"): 5.0,  # sem cadastro: entra como 'Desconhecida'
+    }))
+    assert _consultar(dsn, "SELECT count(*) FROM consolidado_despesas") == [(5,)]
+    assert _consultar(dsn, "SELECT count(*) FROM resultado_despesas") == [(5,)]
+    assert _consultar(dsn, "SELECT RazaoSocial, Modalidade, UF FROM operadoras_cadastro "
+                           "WHERE RegistroANS = 300") == [("Operadora 300", "Desconhecida", "XX")]
+    assert _consultar(dsn, "SELECT CNPJ FROM operadoras_cadastro WHERE RegistroANS = 100") == [
+        ("01234567000189",)]
+
+    # Recarga só do 2T2025, com o valor da operadora 100 corrigido
+    _carregar(dsn, tabelas, _despesas({
+        (100, 2025, "2T"): 35.5, (200, 2025, "2T"): 40.0, (300, 2025, "2T"): 5.0}))
+    assert _consultar(dsn, "SELECT count(*) FROM consolidado_despesas") == [(5,)]
+    assert _consultar(dsn, "SELECT count(*) FROM resultado_despesas") == [(5,)]
+    assert _consultar(dsn, """
+        SELECT RegistroANS, Ano, Trimestre, ValorDespesas::float8 FROM resultado_despesas
+        ORDER BY RegistroANS, Ano, Trimestre""") == [
+        (100, 2025, "1T", 10.0), (100, 2025, "2T", 35.5),
+        (200, 2025, "1T", 20.0), (200, 2025, "2T", 40.0), (300, 2025, "2T", 5.0)]
+    # O resumo de analytics acompanha o valor alterado
+    assert _consultar(dsn, """
+        SELECT RegistroANS, valor_inicial::float8, valor_final::float8, n_trimestres
+        FROM analytics_operadora ORDER BY RegistroANS""") == [
+        (100, 10.0, 35.5, 2), (200, 20.0, 40.0, 2), (300, 5.0, 5.0, 1)]
@@ -0,0 +1,44 @@
+import functools
+import http.server
+import os
+import threading
+
+import pytest
+
+from src import download
+
+
+@pytest.fixture
+def servidor(tmp_path):
+    """Servidor HTTP local servindo a pasta `origem`; devolve (pasta, url base)."""
+    origem = tmp_path / "origem"
+    origem.mkdir()
+    handler = functools.partial(http.server.SimpleHTTPRequestHandler, directory=str(origem))
+    handler.log_message = lambda *args: None
+    httpd = http.server.ThreadingHTTPServer(("127.0.0.1", 0), handler)
+    threading.Thread(target=httpd.serve_forever, daemon=True).start()
+    yield origem, f"http://127.0.0.1:{httpd.server_port}"
+    httpd.shutdown()
+    httpd.server_close()
+
+
+def test_lote_nao_e_removido_pelo_limite_do_cache(servidor, tmp_path):
+    origem, base = servidor
+    for nome in ("1T2025.zip", "2T2025.zip", "3T2025.zip"):
+        (origem / nome).write_bytes(os.urandom(4096))
+    cache = str(tmp_path / "cache")
+
+    # Limite menor que um único ZIP: todos os do lote precisam continuar em disco
+    urls = [f"{base}/1T2025.zip", f"{base}/2T2025.zip"]
+    baixados = download.baixar_trimestres(urls, pasta=cache, max_workers=2, max_bytes=1)
+    for url, caminho, modificado, erro in baixados:
+        assert erro is None
+        assert os.path.exists(caminho)
+        assert open(caminho, "rb").read() == (origem / url.rsplit("/", 1)[1]).read_bytes()
+
+    # O lote seguinte pode remover os anteriores
+    [(_, caminho, _, erro)] = download.baixar_trimestres(
+        [f"{base}/3T2025.zip"], pasta=cache, max_bytes=1)
+    assert erro is None and os.path.exists(caminho)
+    assert list(download.carregar_indice(cache)) == [f"{base}/3T2025.zip"]
+    assert not any(os.path.exists(c) for _, c, _, _ in baixados)
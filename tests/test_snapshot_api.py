@@ -0,0 +1,21 @@
+"""Limpeza dos snapshots da API (src/snapshot_api.py)."""
+import pytest
+
+from src import snapshot_api
+
+pytestmark = pytest.mark.skipif(snapshot_api.fcntl is None, reason="sem fcntl")
+
+
+def test_limpeza_mantem_snapshots_em_uso(tmp_path):
+    for nome in ("atual", "aberta", "antiga"):
+        (tmp_path / nome).mkdir()
+    # A trava é por arquivo aberto: vale como a de outro worker mesmo neste processo
+    uso = snapshot_api.usar(tmp_path / "aberta")
+    snapshot_api.usar(tmp_path / "antiga").close()
+
+    snapshot_api.limpar(tmp_path, manter=tmp_path / "atual")
+    assert sorted(p.name for p in tmp_path.iterdir()) == ["aberta", "atual"]
+
+    uso.close()
+    snapshot_api.limpar(tmp_path, manter=tmp_path / "atual")
+    assert sorted(p.name for p in tmp_path.iterdir()) == ["atual"]